@@ -8,21 +8,66 @@ ELI ENGLISH TUTOR - BACKEND CON CONTROL TOTAL V15.0
 import os
 import sys
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 import speech_recognition as sr
 import random
+import bisect
 from datetime import datetime
 import traceback
 from pydub import AudioSegment
+import numpy as np
 import io
 import uuid
 import time
 import json
 import re
 from pathlib import Path
+from collections import OrderedDict, deque
+from array import array
 import hashlib
-import tempfile
+import subprocess
+import wave
+import sqlite3
+import threading
+import queue
+import math
+import atexit
+import concurrent.futures
+import multiprocessing
+import copy
+import hmac
+import signal
+import urllib.request
+import urllib.error
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import fcntl
+except ImportError:  # Windows: el backend "journal" no está disponible
+    fcntl = None
+
+try:
+    import vosk  # Opcional: reconocimiento offline en CPU
+except ImportError:
+    vosk = None
+
+try:
+    import msgpack  # Opcional: packs de contenido en MessagePack
+except ImportError:
+    msgpack = None
+
+try:
+    import av  # Opcional: decodificadores persistentes con libav (AUDIO_DECODER=persistent)
+except ImportError:
+    av = None
+
+try:
+    from flask_sock import Sock  # Opcional: streaming de audio por WebSocket
+except ImportError:
+    Sock = None
 
 # ============================================
 # CONFIGURACIÓN INICIAL
@@ -41,10 +86,166 @@ print("=" * 60)
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'eli-secret-key-' + str(uuid.uuid4())[:8])
-    MAX_CONTENT_LENGTH = 10 * 1024 * 1024
     AUDIO_FILE_MAX_SIZE = 5 * 1024 * 1024
+    AUDIO_DECODE_TIMEOUT = int(os.environ.get('AUDIO_DECODE_TIMEOUT', 30))
+    # ✅ Motor de reconocimiento: "google" (red), "vosk" (offline, requiere pip install vosk) o "stub"
+    RECOGNIZER_BACKEND = os.environ.get('RECOGNIZER_BACKEND', 'google')
+    RECOGNIZER_LANGUAGE = os.environ.get('RECOGNIZER_LANGUAGE', 'en-US')
+    VOSK_MODEL_PATH = os.environ.get('VOSK_MODEL_PATH', 'model')
+    RECOGNIZER_STUB_TEXT = os.environ.get('RECOGNIZER_STUB_TEXT', 'My name is Eli and I am from Mexico')
+    RECOGNIZER_STUB_LATENCY_MS = int(os.environ.get('RECOGNIZER_STUB_LATENCY_MS', 0))
+    RECOGNIZER_HTTP_URL = os.environ.get('RECOGNIZER_HTTP_URL', 'http://127.0.0.1:8765/recognize')
+    # ✅ Cadena de respaldo: motores a probar, en orden, si el principal falla o agota su plazo
+    RECOGNIZER_FALLBACKS = os.environ.get('RECOGNIZER_FALLBACKS', '')
+    RECOGNIZER_TIMEOUT_S = float(os.environ.get('RECOGNIZER_TIMEOUT_S', 8))
+    RECOGNIZER_BUDGETS = os.environ.get('RECOGNIZER_BUDGETS', '')  # p. ej. "google=6,vosk=4"
+    RECOGNIZER_THREADS = int(os.environ.get('RECOGNIZER_THREADS', 8))
+    RECOGNIZER_HEDGE = os.environ.get('RECOGNIZER_HEDGE', 'false').lower() in ('1', 'true', 'yes')
+    RECOGNIZER_HEDGE_MIN_SAMPLES = int(os.environ.get('RECOGNIZER_HEDGE_MIN_SAMPLES', 20))
+    RECOGNIZER_BREAKER_FAILURES = int(os.environ.get('RECOGNIZER_BREAKER_FAILURES', 5))
+    RECOGNIZER_BREAKER_RESET_S = float(os.environ.get('RECOGNIZER_BREAKER_RESET_S', 30))
+    # ✅ Caché de transcripciones (0 entradas = solo disco; sin directorio = solo memoria)
+    TRANSCRIPTION_CACHE_SIZE = int(os.environ.get('TRANSCRIPTION_CACHE_SIZE', 256))
+    TRANSCRIPTION_CACHE_TTL_S = int(os.environ.get('TRANSCRIPTION_CACHE_TTL_S', 86400))
+    TRANSCRIPTION_CACHE_DIR = os.environ.get('TRANSCRIPTION_CACHE_DIR', '')
+    TRANSCRIPTION_CACHE_DISK_MAX_MB = int(os.environ.get('TRANSCRIPTION_CACHE_DISK_MAX_MB', 256))
+    # ✅ Recorte de silencios (VAD) antes del reconocedor
+    AUDIO_VAD_ENABLED = os.environ.get('AUDIO_VAD_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    AUDIO_VAD_PADDING_MS = int(os.environ.get('AUDIO_VAD_PADDING_MS', 200))
+    AUDIO_VAD_MAX_PAUSE_MS = int(os.environ.get('AUDIO_VAD_MAX_PAUSE_MS', 400))
+    # ✅ Prechequeo de audio antes del reconocedor
+    AUDIO_ADMISSION_ENABLED = os.environ.get('AUDIO_ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    AUDIO_MIN_DURATION_S = float(os.environ.get('AUDIO_MIN_DURATION_S', 0.5))
+    AUDIO_MAX_DURATION_S = float(os.environ.get('AUDIO_MAX_DURATION_S', 60))
+    AUDIO_MIN_RMS = float(os.environ.get('AUDIO_MIN_RMS', 30))
+    AUDIO_MAX_CLIPPING_RATIO = float(os.environ.get('AUDIO_MAX_CLIPPING_RATIO', 0.05))
+    # ✅ Modo asíncrono de /api/process-audio (async=true)
+    ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', 2))
+    ASYNC_QUEUE_SIZE = int(os.environ.get('ASYNC_QUEUE_SIZE', 16))
+    ASYNC_JOB_TTL_S = int(os.environ.get('ASYNC_JOB_TTL_S', 600))
+    ASYNC_STALE_JOB_S = float(os.environ.get('ASYNC_STALE_JOB_S', 0))  # 0 = según la cola y los plazos
+    ASYNC_MAX_WAIT_S = float(os.environ.get('ASYNC_MAX_WAIT_S', 25))  # por debajo del timeout de gunicorn
+    JOBS_DB_PATH = os.environ.get('JOBS_DB_PATH', 'transcription_jobs.db')
+    # ✅ Decodificador: 'subprocess' (ffmpeg por clip) o 'persistent' (procesos libav reutilizados)
+    AUDIO_DECODER = os.environ.get('AUDIO_DECODER', 'subprocess')
+    AUDIO_DECODER_WORKERS = int(os.environ.get('AUDIO_DECODER_WORKERS', 2))
+    AUDIO_DECODER_MAX_JOBS = int(os.environ.get('AUDIO_DECODER_MAX_JOBS', 500))
+    AUDIO_DECODER_HEALTH_S = float(os.environ.get('AUDIO_DECODER_HEALTH_S', 30))  # ping a los libres
+    # ✅ Pool de procesos para decodificar y reconocer (0 = en el hilo de la petición)
+    AUDIO_POOL_WORKERS = int(os.environ.get('AUDIO_POOL_WORKERS', 2))
+    AUDIO_POOL_QUEUE = int(os.environ.get('AUDIO_POOL_QUEUE', 8))
+    AUDIO_POOL_ADMIT_TIMEOUT_S = float(os.environ.get('AUDIO_POOL_ADMIT_TIMEOUT_S', 5))
+    AUDIO_POOL_TASK_TIMEOUT_S = float(os.environ.get('AUDIO_POOL_TASK_TIMEOUT_S', 45))
+    # ✅ Streaming por WebSocket (/api/stream-audio)
+    STREAM_IDLE_TIMEOUT_S = float(os.environ.get('STREAM_IDLE_TIMEOUT_S', 10))
+    STREAM_MAX_SECONDS = float(os.environ.get('STREAM_MAX_SECONDS', 60))
+    STREAM_SEGMENT_PAUSE_MS = int(os.environ.get('STREAM_SEGMENT_PAUSE_MS', 600))
+    STREAM_MAX_SEGMENT_S = float(os.environ.get('STREAM_MAX_SEGMENT_S', 10))
+    STREAM_RECOGNITION_WORKERS = int(os.environ.get('STREAM_RECOGNITION_WORKERS', 4))
+    # ✅ Almacenamiento de progreso: "sqlite" (una fila por usuario), "journal" (diario de eventos) o "json" (legado)
+    PROGRESS_BACKEND = os.environ.get('PROGRESS_BACKEND', 'sqlite')
+    PROGRESS_DB_PATH = os.environ.get('PROGRESS_DB_PATH', 'user_progress.db')
+    PROGRESS_JSON_PATH = os.environ.get('PROGRESS_JSON_PATH', 'user_progress.json')
+    PROGRESS_JOURNAL_PATH = os.environ.get('PROGRESS_JOURNAL_PATH', 'progress_journal.jsonl')
+    PROGRESS_SNAPSHOT_PATH = os.environ.get('PROGRESS_SNAPSHOT_PATH', 'progress_snapshot.json')
+    PROGRESS_JOURNAL_FSYNC_MS = int(os.environ.get('PROGRESS_JOURNAL_FSYNC_MS', 1000))  # 0 = fsync en cada escritura
+    PROGRESS_JOURNAL_COMPACT_BYTES = int(os.environ.get('PROGRESS_JOURNAL_COMPACT_BYTES', 8 * 1024 * 1024))
+    PROGRESS_JOURNAL_COMPACT_INTERVAL_S = int(os.environ.get('PROGRESS_JOURNAL_COMPACT_INTERVAL_S', 300))
+    PROGRESS_CACHE_SIZE = int(os.environ.get('PROGRESS_CACHE_SIZE', 1024))  # 0 = sin caché de perfiles
+    # ✅ Escritura diferida (write-behind): incrementos en memoria, confirmados en lote
+    PROGRESS_WRITE_BEHIND = os.environ.get('PROGRESS_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes')
+    PROGRESS_FLUSH_INTERVAL_MS = int(os.environ.get('PROGRESS_FLUSH_INTERVAL_MS', 500))
+    PROGRESS_FLUSH_MAX_UPDATES = int(os.environ.get('PROGRESS_FLUSH_MAX_UPDATES', 200))
+    # ✅ Lote de grabaciones (/api/process-audio/batch)
+    BATCH_MAX_CLIPS = int(os.environ.get('BATCH_MAX_CLIPS', 40))
+    BATCH_MAX_TOTAL_SIZE = int(os.environ.get('BATCH_MAX_TOTAL_SIZE', 60 * 1024 * 1024))
+    BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 4))
+    # ✅ Scaffolding de preguntas fuera del banco (LRU por worker)
+    SCAFFOLDING_CACHE_SIZE = int(os.environ.get('SCAFFOLDING_CACHE_SIZE', 256))
+    # ✅ Historial de preguntas por usuario (LRU + TTL por worker)
+    QUESTION_HISTORY_MAX_USERS = int(os.environ.get('QUESTION_HISTORY_MAX_USERS', 10000))
+    QUESTION_HISTORY_TTL_S = int(os.environ.get('QUESTION_HISTORY_TTL_S', 6 * 3600))
+    QUESTION_HISTORY_LENGTH = int(os.environ.get('QUESTION_HISTORY_LENGTH', 5))
+    # ✅ Pack de contenido externo (JSON o .msgpack); vacío = preguntas y vocabulario integrados
+    CONTENT_PACK_PATH = os.environ.get('CONTENT_PACK_PATH', '')
+    CONTENT_PACK_CHECK_INTERVAL_S = float(os.environ.get('CONTENT_PACK_CHECK_INTERVAL_S', 5))  # 0 = solo señal/endpoint
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')  # vacío = endpoints de administración desactivados
+    # ✅ Límite del cuerpo completo (audio + campos del formulario): Werkzeug corta al leer
+    MAX_CONTENT_LENGTH = AUDIO_FILE_MAX_SIZE + 64 * 1024
+
+class AudioFileTooLarge(RequestEntityTooLarge):
+    """413 por un archivo de audio concreto (no por el cuerpo completo de la petición)"""
+
+    def __init__(self, limit):
+        super().__init__(f"Audio file exceeds {limit} bytes")
+        self.max_bytes = limit
+
+class CappedUploadBuffer(io.RawIOBase):
+    """✅ Destino de un archivo subido: un único bytearray que se llena por trozos
+
+    Se corta en cuanto se supera el límite (413) sin haber leído el resto del cuerpo.
+    El bytearray se pasa tal cual al pipeline de audio, sin copias intermedias.
+    """
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.data = bytearray()
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, chunk):
+        if len(self.data) + len(chunk) > self.limit:
+            raise AudioFileTooLarge(self.limit)
+        self.data += chunk
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self.data)}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def readinto(self, buffer):
+        chunk = self.data[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+class UploadRequest(Request):
+    """Request cuyos archivos se acumulan en CappedUploadBuffer (tope AUDIO_FILE_MAX_SIZE)"""
+
+    @property
+    def max_content_length(self):
+        # El lote admite muchos clips; cada uno sigue limitado por CappedUploadBuffer
+        if self.endpoint == 'process_audio_batch':
+            return Config.BATCH_MAX_TOTAL_SIZE
+        return super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return CappedUploadBuffer(Config.AUDIO_FILE_MAX_SIZE)
+
+def _uploaded_audio_bytes(file_storage):
+    """Bytes del audio subido sin copiarlos (bytearray del buffer de subida)"""
+    if isinstance(file_storage.stream, CappedUploadBuffer):
+        return file_storage.stream.data
+    audio_bytes = file_storage.read(Config.AUDIO_FILE_MAX_SIZE + 1)
+    if len(audio_bytes) > Config.AUDIO_FILE_MAX_SIZE:
+        raise AudioFileTooLarge(Config.AUDIO_FILE_MAX_SIZE)
+    return audio_bytes
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config.from_object(Config)
 
 CORS(app, resources={
@@ -55,15 +256,248 @@ CORS(app, resources={
     }
 })
 
+class FrozenPayload(dict):
+    """Diccionario de solo lectura: se comparte entre peticiones sin copiarlo
+
+    Sigue siendo un dict para jsonify y para el código que lee sus claves.
+    """
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("FrozenPayload is read-only")
+
+    __setitem__ = __delitem__ = _readonly
+    update = pop = popitem = clear = setdefault = _readonly
+
+    def __ior__(self, other):
+        raise TypeError("FrozenPayload is read-only")
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+def _freeze_payload(value):
+    """Convierte dicts y listas anidados en FrozenPayload y tuplas"""
+    if isinstance(value, dict):
+        return FrozenPayload((key, _freeze_payload(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_payload(item) for item in value)
+    return value
+
+def normalize_lookup_key(text):
+    """Clave de búsqueda: minúsculas, espacios colapsados y sin signos de apertura/cierre"""
+    return " ".join(str(text).casefold().split()).strip(" ¿?¡!.")
+
+def content_fingerprint(data):
+    """Hash corto y estable del contenido (JSON canónico)"""
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
 # ============================================
 # BASE DE DATOS DE PREGUNTAS CON GRAMÁTICA PERFECTA
 # ============================================
+class QuestionHistoryStore:
+    """✅ Preguntas recientes por usuario, acotado en número de usuarios y en tiempo
+
+    LRU por último acceso con TTL: los user_<hex> aleatorios de start_practice ya no
+    se acumulan hasta que gunicorn recicla el worker. Por usuario solo se guarda un
+    anillo fijo de posiciones (array de enteros) del nivel y versión de contenido
+    en que se preguntaron; si cambia cualquiera de los dos, el anillo empieza de cero.
+    """
+
+    class _Entry:
+        __slots__ = ("positions", "cursor", "level", "content_hash", "last_access")
+
+        def __init__(self, length, level, content_hash):
+            self.positions = array('i', [-1]) * length
+            self.cursor = 0
+            self.level = level
+            self.content_hash = content_hash
+            self.last_access = 0.0
+
+    def __init__(self, max_users=10000, ttl_s=6 * 3600, length=5):
+        self.max_users = max_users
+        self.ttl_s = ttl_s
+        self.length = max(1, length)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+
+    def _expire(self, now):
+        """Quita los usuarios caducados; por orden LRU están siempre al principio (con lock)"""
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if now - entry.last_access < self.ttl_s:
+                break
+            self._entries.popitem(last=False)
+            self.expired += 1
+
+    def recent(self, user_id, level, content_hash):
+        """Posiciones preguntadas hace poco a este usuario en ese nivel y versión"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if (entry is None or entry.level != level or entry.content_hash != content_hash
+                    or time.monotonic() - entry.last_access >= self.ttl_s):
+                return frozenset()
+            return frozenset(position for position in entry.positions if position >= 0)
+
+    def record(self, user_id, level, content_hash, position):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(user_id)
+            if entry is None or entry.level != level or entry.content_hash != content_hash:
+                entry = self._Entry(self.length, level, content_hash)
+                self._entries[user_id] = entry
+            entry.positions[entry.cursor] = position
+            entry.cursor = (entry.cursor + 1) % self.length
+            entry.last_access = now
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            approx_bytes = sys.getsizeof(self._entries) + sum(
+                sys.getsizeof(user_id) + sys.getsizeof(entry) + sys.getsizeof(entry.positions)
+                for user_id, entry in self._entries.items()
+            )
+            return {
+                "users": len(self._entries),
+                "max_users": self.max_users,
+                "ttl_s": self.ttl_s,
+                "history_length": self.length,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "approx_bytes": approx_bytes
+            }
+
+class QuestionBank:
+    """✅ Banco de preguntas de solo lectura con sus índices
+
+    Se construye completo antes de publicarse y se sustituye de una vez al recargar
+    el contenido, así una petición nunca ve índices de una versión y preguntas de otra.
+    """
+
+    def __init__(self, questions_by_level, version="builtin", content_hash=None):
+        self.questions_by_level = FrozenPayload(
+            (level, tuple(map(FrozenPayload, questions)))
+            for level, questions in questions_by_level.items()
+        )
+        self.version = version
+        self.content_hash = content_hash or content_fingerprint(questions_by_level)
+        self.index = self._build_question_index()
+        self.by_text = self._build_text_index()
+        # (pregunta, nivel) → scaffolding, memorizado al primer uso
+        self.scaffolding = {}
+
+    def _build_question_index(self):
+        """✅ Índice (nivel, tema, tiempo verbal) → posiciones en la lista del nivel
+
+        None en tema o tiempo verbal actúa como comodín, así cualquier combinación de
+        filtros es una sola consulta al diccionario. Las posiciones quedan ordenadas
+        (QuestionDatabase._sample_question las busca con bisect).
+        """
+        index = {}
+        for level, questions in self.questions_by_level.items():
+            exact = {}
+            for position, question in enumerate(questions):
+                exact.setdefault((question["topic"], question["tense"]), []).append(position)
+
+            by_topic, by_tense = {}, {}
+            for (topic, tense), positions in exact.items():
+                index[(level, topic, tense)] = tuple(positions)
+                by_topic.setdefault(topic, []).extend(positions)
+                by_tense.setdefault(tense, []).extend(positions)
+            for topic, positions in by_topic.items():
+                index[(level, topic, None)] = tuple(sorted(positions))
+            for tense, positions in by_tense.items():
+                index[(level, None, tense)] = tuple(sorted(positions))
+            if questions:
+                index[(level, None, None)] = tuple(range(len(questions)))
+        return index
+
+    def _build_text_index(self):
+        """✅ Texto inglés normalizado → registro de la pregunta (el primer nivel gana)"""
+        index = {}
+        for questions in self.questions_by_level.values():
+            for question in questions:
+                index.setdefault(normalize_lookup_key(question["english"]), question)
+        return index
+
+    def size(self):
+        return sum(len(questions) for questions in self.questions_by_level.values())
+
 class QuestionDatabase:
     """Base de datos de preguntas con GRAMÁTICA 100% VERIFICADA"""
     
+    # ✅ SCAFFOLDING ESPECÍFICO - ¡100% ESPECÍFICO! (el resto se genera por tipo de pregunta)
+    SPECIFIC_SCAFFOLDING = {
+        "What is your name?": {
+            "template": "My name is [your name]. I am from [your country/city].",
+            "vocabulary": ["name", "My name is", "I am", "called", "from", "originally from"],
+            "grammar_tip": "✅ Use 'My name is' for formal introduction. Use 'I am' for casual situations.",
+            "common_mistakes": ["❌ I name is (incorrect)", "❌ My name (incomplete sentence)"],
+            "practice_sentences": [
+                "✅ My name is John. I am from New York.",
+                "✅ My name is Maria. I am originally from Spain.",
+                "✅ They call me Alex. I am from London."
+            ],
+            "sentence_starters": [
+                "✅ My name is...",
+                "✅ I am called...",
+                "✅ People call me...",
+                "✅ I go by the name..."
+            ]
+        },
+        
+        "How old are you?": {
+            "template": "I am [number] years old. I will be [next number] next [month/year].",
+            "vocabulary": ["years old", "age", "I am", "turning", "next", "birthday"],
+            "grammar_tip": "✅ Always use 'years old' after the number. Never say 'I have X years' in English.",
+            "common_mistakes": ["❌ I have 25 years (Spanish structure)", "❌ I am 25 (incomplete)"],
+            "practice_sentences": [
+                "✅ I am 25 years old. I will be 26 next month.",
+                "✅ She is 30 years old. Her birthday is in June.",
+                "✅ He is 40 years old. He was born in 1983."
+            ],
+            "sentence_starters": [
+                "✅ I am... years old.",
+                "✅ I'm... years old.",
+                "✅ I'll be... next...",
+                "✅ My age is..."
+            ]
+        },
+        
+        "Where are you from?": {
+            "template": "I am from [country]. I live in [city].",
+            "vocabulary": ["from", "originally from", "come from", "born in", "live in", "grew up in"],
+            "grammar_tip": "✅ Use 'I am from' for nationality. Use 'I live in' for current residence.",
+            "common_mistakes": ["❌ I from Mexico (missing 'am')", "❌ I live from (wrong preposition)"],
+            "practice_sentences": [
+                "✅ I am from Mexico. I live in Mexico City.",
+                "✅ I come from Argentina. I was born in Buenos Aires.",
+                "✅ I am originally from Colombia but I live in the United States now."
+            ],
+            "sentence_starters": [
+                "✅ I am from...",
+                "✅ I come from...",
+                "✅ I was born in...",
+                "✅ I live in..."
+            ]
+        }
+    }
+
     def __init__(self):
-        # ✅ PREGUNTAS CON GRAMÁTICA PERFECTA ORGANIZADAS POR NIVEL
-        self.questions_by_level = {
+        # ✅ PREGUNTAS CON GRAMÁTICA PERFECTA ORGANIZADAS POR NIVEL (contenido integrado)
+        questions_by_level = {
             "beginner": [
                 # Presentación personal - Gramática simple perfecta
                 {"english": "What is your name?", "spanish": "¿Cómo te llamas?", "topic": "personal", "tense": "present_simple"},
@@ -197,52 +631,111 @@ class QuestionDatabase:
             ]
         }
         
-        # ✅ HISTORIAL DE PREGUNTAS POR USUARIO
-        self.user_history = {}
+        # ✅ HISTORIAL DE PREGUNTAS POR USUARIO (acotado)
+        self.user_history = QuestionHistoryStore(
+            max_users=Config.QUESTION_HISTORY_MAX_USERS,
+            ttl_s=Config.QUESTION_HISTORY_TTL_S,
+            length=Config.QUESTION_HISTORY_LENGTH
+        )
         
         # ✅ CONTADOR DE PREGUNTAS
         self.question_counters = {}
-        for level in self.questions_by_level:
-            self.question_counters[level] = 0
-    
-    def get_question(self, user_id, level="beginner", avoid_recent=True):
-        """Obtiene pregunta según nivel con gramática 100% verificada"""
-        
-        # Inicializar historial del usuario si no existe
-        if user_id not in self.user_history:
-            self.user_history[user_id] = {
-                "asked_questions": [],
-                "last_question": None,
-                "level": level
-            }
-        
-        # Obtener preguntas disponibles para el nivel
-        available_questions = self.questions_by_level.get(level, self.questions_by_level["beginner"])
+
+        # ✅ SCAFFOLDING MEMORIZADO + LRU PARA PREGUNTAS FUERA DEL BANCO
+        self.scaffolding_cache_size = Config.SCAFFOLDING_CACHE_SIZE
+        self._scaffolding_lru = OrderedDict()
+        self._scaffolding_lock = threading.Lock()
+        self.scaffolding_hits = 0
+        self.scaffolding_misses = 0
+
+        # ✅ ÍNDICES POR NIVEL, TEMA, TIEMPO VERBAL Y TEXTO
+        self._bank = None
+        self.load_questions(questions_by_level)
+
+    @property
+    def questions_by_level(self):
+        return self._bank.questions_by_level
+
+    def load_questions(self, questions_by_level, version="builtin", content_hash=None):
+        """Construye un banco nuevo y lo publica con una sola asignación (recarga atómica)"""
+        return self.publish(QuestionBank(questions_by_level, version, content_hash))
+
+    def publish(self, bank):
+        """Sustituye el banco activo por uno ya construido (no puede fallar a medias)"""
+        for level in bank.questions_by_level:
+            self.question_counters.setdefault(level, 0)
+        self._bank = bank
+        return bank
+
+    def content_info(self):
+        bank = self._bank
+        return {"version": bank.version, "content_hash": bank.content_hash, "questions": bank.size()}
+
+    def find_question(self, question_english):
+        """Registro de una pregunta del banco por su texto en inglés, o None"""
+        return self._bank.by_text.get(normalize_lookup_key(question_english))
+
+    def find_questions(self, questions_english):
+        """Búsqueda múltiple: un registro (o None) por cada texto, en el mismo orden"""
+        index = self._bank.by_text
+        return [index.get(normalize_lookup_key(text)) for text in questions_english]
+
+    def question_filters(self, level="beginner"):
+        """Temas y tiempos verbales disponibles en un nivel"""
+        index = self._bank.index
+        return {
+            "topics": sorted({topic for lvl, topic, _ in index if lvl == level and topic}),
+            "tenses": sorted({tense for lvl, _, tense in index if lvl == level and tense})
+        }
+
+    def _sample_question(self, candidates, recent):
+        """Elige una posición al azar entre los candidatos que no son recientes
+
+        candidates está ordenado: las recientes se localizan con bisect y se sortea un
+        índice del complemento saltando las excluidas, en O(k log n) con k = historial,
+        sin recorrer los candidatos. Si todos son recientes se permite repetir.
+        """
+        excluded = []
+        for position in recent or ():
+            index = bisect.bisect_left(candidates, position)
+            if index < len(candidates) and candidates[index] == position:
+                excluded.append(index)
+        if len(excluded) >= len(candidates):
+            return candidates[random.randrange(len(candidates))]
+
+        index = random.randrange(len(candidates) - len(excluded))
+        for skipped in sorted(excluded):
+            if skipped > index:
+                break
+            index += 1
+        return candidates[index]
+
+    def get_question(self, user_id, level="beginner", avoid_recent=True, topic=None, tense=None):
+        """Obtiene pregunta según nivel con gramática 100% verificada
+
+        topic y tense filtran opcionalmente; devuelve None si ninguna pregunta coincide.
+        """
         
-        if not available_questions:
-            # Fallback a nivel beginner
-            available_questions = self.questions_by_level["beginner"]
+        # Una sola lectura del banco: una recarga concurrente no mezcla versiones
+        bank = self._bank
+
+        # Fallback a nivel beginner
+        if not bank.questions_by_level.get(level):
+            level = "beginner"
+
+        candidates = bank.index.get((level, topic or None, tense or None))
+        if not candidates:
+            return None
         
-        # ✅ Filtrar preguntas recientes si se solicita
-        if avoid_recent and self.user_history[user_id]["asked_questions"]:
-            recent_questions = self.user_history[user_id]["asked_questions"][-5:]  # Últimas 5 preguntas
-            filtered_questions = [q for q in available_questions if q["english"] not in recent_questions]
-            
-            # Si no hay preguntas disponibles después de filtrar, usar todas
-            if filtered_questions:
-                available_questions = filtered_questions
+        # ✅ Evitar las últimas preguntas (QUESTION_HISTORY_LENGTH) si se solicita
+        recent_questions = self.user_history.recent(user_id, level, bank.content_hash) if avoid_recent else None
         
         # ✅ Seleccionar pregunta aleatoria
-        selected_question = random.choice(available_questions)
+        position = self._sample_question(candidates, recent_questions)
+        selected_question = bank.questions_by_level[level][position]
         
         # ✅ Actualizar historial
-        self.user_history[user_id]["asked_questions"].append(selected_question["english"])
-        self.user_history[user_id]["last_question"] = selected_question["english"]
-        self.user_history[user_id]["level"] = level
-        
-        # Limitar historial a 20 preguntas
-        if len(self.user_history[user_id]["asked_questions"]) > 20:
-            self.user_history[user_id]["asked_questions"] = self.user_history[user_id]["asked_questions"][-20:]
+        self.user_history.record(user_id, level, bank.content_hash, position)
         
         # Incrementar contador
         self.question_counters[level] += 1
@@ -251,79 +744,75 @@ class QuestionDatabase:
             **selected_question,
             "question_number": self.question_counters[level],
             "is_predefined": True,
+            "content_version": bank.version,
+            "content_hash": bank.content_hash,
             "generated_at": datetime.now().isoformat()
         }
     
     def get_scaffolding_for_question(self, question_english, level="beginner"):
-        """✅ GENERA SCAFFOLDING 100% ESPECÍFICO Y CORRECTO para cada pregunta"""
-        
+        """✅ GENERA SCAFFOLDING 100% ESPECÍFICO Y CORRECTO para cada pregunta
+
+        Las preguntas del banco se memorizan en el propio banco (se descartan al recargar
+        el contenido); las desconocidas, en un LRU acotado. Devuelve un FrozenPayload
+        compartido: no modificarlo.
+        """
+        bank = self._bank
+        key = (question_english, level)
+        scaffolding = bank.scaffolding.get(key)
+        if scaffolding is not None:
+            with self._scaffolding_lock:
+                self.scaffolding_hits += 1
+            return scaffolding
+
+        # Solo pregunta del banco con nivel conocido: el nivel lo controla el cliente y
+        # cualquier otro valor va al LRU acotado para no hacer crecer el banco sin límite
+        record = bank.by_text.get(normalize_lookup_key(question_english))
+        if record is not None and record["english"] == question_english and level in bank.questions_by_level:
+            scaffolding = _freeze_payload(self._build_scaffolding(question_english, level))
+            bank.scaffolding[key] = scaffolding
+            with self._scaffolding_lock:
+                self.scaffolding_misses += 1
+            return scaffolding
+
+        with self._scaffolding_lock:
+            scaffolding = self._scaffolding_lru.get(key)
+            if scaffolding is not None:
+                self._scaffolding_lru.move_to_end(key)
+                self.scaffolding_hits += 1
+                return scaffolding
+
+        scaffolding = _freeze_payload(self._build_scaffolding(question_english, level))
+        with self._scaffolding_lock:
+            self.scaffolding_misses += 1
+            if self.scaffolding_cache_size > 0:
+                self._scaffolding_lru[key] = scaffolding
+                while len(self._scaffolding_lru) > self.scaffolding_cache_size:
+                    self._scaffolding_lru.popitem(last=False)
+        return scaffolding
+
+    def scaffolding_stats(self):
+        with self._scaffolding_lock:
+            lookups = self.scaffolding_hits + self.scaffolding_misses
+            return {
+                "memoized": len(self._bank.scaffolding),
+                "lru_entries": len(self._scaffolding_lru),
+                "lru_max_entries": self.scaffolding_cache_size,
+                "hits": self.scaffolding_hits,
+                "misses": self.scaffolding_misses,
+                "hit_ratio": round(self.scaffolding_hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _build_scaffolding(self, question_english, level):
+        """Construye el scaffolding de una pregunta (sin caché)"""
+
         # ✅ DETECTAR TIPO DE PREGUNTA Y TIEMPO VERBAL CORRECTAMENTE
         tense = self._detect_tense(question_english)
         question_type = self._classify_question(question_english)
         topic = self._detect_topic(question_english)
-        
-        # ✅ MAPA DE SCAFFOLDING CORREGIDO - ¡100% ESPECÍFICO!
-        scaffolding_map = {
-            "What is your name?": {
-                "template": "My name is [your name]. I am from [your country/city].",
-                "vocabulary": ["name", "My name is", "I am", "called", "from", "originally from"],
-                "grammar_tip": "✅ Use 'My name is' for formal introduction. Use 'I am' for casual situations.",
-                "common_mistakes": ["❌ I name is (incorrect)", "❌ My name (incomplete sentence)"],
-                "practice_sentences": [
-                    "✅ My name is John. I am from New York.",
-                    "✅ My name is Maria. I am originally from Spain.",
-                    "✅ They call me Alex. I am from London."
-                ],
-                "sentence_starters": [
-                    "✅ My name is...",
-                    "✅ I am called...",
-                    "✅ People call me...",
-                    "✅ I go by the name..."
-                ]
-            },
-            
-            "How old are you?": {
-                "template": "I am [number] years old. I will be [next number] next [month/year].",
-                "vocabulary": ["years old", "age", "I am", "turning", "next", "birthday"],
-                "grammar_tip": "✅ Always use 'years old' after the number. Never say 'I have X years' in English.",
-                "common_mistakes": ["❌ I have 25 years (Spanish structure)", "❌ I am 25 (incomplete)"],
-                "practice_sentences": [
-                    "✅ I am 25 years old. I will be 26 next month.",
-                    "✅ She is 30 years old. Her birthday is in June.",
-                    "✅ He is 40 years old. He was born in 1983."
-                ],
-                "sentence_starters": [
-                    "✅ I am... years old.",
-                    "✅ I'm... years old.",
-                    "✅ I'll be... next...",
-                    "✅ My age is..."
-                ]
-            },
-            
-            "Where are you from?": {
-                "template": "I am from [country]. I live in [city].",
-                "vocabulary": ["from", "originally from", "come from", "born in", "live in", "grew up in"],
-                "grammar_tip": "✅ Use 'I am from' for nationality. Use 'I live in' for current residence.",
-                "common_mistakes": ["❌ I from Mexico (missing 'am')", "❌ I live from (wrong preposition)"],
-                "practice_sentences": [
-                    "✅ I am from Mexico. I live in Mexico City.",
-                    "✅ I come from Argentina. I was born in Buenos Aires.",
-                    "✅ I am originally from Colombia but I live in the United States now."
-                ],
-                "sentence_starters": [
-                    "✅ I am from...",
-                    "✅ I come from...",
-                    "✅ I was born in...",
-                    "✅ I live in..."
-                ]
-            },
-            
-            "default": self._generate_default_scaffolding(question_english, tense, question_type, topic, level)
-        }
-        
+
         # ✅ Buscar scaffolding específico
-        if question_english in scaffolding_map:
-            scaffolding = scaffolding_map[question_english]
+        if question_english in self.SPECIFIC_SCAFFOLDING:
+            scaffolding = dict(self.SPECIFIC_SCAFFOLDING[question_english])
         else:
             # ✅ Generar scaffolding dinámico basado en tipo de pregunta
             scaffolding = self._generate_dynamic_scaffolding(question_english, tense, question_type, topic, level)
@@ -622,58 +1111,6 @@ class QuestionDatabase:
             "✅ Pause between ideas"
         ])
     
-    def _generate_default_scaffolding(self, question, tense, question_type, topic, level):
-        """Genera scaffolding por defecto bien estructurado"""
-        
-        templates_by_tense = {
-            "present_simple": "I usually [verb] [object] because [reason].",
-            "past_simple": "Yesterday/last week, I [past verb] [object]. It was [adjective].",
-            "future_simple": "Tomorrow/next week, I will [verb] [object]. I plan to [additional detail].",
-            "present_perfect": "I have [past participle] [object] recently. This has helped me to [benefit].",
-            "conditional": "If I could, I would [verb] [object]. I would also [additional action]."
-        }
-        
-        vocabulary_by_topic = {
-            "personal": ["I", "my", "me", "family", "friends", "home", "life", "experience"],
-            "food": ["eat", "drink", "cook", "restaurant", "meal", "dish", "cuisine", "taste"],
-            "hobbies": ["enjoy", "like", "hobby", "activity", "free time", "relax", "fun", "interest"],
-            "work_study": ["work", "study", "job", "career", "project", "team", "goal", "skill"],
-            "travel": ["travel", "visit", "country", "city", "culture", "experience", "adventure", "sightseeing"],
-            "learning": ["learn", "study", "practice", "improve", "skill", "knowledge", "progress", "achievement"],
-            "opinions": ["think", "believe", "opinion", "perspective", "view", "feel", "consider", "argue"]
-        }
-        
-        grammar_tips_by_tense = {
-            "present_simple": "✅ Use present simple for habits, routines, and general truths.",
-            "past_simple": "✅ Use past simple for completed actions in the past. Add time expressions.",
-            "future_simple": "✅ Use 'will' for predictions and spontaneous decisions. Use 'going to' for plans.",
-            "present_perfect": "✅ Use present perfect for experiences and recent actions with present relevance.",
-            "conditional": "✅ Use second conditional (if + past simple, would + base verb) for hypothetical situations."
-        }
-        
-        return {
-            "template": templates_by_tense.get(tense, "I [verb] [object] because [reason]."),
-            "vocabulary": vocabulary_by_topic.get(topic, ["think", "believe", "experience", "important", "because"]),
-            "grammar_tip": grammar_tips_by_tense.get(tense, "✅ Use complete sentences with subject + verb + complement."),
-            "common_mistakes": [
-                "❌ Forgetting subject-verb agreement",
-                "❌ Missing articles (a/an/the)",
-                "❌ Wrong word order",
-                "❌ Incorrect tense usage"
-            ],
-            "practice_sentences": [
-                "✅ Try to make a complete sentence.",
-                "✅ Add details to explain your answer.",
-                "✅ Use vocabulary related to the topic."
-            ],
-            "sentence_starters": [
-                "✅ I think that...",
-                "✅ In my opinion...",
-                "✅ From my experience...",
-                "✅ What I believe is..."
-            ]
-        }
-    
     def _generate_dynamic_scaffolding(self, question, tense, question_type, topic, level):
         """Genera scaffolding dinámico basado en la pregunta"""
         
@@ -751,10 +1188,29 @@ class QuestionDatabase:
 # ============================================
 # SISTEMA DE JUEGO DE VOCABULARIO
 # ============================================
+class WordBank:
+    """✅ Vocabulario de solo lectura con índice por palabra en español (se sustituye entero)"""
+
+    def __init__(self, word_database, version="builtin", content_hash=None):
+        self.word_database = FrozenPayload(
+            (dificultad, tuple(map(FrozenPayload, palabras)))
+            for dificultad, palabras in word_database.items()
+        )
+        self.version = version
+        self.content_hash = content_hash or content_fingerprint(word_database)
+        # ✅ Índice palabra en español normalizada → entrada, por dificultad
+        self.index = {
+            dificultad: {normalize_lookup_key(palabra["español"]): palabra for palabra in palabras}
+            for dificultad, palabras in self.word_database.items()
+        }
+
+    def size(self):
+        return sum(len(palabras) for palabras in self.word_database.values())
+
 class VocabularyGame:
     def __init__(self):
-        # ✅ BASE DE DATOS DE PALABRAS PARA NIVEL FÁCIL (50 palabras)
-        self.word_database = {
+        # ✅ BASE DE DATOS DE PALABRAS PARA NIVEL FÁCIL (50 palabras, contenido integrado)
+        word_database = {
             "fácil": [
                 # ANIMALES (10 palabras)
                 {"español": "perro", "inglés": "dog", "categoría": "animales", "pista": "Animal doméstico que ladra", "ejemplo": "The dog is sleeping"},
@@ -817,10 +1273,30 @@ class VocabularyGame:
                 {"español": "reloj", "inglés": "clock", "categoría": "objetos", "pista": "Objeto que muestra la hora", "ejemplo": "The clock shows the time"}
             ]
         }
+        self._bank = None
+        self.load_words(word_database)
+
+    @property
+    def word_database(self):
+        return self._bank.word_database
+
+    def load_words(self, word_database, version="builtin", content_hash=None):
+        """Construye el vocabulario nuevo y lo publica con una sola asignación (recarga atómica)"""
+        return self.publish(WordBank(word_database, version, content_hash))
+
+    def publish(self, bank):
+        """Sustituye el vocabulario activo por uno ya construido"""
+        self._bank = bank
+        return bank
+
+    def content_info(self):
+        bank = self._bank
+        return {"version": bank.version, "content_hash": bank.content_hash, "words": bank.size()}
     
     def obtener_palabra(self, dificultad="fácil"):
         """Obtiene una palabra aleatoria de la dificultad especificada"""
-        palabras = self.word_database.get(dificultad, self.word_database["fácil"])
+        bank = self._bank
+        palabras = bank.word_database.get(dificultad, bank.word_database["fácil"])
         
         if not palabras:
             # Fallback si no hay palabras
@@ -841,9 +1317,25 @@ class VocabularyGame:
             "pista": palabra["pista"],
             "ejemplo": palabra["ejemplo"],
             "dificultad": dificultad,
-            "puntos_base": self._calcular_puntos(dificultad)
+            "puntos_base": self._calcular_puntos(dificultad),
+            "content_hash": bank.content_hash
         }
     
+    def buscar_palabra(self, palabra_español, dificultad=None):
+        """Entrada de una palabra en español (en la dificultad indicada o en cualquiera), o None"""
+        clave = normalize_lookup_key(palabra_español)
+        word_index = self._bank.index
+        if dificultad is not None:
+            return word_index.get(dificultad, {}).get(clave)
+        for indice in word_index.values():
+            if clave in indice:
+                return indice[clave]
+        return None
+
+    def buscar_palabras(self, palabras_español, dificultad=None):
+        """Búsqueda múltiple: una entrada (o None) por cada palabra, en el mismo orden"""
+        return [self.buscar_palabra(palabra, dificultad) for palabra in palabras_español]
+
     def _calcular_puntos(self, dificultad):
         """Calcula puntos según dificultad"""
         puntos = {
@@ -857,11 +1349,7 @@ class VocabularyGame:
         """Valida si la respuesta del usuario es correcta"""
         
         # Encontrar la palabra en la base de datos
-        palabra_obj = None
-        for palabra in self.word_database.get(dificultad, []):
-            if palabra["español"].lower() == palabra_original.lower():
-                palabra_obj = palabra
-                break
+        palabra_obj = self.buscar_palabra(palabra_original, dificultad)
         
         if not palabra_obj:
             # Si no encuentra la palabra, usar traducción genérica
@@ -907,120 +1395,2270 @@ question_db = QuestionDatabase()
 vocabulary_game = VocabularyGame()
 
 # ============================================
-# PROCESADOR DE AUDIO (CON ERROR 2 CORREGIDO)
+# PACKS DE CONTENIDO VERSIONADOS (RECARGA EN CALIENTE)
 # ============================================
-class AudioProcessor:
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
-    
-    def convert_audio_to_wav(self, audio_bytes):
-        """🚨 ERROR 2 CORREGIDO: Convierte audio a formato WAV PCM"""
-        try:
-            # Crear archivo temporal para el audio original
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_input:
-                tmp_input.write(audio_bytes)
-                input_path = tmp_input.name
-            
+CONTENT_PACK_QUESTION_LEVELS = ("beginner", "intermediate", "advanced")
+CONTENT_PACK_QUESTION_FIELDS = ("english", "spanish", "topic", "tense")
+CONTENT_PACK_WORD_FIELDS = ("español", "inglés", "categoría", "pista", "ejemplo")
+
+def _validate_content_pack(data):
+    """Comprueba la estructura del pack; lanza ValueError con el primer problema"""
+    if not isinstance(data, dict) or not data.get("version"):
+        raise ValueError("content pack needs a 'version'")
+    if "questions" not in data and "vocabulary" not in data:
+        raise ValueError("content pack needs 'questions' and/or 'vocabulary'")
+
+    questions = data.get("questions")
+    if questions is not None:
+        if not isinstance(questions, dict):
+            raise ValueError("content pack 'questions' must be an object keyed by level")
+        for level in CONTENT_PACK_QUESTION_LEVELS:
+            if not questions.get(level):
+                raise ValueError(f"content pack has no questions for level '{level}'")
+        for level, items in questions.items():
+            if not isinstance(items, list):
+                raise ValueError(f"questions for level '{level}' must be a list")
+            for position, question in enumerate(items):
+                if not isinstance(question, dict):
+                    raise ValueError(f"question {level}[{position}] must be an object")
+                missing = [field for field in CONTENT_PACK_QUESTION_FIELDS if not question.get(field)]
+                if missing:
+                    raise ValueError(f"question {level}[{position}] is missing {', '.join(missing)}")
+
+    vocabulary = data.get("vocabulary")
+    if vocabulary is not None:
+        if not isinstance(vocabulary, dict):
+            raise ValueError("content pack 'vocabulary' must be an object keyed by difficulty")
+        if not vocabulary.get("fácil"):
+            raise ValueError("content pack has no vocabulary for difficulty 'fácil'")
+        for dificultad, items in vocabulary.items():
+            if not isinstance(items, list):
+                raise ValueError(f"vocabulary for difficulty '{dificultad}' must be a list")
+            for position, palabra in enumerate(items):
+                if not isinstance(palabra, dict):
+                    raise ValueError(f"word {dificultad}[{position}] must be an object")
+                missing = [field for field in CONTENT_PACK_WORD_FIELDS if not palabra.get(field)]
+                if missing:
+                    raise ValueError(f"word {dificultad}[{position}] is missing {', '.join(missing)}")
+
+def read_content_pack(path):
+    """Lee y valida un pack JSON o MessagePack; devuelve (datos, hash del archivo)"""
+    raw = Path(path).read_bytes()
+    if path.endswith(('.msgpack', '.mpk')):
+        if msgpack is None:
+            raise RuntimeError("MessagePack content packs require 'pip install msgpack'")
+        data = msgpack.unpackb(raw, raw=False)
+    else:
+        data = json.loads(raw)
+    _validate_content_pack(data)
+    return data, hashlib.sha256(raw).hexdigest()[:16]
+
+def write_content_pack(path, version, question_db, vocabulary_game):
+    """Exporta el contenido activo como pack (punto de partida para editarlo fuera del código)"""
+    data = {
+        "version": version,
+        "questions": {level: [dict(q) for q in items] for level, items in question_db.questions_by_level.items()},
+        "vocabulary": {d: [dict(w) for w in items] for d, items in vocabulary_game.word_database.items()}
+    }
+    if path.endswith(('.msgpack', '.mpk')):
+        if msgpack is None:
+            raise RuntimeError("MessagePack content packs require 'pip install msgpack'")
+        payload = msgpack.packb(data, use_bin_type=True)
+    else:
+        payload = json.dumps(data, ensure_ascii=False, indent=1).encode('utf-8')
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(payload)
+
+class ContentPackManager:
+    """✅ Carga el pack de contenido y lo recarga sin reiniciar workers
+
+    Cada worker comprueba el archivo (os.stat) como mucho cada check_interval_s y lo
+    vuelve a leer si cambió; SIGUSR2 o el endpoint de administración fuerzan la recarga.
+    Un pack inválido se rechaza y se sigue sirviendo el contenido anterior. Para publicar
+    un pack nuevo, escribirlo en un archivo temporal y renombrarlo sobre el actual.
+    """
+
+    def __init__(self, path, question_db, vocabulary_game, check_interval_s=5.0):
+        self.path = path
+        self.question_db = question_db
+        self.vocabulary_game = vocabulary_game
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._file_key = None
+        self._next_check = 0.0
+
+        self.version = None
+        self.content_hash = None
+        self.loaded_at = None
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_error = None
+        self.last_load_ms = None
+
+    def reload(self, force=False):
+        """Aplica el pack si el archivo cambió (o siempre con force); True si se aplicó"""
+        if not self.path:
+            return False
+
+        with self._lock:
+            started = time.perf_counter()
             try:
-                # Intentar cargar el audio con pydub
-                audio = AudioSegment.from_file(input_path)
-                
-                # Configurar parámetros compatibles con speech_recognition
-                audio = audio.set_channels(1)  # mono
-                audio = audio.set_frame_rate(16000)  # 16kHz
-                audio = audio.set_sample_width(2)  # 16-bit
-                
-                # Crear archivo WAV temporal
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_output:
-                    output_path = tmp_output.name
-                
-                # Exportar como WAV
-                audio.export(output_path, format="wav")
-                
-                # Leer el WAV convertido
-                with open(output_path, 'rb') as f:
-                    wav_bytes = f.read()
-                
-                # Limpiar archivos temporales
-                os.unlink(input_path)
-                os.unlink(output_path)
-                
-                return wav_bytes
-                
+                st = os.stat(self.path)
+                file_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+                if file_key == self._file_key and not force:
+                    return False
+                # Un archivo roto no se vuelve a leer hasta que cambie
+                self._file_key = file_key
+                data, content_hash = read_content_pack(self.path)
+
+                # Construir todo antes de publicar: un fallo no deja un pack a medias
+                version = str(data["version"])
+                question_bank = (QuestionBank(data["questions"], version, content_hash)
+                                 if "questions" in data else None)
+                word_bank = (WordBank(data["vocabulary"], version, content_hash)
+                             if "vocabulary" in data else None)
             except Exception as e:
-                # Si falla la conversión, limpiar y retornar None
-                if os.path.exists(input_path):
-                    os.unlink(input_path)
-                logger.warning(f"Audio conversion failed, will use original: {e}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Error in convert_audio_to_wav: {e}")
-            return None
-    
-    def transcribe_audio(self, audio_bytes):
-        """🚨 ERROR 2 CORREGIDO: Transcribe audio con conversión a WAV"""
+                self.failed_reloads += 1
+                self.last_error = str(e)[:200]
+                logger.error(f"Could not load content pack {self.path}: {e}")
+                raise
+
+            if question_bank is not None:
+                self.question_db.publish(question_bank)
+            if word_bank is not None:
+                self.vocabulary_game.publish(word_bank)
+
+            self.version = version
+            self.content_hash = content_hash
+            self.loaded_at = datetime.now().isoformat()
+            self.last_error = None
+            self.reloads += 1
+            self.last_load_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        logger.info(f"Loaded content pack {version} ({content_hash}) from {self.path}")
+        return True
+
+    def maybe_reload(self):
+        """Comprobación barata y espaciada en el tiempo; se llama antes de cada petición"""
+        if not self.path or self.check_interval_s <= 0 or time.monotonic() < self._next_check:
+            return
+        self._next_check = time.monotonic() + self.check_interval_s
         try:
-            # Primero intentar convertir a WAV
-            wav_bytes = self.convert_audio_to_wav(audio_bytes)
-            
-            # Usar WAV convertido si está disponible, si no usar original
-            audio_to_use = wav_bytes if wav_bytes is not None else audio_bytes
-            
-            audio_io = io.BytesIO(audio_to_use)
-            
-            with sr.AudioFile(audio_io) as source:
-                # Ajustar para ruido ambiente
-                self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                audio_data = self.recognizer.record(source)
-                
-                try:
-                    # Intentar reconocimiento
-                    text = self.recognizer.recognize_google(audio_data, language='en-US')
-                    return {"text": text, "language": "en", "error": None}
-                except sr.UnknownValueError:
-                    return {"text": "", "language": "unknown", "error": "No speech detected"}
-                except sr.RequestError as e:
-                    return {"text": "", "language": "unknown", "error": f"Speech recognition error: {str(e)}"}
-                        
-        except Exception as e:
-            logger.error(f"Error in transcription: {str(e)}")
-            return {"text": "", "language": "unknown", "error": str(e)}
+            self.reload()
+        except Exception:
+            pass  # ya registrado; se mantiene el contenido anterior
+
+    def reload_in_background(self):
+        """Recarga forzada fuera del manejador de señales"""
+        def run():
+            try:
+                self.reload(force=True)
+            except Exception:
+                pass
+        threading.Thread(target=run, name="content-reload", daemon=True).start()
+
+    def stats(self):
+        return {
+            "path": self.path or None,
+            "pack_version": self.version,
+            "pack_hash": self.content_hash,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "last_error": self.last_error,
+            "last_load_ms": self.last_load_ms,
+            "questions": self.question_db.content_info(),
+            "vocabulary": self.vocabulary_game.content_info()
+        }
+
+# ✅ Inicializar packs de contenido (sin CONTENT_PACK_PATH se usa el contenido integrado)
+content_packs = ContentPackManager(
+    Config.CONTENT_PACK_PATH, question_db, vocabulary_game, Config.CONTENT_PACK_CHECK_INTERVAL_S
+)
+if Config.CONTENT_PACK_PATH:
+    try:
+        content_packs.reload(force=True)
+    except Exception:
+        logger.warning("Using built-in questions and vocabulary")
 
-audio_processor = AudioProcessor()
+    if hasattr(signal, "SIGUSR2"):
+        try:
+            signal.signal(signal.SIGUSR2, lambda signum, frame: content_packs.reload_in_background())
+        except ValueError:
+            pass  # solo se puede instalar desde el hilo principal
+
+@app.before_request
+def _refresh_content_pack():
+    content_packs.maybe_reload()
+
+@app.route('/api/admin/content/reload', methods=['POST'])
+def reload_content_pack():
+    """Recarga el pack de contenido en este worker (los demás lo detectan por el cambio de archivo)"""
+    if not Config.ADMIN_TOKEN:
+        return jsonify({"status": "error", "message": "Admin endpoints are disabled"}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), Config.ADMIN_TOKEN):
+        return jsonify({"status": "error", "message": "Invalid admin token"}), 403
+    if not Config.CONTENT_PACK_PATH:
+        return jsonify({"status": "error", "message": "CONTENT_PACK_PATH is not configured"}), 400
+
+    try:
+        reloaded = content_packs.reload(force=True)
+        return jsonify({"status": "success", "data": {"reloaded": reloaded, **content_packs.stats()}})
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)[:100],
+            "data": content_packs.stats()
+        }), 500
 
 # ============================================
-# GESTIÓN DE PROGRESO DEL USUARIO
+# PROCESADOR DE AUDIO (CON ERROR 2 CORREGIDO)
 # ============================================
-class UserProgressManager:
-    """✅ Gestiona TODO el progreso del usuario desde el backend"""
-    
-    def __init__(self):
-        self.db_file = "user_progress.json"
-        self._init_database()
-    
-    def _init_database(self):
-        """Inicializa la base de datos si no existe"""
-        if not Path(self.db_file).exists():
-            initial_data = {
-                "users": {},
-                "statistics": {
-                    "total_sessions": 0,
-                    "total_questions_asked": 0,
-                    "total_audio_processes": 0,
-                    "vocabulary_game_plays": 0
-                }
+class PCMAudioSource(sr.AudioSource):
+    """Fuente de speech_recognition sobre PCM mono en memoria (sin contenedor WAV)"""
+
+    def __init__(self, pcm_bytes, sample_rate, sample_width):
+        self.SAMPLE_RATE = sample_rate
+        self.SAMPLE_WIDTH = sample_width
+        self.CHUNK = 4096
+        self.stream = None
+        self._pcm_bytes = pcm_bytes
+
+    def __enter__(self):
+        self.stream = io.BytesIO(self._pcm_bytes)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+
+def estimate_noise_floor(pcm_bytes, sample_rate=16000, frame_ms=30, percentile=10):
+    """✅ Suelo de ruido (RMS) en una sola pasada vectorizada sobre todo el PCM s16le
+
+    Sustituye a recognizer.adjust_for_ambient_noise, que recorre el primer medio segundo
+    en un bucle Python y además consume ese audio (cortando el inicio de respuestas cortas).
+    """
+    samples = np.frombuffer(pcm_bytes, dtype='<i2')
+    frame_size = sample_rate * frame_ms // 1000
+    frame_count = len(samples) // frame_size
+    if frame_count == 0:
+        return None
+
+    frames = samples[:frame_count * frame_size].reshape(frame_count, frame_size).astype(np.float32)
+    energy = np.einsum('ij,ij->i', frames, frames)
+
+    # Percentil por selección parcial (O(n)), sin ordenar todas las tramas
+    k = frame_count * percentile // 100
+    return float(np.sqrt(np.partition(energy, k)[k] / frame_size))
+
+def benchmark_noise_floor(seconds=5.0, repeat=50):
+    """Micro-benchmark: estimate_noise_floor frente a adjust_for_ambient_noise
+
+    Uso: python eli_backend.py --benchmark-noise
+    """
+    rate = AudioProcessor.SAMPLE_RATE
+    width = AudioProcessor.SAMPLE_WIDTH
+    rng = np.random.default_rng(0)
+    pcm_bytes = rng.normal(0, 300, int(seconds * rate)).astype('<i2').tobytes()
+    recognizer = sr.Recognizer()
+
+    def legacy(duration):
+        with PCMAudioSource(pcm_bytes, rate, width) as source:
+            recognizer.adjust_for_ambient_noise(source, duration=duration)
+
+    def timed(func):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    results = {
+        "adjust_for_ambient_noise_0.5s_ms": timed(lambda: legacy(0.5)),
+        f"adjust_for_ambient_noise_{seconds:g}s_ms": timed(lambda: legacy(seconds)),
+        f"estimate_noise_floor_{seconds:g}s_ms": timed(lambda: estimate_noise_floor(pcm_bytes, rate))
+    }
+    for name, ms in results.items():
+        print(f"   • {name}: {ms:.3f} ms")
+    return results
+
+def _metrics_delta(owner, fields):
+    """Cambio de los contadores de owner desde su última exportación
+
+    Los procesos del pool de audio devuelven este delta con cada resultado y el padre
+    lo suma a sus propios contadores (_merge_metrics), así /api/health ve todo el trabajo.
+    El llamador sostiene el lock que protege los campos.
+    """
+    last = owner.__dict__.setdefault("_exported_metrics", {})
+    delta = {}
+    for field in fields:
+        value = getattr(owner, field)
+        previous = last.get(field)
+        if isinstance(value, dict):
+            value = dict(value)
+            previous = previous or {}
+            delta[field] = {key: count - previous.get(key, 0) for key, count in value.items()
+                            if count != previous.get(key, 0)}
+        else:
+            delta[field] = value - (previous or 0)
+        last[field] = value
+    return delta
+
+def _merge_metrics(owner, delta):
+    """Suma a owner un delta de _metrics_delta (el llamador sostiene el lock)"""
+    for field, value in delta.items():
+        if isinstance(value, dict):
+            target = getattr(owner, field)
+            for key, count in value.items():
+                target[key] = target.get(key, 0) + count
+        else:
+            setattr(owner, field, getattr(owner, field) + value)
+
+class LatencyStats:
+    """Métricas de latencia con ventana acotada (para p50/p95)"""
+
+    def __init__(self, window=1024):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += seconds
+            if not ok:
+                self.errors += 1
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def export_metrics(self):
+        """Llamadas y muestras nuevas desde la última exportación"""
+        with self._lock:
+            delta = _metrics_delta(self, ("calls", "errors", "total_seconds"))
+            fresh = min(delta["calls"], len(self._samples))
+            delta["samples"] = list(self._samples)[len(self._samples) - fresh:] if fresh else []
+            return delta
+
+    def merge_metrics(self, delta):
+        with self._lock:
+            self._samples.extend(delta.pop("samples"))
+            _merge_metrics(self, delta)
+
+    def snapshot(self):
+        p50 = self.percentile(0.50)
+        p95 = self.percentile(0.95)
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "avg_ms": round(self.total_seconds / self.calls * 1000, 1) if self.calls else None,
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "max_ms": round(max(self._samples) * 1000, 1) if self._samples else None
             }
-            self._save_data(initial_data)
-    
-    def _load_data(self):
+
+class RecognizerBackend:
+    """Interfaz de motor de reconocimiento
+
+    recognize(audio_data) devuelve el texto o lanza sr.UnknownValueError (sin voz)
+    o sr.RequestError (fallo del motor), igual que los recognize_* de speech_recognition.
+    """
+
+    name = "base"
+    remote = False  # los motores de red admiten peticiones duplicadas (hedging)
+
+    def __init__(self, language="en-US"):
+        self.language = language
+        self.latency = LatencyStats()
+
+    def recognize(self, audio_data):
+        raise NotImplementedError
+
+    @property
+    def primary(self):
+        """Motor principal (el propio motor salvo en una cadena de respaldo)"""
+        return self.name
+
+    def recognize_with_source(self, audio_data):
+        """Devuelve (texto, nombre del motor que respondió)"""
+        return self.recognize(audio_data), self.name
+
+    def set_timeout(self, seconds):
+        """Plazo de red del propio motor (los motores locales no pueden interrumpirse)"""
+        pass
+
+    def export_metrics(self):
+        return {"latency": self.latency.export_metrics()}
+
+    def merge_metrics(self, delta):
+        self.latency.merge_metrics(delta["latency"])
+
+    def breaker_states(self):
+        """Estado de los circuit breakers, para sincronizarlo con los procesos del pool"""
+        return {}
+
+    def load_breaker_states(self, states):
+        pass
+
+    def stats(self):
+        return {self.name: self.latency.snapshot()}
+
+class GoogleRecognizerBackend(RecognizerBackend):
+    """Google Web Speech API (llamada de red bloqueante)"""
+
+    name = "google"
+    remote = True
+
+    def __init__(self, language="en-US", timeout_s=None):
+        super().__init__(language)
+        self.recognizer = sr.Recognizer()
+        # Sin esto urlopen espera indefinidamente a un servidor colgado
+        self.recognizer.operation_timeout = timeout_s
+
+    def set_timeout(self, seconds):
+        self.recognizer.operation_timeout = seconds
+
+    def recognize(self, audio_data):
+        return self.recognizer.recognize_google(audio_data, language=self.language)
+
+class HTTPRecognizerBackend(RecognizerBackend):
+    """Servicio HTTP propio: POST del WAV, respuesta JSON {"text": ...}
+
+    Sirve para motores autoalojados y para probar la cadena de respaldo contra
+    el servidor falso (python eli_backend.py --fake-recognizer).
+    """
+
+    name = "http"
+    remote = True
+
+    def __init__(self, language="en-US", url="", timeout_s=None):
+        super().__init__(language)
+        self.url = url
+        self.timeout_s = timeout_s
+
+    def set_timeout(self, seconds):
+        self.timeout_s = seconds
+
+    def recognize(self, audio_data):
+        wav_bytes = audio_data.get_wav_data(convert_rate=AudioProcessor.SAMPLE_RATE, convert_width=2)
+        separator = '&' if '?' in self.url else '?'
+        http_request = urllib.request.Request(
+            f"{self.url}{separator}{urllib.parse.urlencode({'lang': self.language})}",
+            data=wav_bytes,
+            headers={"Content-Type": "audio/wav"}
+        )
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout_s) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise sr.RequestError(f"recognition request failed: HTTP {e.code}")
+        except (urllib.error.URLError, TimeoutError, OSError, ValueError) as e:
+            raise sr.RequestError(f"recognition connection failed: {e}")
+
+        text = (payload.get("text") or "").strip()
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+class VoskRecognizerBackend(RecognizerBackend):
+    """✅ Reconocimiento offline en CPU con Vosk (modelo cargado una vez por worker)"""
+
+    name = "vosk"
+
+    def __init__(self, language="en-US", model_path="model"):
+        super().__init__(language)
+        if vosk is None:
+            raise RuntimeError("The vosk recognizer backend requires 'pip install vosk'")
+        if not Path(model_path).exists():
+            raise RuntimeError(f"Vosk model not found at '{model_path}'")
+        vosk.SetLogLevel(-1)
+        self.model = vosk.Model(model_path)
+
+    def recognize(self, audio_data):
+        pcm_bytes = audio_data.get_raw_data(convert_rate=AudioProcessor.SAMPLE_RATE, convert_width=2)
+        recognizer = vosk.KaldiRecognizer(self.model, AudioProcessor.SAMPLE_RATE)
+        recognizer.AcceptWaveform(pcm_bytes)
+        text = json.loads(recognizer.FinalResult()).get("text", "").strip()
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+class StubRecognizerBackend(RecognizerBackend):
+    """Motor determinista para benchmarks y pruebas de carga sin red"""
+
+    name = "stub"
+
+    def __init__(self, language="en-US", text="", latency_ms=0):
+        super().__init__(language)
+        self.text = text
+        self.latency_seconds = latency_ms / 1000.0
+
+    def recognize(self, audio_data):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if not audio_data.frame_data or not self.text:
+            raise sr.UnknownValueError()
+        return self.text
+
+class CircuitBreaker:
+    """✅ Corta las llamadas a un motor tras failure_threshold fallos seguidos
+
+    Abierto: se salta el motor durante reset_timeout_s. Después pasa a semiabierto
+    y deja pasar una única llamada de prueba: si responde se cierra, si falla se reabre.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout_s=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.opens = 0
+        self.short_circuited = 0
+        # Resultados sin exportar; solo se registran en los procesos del pool (ver _init_pool_worker)
+        self._outcomes = None
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._outcomes is not None:
+                self._outcomes.append(True)
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            if self._outcomes is not None:
+                self._outcomes.append(False)
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def export_metrics(self):
+        """Resultados desde la última exportación (la primera llamada activa el registro)"""
+        with self._lock:
+            outcomes, self._outcomes = self._outcomes or [], []
+            return {"outcomes": outcomes, **_metrics_delta(self, ("short_circuited",))}
+
+    def merge_metrics(self, delta):
+        # Reproducir los resultados del hijo: el padre decide cuándo se abre el circuito
+        for ok in delta["outcomes"]:
+            if ok:
+                self.record_success()
+            else:
+                self.record_failure()
+        with self._lock:
+            self.short_circuited += delta["short_circuited"]
+
+    def export_state(self):
+        with self._lock:
+            return self.state, self.consecutive_failures, self.opened_at
+
+    def load_state(self, state):
+        with self._lock:
+            self.state, self.consecutive_failures, self.opened_at = state
+            self._trial_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "opens": self.opens,
+                "short_circuited": self.short_circuited
+            }
+
+class ResilientRecognizer(RecognizerBackend):
+    """✅ Cadena de motores con plazo por motor, hedging y circuit breaker
+
+    Cada motor se llama en un hilo aparte y se abandona al agotar su plazo; entonces
+    (o ante un RequestError, o con su circuito abierto) se pasa al siguiente motor.
+    "Sin voz" es una respuesta válida y no activa el respaldo. Si todos fallan se
+    lanza un RequestError que el cliente muestra como "please retry".
+
+    Hedging: si un motor de red no ha respondido al llegar a su p95 se lanza una
+    segunda petición idéntica y gana la primera respuesta.
+    """
+
+    def __init__(self, backends, budgets=None, default_budget_s=8.0, hedge=False,
+                 hedge_min_samples=20, breaker_failures=5, breaker_reset_s=30.0, max_threads=8):
+        super().__init__(backends[0].language)
+        self.backends = backends
+        self.name = ">".join(backend.name for backend in backends)
+        self.budgets = budgets or {}
+        self.default_budget_s = default_budget_s
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.max_threads = max_threads
+        self.breakers = {
+            backend.name: CircuitBreaker(breaker_failures, breaker_reset_s) for backend in backends
+        }
+        # El socket de los motores de red vence con su plazo: una llamada abandonada
+        # no se queda ocupando un hilo del ejecutor indefinidamente
+        for backend in backends:
+            backend.set_timeout(self.budget_for(backend))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._abandoned = 0
+
+        self.timeouts = {backend.name: 0 for backend in backends}
+        self.fallbacks = 0
+        self.exhausted = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    @property
+    def primary(self):
+        return self.backends[0].name
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # Los hilos no sobreviven a un fork: un ejecutor por proceso
+                self._pid = os.getpid()
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_threads, thread_name_prefix="recognizer"
+                )
+            return self._executor
+
+    def budget_for(self, backend):
+        return self.budgets.get(backend.name, self.default_budget_s)
+
+    def _hedge_delay(self, backend, budget):
+        """Espera antes de duplicar la petición (p95 del motor), o None si no aplica"""
+        if not self.hedge or not backend.remote or backend.latency.calls < self.hedge_min_samples:
+            return None
+        p95 = backend.latency.percentile(0.95)
+        return p95 if p95 is not None and p95 < budget else None
+
+    @staticmethod
+    def _timed_call(backend, audio_data):
+        started = time.perf_counter()
+        try:
+            text = backend.recognize(audio_data)
+        except sr.UnknownValueError:
+            backend.latency.record(time.perf_counter() - started)
+            raise
+        except Exception:
+            backend.latency.record(time.perf_counter() - started, ok=False)
+            raise
+        backend.latency.record(time.perf_counter() - started)
+        return text
+
+    def _release_abandoned(self, future):
+        with self._lock:
+            self._abandoned -= 1
+
+    def _call_with_budget(self, backend, audio_data):
+        """Llama al motor con su plazo (y hedging); lanza sr.RequestError si no responde a tiempo"""
+        executor = self._get_executor()
+        budget = self.budget_for(backend)
+        with self._lock:
+            if self._abandoned >= self.max_threads:
+                # Todos los hilos siguen dentro de llamadas colgadas: encolar solo agotaría el plazo
+                raise sr.RequestError(f"{backend.name} skipped: all recognizer threads are busy with timed-out calls")
+        deadline = time.monotonic() + budget
+        futures = [executor.submit(self._timed_call, backend, audio_data)]
+
+        hedge_delay = self._hedge_delay(backend, budget)
+        if hedge_delay is not None:
+            done, _ = concurrent.futures.wait(futures, timeout=hedge_delay)
+            if not done:
+                futures.append(executor.submit(self._timed_call, backend, audio_data))
+                with self._lock:
+                    self.hedges_sent += 1
+
+        last_error = None
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+                try:
+                    text = future.result()
+                except sr.UnknownValueError:
+                    raise
+                except Exception as e:
+                    last_error = e
+                    continue
+                if len(futures) > 1 and future is futures[1]:
+                    with self._lock:
+                        self.hedges_won += 1
+                return text
+        except concurrent.futures.TimeoutError:
+            with self._lock:
+                self.timeouts[backend.name] += 1
+            raise sr.RequestError(f"{backend.name} timed out after {budget:g}s")
+        finally:
+            for future in futures:
+                # Las que ya corren no se pueden cancelar: contarlas hasta que terminen
+                if not future.cancel() and not future.done():
+                    with self._lock:
+                        self._abandoned += 1
+                    future.add_done_callback(self._release_abandoned)
+
+        if isinstance(last_error, sr.RequestError):
+            raise last_error
+        raise sr.RequestError(f"{backend.name} failed: {last_error}")
+
+    def recognize_with_source(self, audio_data):
+        errors = []
+        for position, backend in enumerate(self.backends):
+            breaker = self.breakers[backend.name]
+            if not breaker.allow():
+                errors.append(f"{backend.name}: circuit open")
+                continue
+            try:
+                text = self._call_with_budget(backend, audio_data)
+            except sr.UnknownValueError:
+                breaker.record_success()
+                raise
+            except sr.RequestError as e:
+                breaker.record_failure()
+                errors.append(f"{backend.name}: {e}")
+                logger.warning(f"Recognizer {backend.name} failed: {e}")
+                continue
+            breaker.record_success()
+            if position:
+                with self._lock:
+                    self.fallbacks += 1
+            return text, backend.name
+
+        with self._lock:
+            self.exhausted += 1
+        raise sr.RequestError(f"all recognizers unavailable, please retry ({'; '.join(errors)[:200]})")
+
+    def recognize(self, audio_data):
+        return self.recognize_with_source(audio_data)[0]
+
+    def export_metrics(self):
+        with self._lock:
+            counters = _metrics_delta(self, ("fallbacks", "exhausted", "hedges_sent", "hedges_won", "timeouts"))
+        return {
+            **super().export_metrics(),
+            "counters": counters,
+            "backends": {backend.name: backend.export_metrics() for backend in self.backends},
+            "breakers": {name: breaker.export_metrics() for name, breaker in self.breakers.items()}
+        }
+
+    def merge_metrics(self, delta):
+        super().merge_metrics(delta)
+        with self._lock:
+            _merge_metrics(self, delta["counters"])
+        for backend in self.backends:
+            backend.merge_metrics(delta["backends"][backend.name])
+        for name, breaker in self.breakers.items():
+            breaker.merge_metrics(delta["breakers"][name])
+
+    def breaker_states(self):
+        return {name: breaker.export_state() for name, breaker in self.breakers.items()}
+
+    def load_breaker_states(self, states):
+        for name, state in states.items():
+            self.breakers[name].load_state(state)
+
+    def stats(self):
+        with self._lock:
+            counters = {
+                "fallbacks": self.fallbacks,
+                "exhausted": self.exhausted,
+                "hedges_sent": self.hedges_sent,
+                "hedges_won": self.hedges_won,
+                "abandoned_in_flight": self._abandoned
+            }
+            timeouts = dict(self.timeouts)
+        return {
+            "chain": [backend.name for backend in self.backends],
+            "hedging": self.hedge,
+            **counters,
+            "backends": {
+                backend.name: {
+                    "budget_s": self.budget_for(backend),
+                    "timeouts": timeouts[backend.name],
+                    "circuit": self.breakers[backend.name].snapshot(),
+                    "latency": backend.latency.snapshot()
+                }
+                for backend in self.backends
+            }
+        }
+
+def _parse_recognizer_budgets(spec):
+    """'google=6,vosk=4' → {'google': 6.0, 'vosk': 4.0}"""
+    budgets = {}
+    for item in spec.split(','):
+        name, _, seconds = item.partition('=')
+        if name.strip() and seconds.strip():
+            budgets[name.strip()] = float(seconds)
+    return budgets
+
+def _create_single_recognizer(name, budget_s):
+    if name == "vosk":
+        return VoskRecognizerBackend(Config.RECOGNIZER_LANGUAGE, Config.VOSK_MODEL_PATH)
+    if name == "stub":
+        return StubRecognizerBackend(
+            Config.RECOGNIZER_LANGUAGE,
+            text=Config.RECOGNIZER_STUB_TEXT,
+            latency_ms=Config.RECOGNIZER_STUB_LATENCY_MS
+        )
+    if name == "http":
+        return HTTPRecognizerBackend(Config.RECOGNIZER_LANGUAGE, Config.RECOGNIZER_HTTP_URL, budget_s)
+    if name == "google":
+        return GoogleRecognizerBackend(Config.RECOGNIZER_LANGUAGE, budget_s)
+    raise ValueError(f"Unknown recognizer backend '{name}'")
+
+def create_recognizer_backend(name):
+    """Crea la cadena de motores (principal + RECOGNIZER_FALLBACKS); si ninguno arranca, Google"""
+    budgets = _parse_recognizer_budgets(Config.RECOGNIZER_BUDGETS)
+    names = [name] + [n.strip() for n in Config.RECOGNIZER_FALLBACKS.split(',') if n.strip()]
+
+    backends = []
+    for backend_name in dict.fromkeys(names):
+        try:
+            backends.append(_create_single_recognizer(
+                backend_name, budgets.get(backend_name, Config.RECOGNIZER_TIMEOUT_S)
+            ))
+        except Exception as e:
+            logger.error(f"Could not start recognizer backend '{backend_name}': {e}")
+    if not backends:
+        logger.warning("No recognizer backend available, using google")
+        backends = [GoogleRecognizerBackend(
+            Config.RECOGNIZER_LANGUAGE, budgets.get("google", Config.RECOGNIZER_TIMEOUT_S)
+        )]
+
+    return ResilientRecognizer(
+        backends,
+        budgets=budgets,
+        default_budget_s=Config.RECOGNIZER_TIMEOUT_S,
+        hedge=Config.RECOGNIZER_HEDGE,
+        hedge_min_samples=Config.RECOGNIZER_HEDGE_MIN_SAMPLES,
+        breaker_failures=Config.RECOGNIZER_BREAKER_FAILURES,
+        breaker_reset_s=Config.RECOGNIZER_BREAKER_RESET_S,
+        max_threads=Config.RECOGNIZER_THREADS
+    )
+
+class FakeRecognizerHandler(BaseHTTPRequestHandler):
+    """Servidor falso para HTTPRecognizerBackend con latencia y fallos inyectables
+
+    Query opcional: latency_ms, jitter_ms, failure_rate, text (sobrescriben los del servidor).
+    """
+
+    text = "My name is Eli and I am from Mexico"
+    latency_ms = 0
+    jitter_ms = 0
+    failure_rate = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        option = lambda key, default: type(default)(params[key][0]) if key in params else default
+
+        latency_ms = option("latency_ms", self.latency_ms) + random.uniform(0, option("jitter_ms", self.jitter_ms))
+        time.sleep(latency_ms / 1000.0)
+
+        if random.random() < option("failure_rate", self.failure_rate):
+            status, payload = 503, {"error": "injected failure"}
+        else:
+            status, payload = 200, {"text": option("text", self.text)}
+
+        body = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # el cliente agotó su plazo y cerró la conexión
+
+    def log_message(self, format, *args):
+        pass
+
+def run_fake_recognizer_server(port=8765, latency_ms=0, jitter_ms=0, failure_rate=0.0, text=None):
+    """Arranca el servidor falso (bloqueante). Ver HTTPRecognizerBackend"""
+    handler = type("ConfiguredFakeRecognizerHandler", (FakeRecognizerHandler,), {
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms,
+        "failure_rate": failure_rate,
+        "text": text or FakeRecognizerHandler.text
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print(f"🧪 Fake recognizer on http://127.0.0.1:{port}/recognize "
+          f"(latency {latency_ms} ms ± {jitter_ms} ms, failure rate {failure_rate})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+class VoiceActivityDetector:
+    """✅ Recorte de silencios vectorizado con NumPy (energía + tasa de cruces por cero)
+
+    Trabaja por tramas sobre el PCM decodificado: el umbral se adapta al suelo de ruido
+    del propio clip, se recortan los silencios inicial y final y las pausas internas
+    largas se acortan a max_pause_ms. Menos audio enviado = menos latencia y coste.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, padding_ms=200, max_pause_ms=400,
+                 energy_ratio=3.0, min_rms=100.0, unvoiced_zcr=0.3):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.padding_frames = max(0, padding_ms // frame_ms)
+        self.max_pause_frames = max(1, max_pause_ms // frame_ms)
+        self.energy_ratio = energy_ratio
+        self.min_rms = min_rms
+        self.unvoiced_zcr = unvoiced_zcr
+
+        self._lock = threading.Lock()
+        self.clips = 0
+        self.no_speech_clips = 0
+        self.input_seconds = 0.0
+        self.removed_seconds = 0.0
+
+    def fingerprint(self):
+        """Parámetros que cambian el audio resultante (para la caché de transcripciones)"""
+        return (f"vad:{self.frame_size}:{self.padding_frames}:{self.max_pause_frames}:"
+                f"{self.energy_ratio}:{self.min_rms}:{self.unvoiced_zcr}")
+
+    def speech_mask(self, frames, rms=None, noise_floor=None):
+        """Máscara booleana de tramas con voz (rms por trama y suelo de ruido si ya se calcularon)"""
+        if rms is None:
+            rms = np.sqrt(np.mean(frames * frames, axis=1))
+        return self.classify(rms, self.zero_crossing_rate(frames), noise_floor)
+
+    @staticmethod
+    def zero_crossing_rate(frames):
+        signs = np.signbit(frames)
+        return np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+    def classify(self, rms, zcr, noise_floor=None):
+        """Máscara de voz a partir de rasgos por trama ya calculados (sirve para streaming incremental)"""
+        # Umbral relativo al suelo de ruido, sin superar la mitad del pico (clips sin pausas)
+        if noise_floor is None:
+            noise_floor = np.percentile(rms, 10)
+        threshold = max(self.min_rms, min(noise_floor * self.energy_ratio, rms.max() / 2))
+
+        # Voz sonora por energía; fricativas sordas (s, f, th) por ZCR alta con energía moderada
+        return (rms > threshold) | ((rms > threshold / 2) & (zcr > self.unvoiced_zcr))
+
+    def trim(self, pcm_bytes, noise_floor=None):
+        """Devuelve (pcm_recortado, info); si no hay voz devuelve el PCM intacto
+
+        noise_floor: RMS de fondo ya estimado (estimate_noise_floor) para el umbral.
+        """
+        samples = np.frombuffer(pcm_bytes, dtype='<i2')
+        frame_count = len(samples) // self.frame_size
+        original_seconds = len(samples) / self.sample_rate
+        info = {"original_seconds": round(original_seconds, 3), "removed_seconds": 0.0, "speech": True}
+
+        if frame_count < 3:
+            return pcm_bytes, info
+
+        frames = samples[:frame_count * self.frame_size].reshape(frame_count, self.frame_size)
+        speech = self.speech_mask(frames.astype(np.float32), noise_floor=noise_floor)
+
+        if not speech.any():
+            info["speech"] = False
+            with self._lock:
+                self.clips += 1
+                self.no_speech_clips += 1
+                self.input_seconds += original_seconds
+            return pcm_bytes, info
+
+        # Margen alrededor de la voz para no cortar ataques ni colas de palabras
+        if self.padding_frames:
+            window = np.ones(2 * self.padding_frames + 1)
+            speech = np.convolve(speech, window, mode='same') > 0
+
+        # Recortar silencio inicial/final y acortar pausas internas a max_pause_frames
+        first, last = np.flatnonzero(speech)[[0, -1]]
+        keep = np.zeros_like(speech)
+        keep[first:last + 1] = True
+
+        changes = np.diff(speech[first:last + 1].astype(np.int8))
+        pause_starts = np.flatnonzero(changes == -1) + 1 + first
+        pause_ends = np.flatnonzero(changes == 1) + 1 + first
+        half = self.max_pause_frames // 2
+        for start, end in zip(pause_starts, pause_ends):
+            if end - start > self.max_pause_frames:
+                keep[start + half:end - (self.max_pause_frames - half)] = False
+
+        trimmed = frames[keep].tobytes()
+        removed_seconds = original_seconds - len(trimmed) / (self.sample_rate * 2)
+        info["removed_seconds"] = round(removed_seconds, 3)
+
+        with self._lock:
+            self.clips += 1
+            self.input_seconds += original_seconds
+            self.removed_seconds += removed_seconds
+        return trimmed, info
+
+    def export_metrics(self):
+        with self._lock:
+            return _metrics_delta(self, ("clips", "no_speech_clips", "input_seconds", "removed_seconds"))
+
+    def merge_metrics(self, delta):
+        with self._lock:
+            _merge_metrics(self, delta)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clips": self.clips,
+                "no_speech_clips": self.no_speech_clips,
+                "input_seconds": round(self.input_seconds, 1),
+                "removed_seconds": round(self.removed_seconds, 1),
+                "removed_ratio": round(self.removed_seconds / self.input_seconds, 4) if self.input_seconds else 0.0
+            }
+
+class FluencyFeatureExtractor:
+    """✅ Rasgos acústicos de fluidez en una pasada vectorizada sobre el PCM decodificado
+
+    Reutiliza la segmentación voz/silencio del VAD: duración hablada, pausas (número,
+    media y máxima), proporción de voz, varianza de energía en dB y una tasa de núcleos
+    silábicos (picos de la envolvente de energía) como estimación de velocidad de habla.
+    """
+
+    def __init__(self, detector, min_pause_s=0.25):
+        self.detector = detector
+        self.min_pause_s = min_pause_s
+
+    def extract(self, pcm_bytes):
+        """Rasgos de un clip PCM s16le mono, o None si es demasiado corto"""
+        detector = self.detector
+        samples = np.frombuffer(pcm_bytes, dtype='<i2')
+        frame_count = len(samples) // detector.frame_size
+        if frame_count < 3:
+            return None
+
+        frame_seconds = detector.frame_size / detector.sample_rate
+        frames = samples[:frame_count * detector.frame_size].reshape(frame_count, detector.frame_size).astype(np.float32)
+        energy = np.einsum('ij,ij->i', frames, frames) / detector.frame_size
+        speech = detector.speech_mask(frames, rms=np.sqrt(energy))
+
+        features = {
+            "duration_seconds": round(len(samples) / detector.sample_rate, 3),
+            "speech_seconds": 0.0,
+            "voiced_ratio": 0.0,
+            "pause_count": 0,
+            "mean_pause_seconds": 0.0,
+            "longest_pause_seconds": 0.0,
+            "energy_variance_db": 0.0,
+            "syllable_rate": 0.0
+        }
+        if not speech.any():
+            return features
+
+        # Solo el tramo entre la primera y la última trama con voz
+        first, last = np.flatnonzero(speech)[[0, -1]]
+        span = speech[first:last + 1]
+        span_energy_db = 10 * np.log10(energy[first:last + 1] + 1.0)
+
+        changes = np.diff(span.astype(np.int8))
+        pauses = (np.flatnonzero(changes == 1) - np.flatnonzero(changes == -1)) * frame_seconds
+        pauses = pauses[pauses >= self.min_pause_s]
+
+        # Núcleos silábicos: máximos locales de la envolvente suavizada en tramas con voz
+        envelope = np.convolve(span_energy_db, np.ones(3) / 3, mode='same')
+        voiced_level = envelope[span].mean()
+        peaks = ((envelope[1:-1] > envelope[:-2]) & (envelope[1:-1] >= envelope[2:])
+                 & span[1:-1] & (envelope[1:-1] > voiced_level - 3))
+
+        speech_seconds = span.sum() * frame_seconds
+        features.update({
+            "speech_seconds": round(float(speech_seconds), 3),
+            "voiced_ratio": round(float(span.mean()), 4),
+            "pause_count": int(len(pauses)),
+            "mean_pause_seconds": round(float(pauses.mean()), 3) if len(pauses) else 0.0,
+            "longest_pause_seconds": round(float(pauses.max()), 3) if len(pauses) else 0.0,
+            "energy_variance_db": round(float(span_energy_db[span].var()), 2),
+            "syllable_rate": round(float(peaks.sum() / speech_seconds), 2) if speech_seconds else 0.0
+        })
+        return features
+
+    def extract_batch(self, pcm_clips):
+        """Rasgos de muchos clips (iterable de PCM); devuelve un generador en el mismo orden"""
+        for pcm_bytes in pcm_clips:
+            yield self.extract(pcm_bytes)
+
+class AudioAdmission:
+    """✅ Prechequeo barato antes del reconocedor: duración, silencio y saturación
+
+    La duración se lee de la cabecera del contenedor (WAV/FLAC) antes de decodificar;
+    RMS, pico y proporción de muestras saturadas se calculan vectorizados sobre el PCM.
+    Un clip sin remedio se rechaza con un motivo estructurado y no gasta reconocedor.
+    """
+
+    # Muestras int16 a partir de las cuales se consideran saturadas
+    CLIP_LEVEL = 32700
+
+    REASON_MESSAGES = {
+        "too_short": "Your recording was too short. Please speak for 2-3 seconds.",
+        "too_long": "Your recording was too long. Please keep your answer under a minute.",
+        "silent": "We couldn't hear you. Please check your microphone and speak a bit louder.",
+        "clipped": "Your recording is distorted. Please move a little away from the microphone."
+    }
+
+    def __init__(self, min_duration_s=0.5, max_duration_s=60.0, min_rms=30.0, max_clipping_ratio=0.05):
+        self.min_duration_s = min_duration_s
+        self.max_duration_s = max_duration_s
+        self.min_rms = min_rms
+        self.max_clipping_ratio = max_clipping_ratio
+
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejections = {}
+        self.calls_saved = 0
+
+    def _reject(self, reason, saved, **details):
+        with self._lock:
+            self.rejections[reason] = self.rejections.get(reason, 0) + 1
+            if saved:
+                self.calls_saved += 1
+        return {"reason": reason, "message": self.REASON_MESSAGES[reason], **details}
+
+    def _check_duration(self, duration, saved):
+        if duration < self.min_duration_s:
+            return self._reject("too_short", saved, duration_seconds=round(duration, 3))
+        if duration > self.max_duration_s:
+            return self._reject("too_long", saved, duration_seconds=round(duration, 3))
+        return None
+
+    def check_header(self, duration, saved=True):
+        """Rechazo por la duración declarada en la cabecera, antes de decodificar
+
+        saved=False cuando el audio ya pasó (en parte) por el reconocedor, como en streaming:
+        el rechazo se cuenta pero no como llamada ahorrada.
+        """
+        with self._lock:
+            self.checked += 1
+        if not duration:
+            return None
+        return self._check_duration(duration, saved)
+
+    def check_pcm(self, pcm_bytes, sample_rate, saved=True):
+        """Rechazo por duración real, silencio o saturación sobre PCM s16le mono"""
+        samples = np.frombuffer(pcm_bytes, dtype='<i2')
+        rejection = self._check_duration(len(samples) / sample_rate, saved)
+        if rejection:
+            return rejection
+
+        as_float = samples.astype(np.float32)
+        rms = float(np.sqrt(np.dot(as_float, as_float) / len(samples)))
+        if rms < self.min_rms:
+            return self._reject("silent", saved, rms=round(rms, 1), peak=int(np.abs(samples.astype(np.int32)).max()))
+
+        clipping_ratio = float(np.count_nonzero(np.abs(samples.astype(np.int32)) >= self.CLIP_LEVEL)) / len(samples)
+        if clipping_ratio > self.max_clipping_ratio:
+            return self._reject("clipped", saved, clipping_ratio=round(clipping_ratio, 4), rms=round(rms, 1))
+        return None
+
+    def export_metrics(self):
+        with self._lock:
+            return _metrics_delta(self, ("checked", "rejections", "calls_saved"))
+
+    def merge_metrics(self, delta):
+        with self._lock:
+            _merge_metrics(self, delta)
+
+    def stats(self):
+        with self._lock:
+            rejected = sum(self.rejections.values())
+            return {
+                "checked": self.checked,
+                "rejections": dict(self.rejections),
+                "recognizer_calls_saved": self.calls_saved,
+                "rejection_ratio": round(rejected / self.checked, 4) if self.checked else 0.0
+            }
+
+class TranscriptionCache:
+    """✅ Caché de transcripciones por hash del audio: LRU en memoria + nivel en disco opcional
+
+    La clave es SHA-256 de los bytes subidos más la configuración del reconocedor, así que
+    un reintento del móvil o un clip repetido no vuelve a pasar por ffmpeg ni por el motor.
+    El nivel en disco se comparte entre workers y se poda por tamaño total y por TTL.
+    """
+
+    # Cambiar si cambia el formato de las entradas guardadas
+    FORMAT_VERSION = 2
+
+    def __init__(self, max_entries=256, ttl_seconds=86400, disk_dir="", disk_max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, audio_bytes, fingerprint):
+        digest = hashlib.sha256()
+        digest.update(f"v{self.FORMAT_VERSION}|{fingerprint}|".encode('utf-8'))
+        digest.update(audio_bytes)
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """Devuelve una copia del resultado guardado o None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, result = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return dict(result)
+                del self._entries[key]
+                self.expired += 1
+
+        result = self._disk_get(key, now)
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(key, result, now)
+        return dict(result)
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if now - entry.get("stored_at", 0) > self.ttl_seconds:
+            with self._lock:
+                self.expired += 1
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        return entry.get("result")
+
+    def put(self, key, result):
+        now = time.time()
+        self._memory_put(key, result, now)
+        with self._lock:
+            self.stores += 1
+        if self.disk_dir:
+            self._disk_put(key, result, now)
+
+    def _memory_put(self, key, result, now):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (now, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _disk_put(self, key, result, now):
+        """Escritura atómica; cada 64 escrituras se poda el directorio"""
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.tmp.{os.getpid()}.{threading.get_ident()}")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"stored_at": now, "result": result}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write transcription cache entry: {e}")
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 64 == 0
+        if prune:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Borra entradas caducadas y, si se supera el tamaño máximo, las más antiguas"""
+        if not self.disk_dir:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        files = []
+        removed = 0
+        for path in self.disk_dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if st.st_mtime < cutoff:
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError:
+                    pass
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                path.unlink()
+                removed += 1
+                total -= size
+            except OSError:
+                pass
+
+        with self._lock:
+            self.disk_evictions += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_tier": str(self.disk_dir) if self.disk_dir else None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "expired": self.expired,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+def _decoder_worker_main(conn, sample_rate):
+    """Bucle de un decodificador persistente: recibe (demuxer, bytes) y devuelve PCM s16le mono"""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        if message[0] == "ping":
+            conn.send(("pong", None))
+            continue
+        if message[0] == "stop":
+            return
+
+        _, demuxer, audio_bytes = message
+        try:
+            chunks = []
+            with av.open(io.BytesIO(audio_bytes), format=demuxer) as container:
+                resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+                for frame in container.decode(audio=0):
+                    for resampled in resampler.resample(frame):
+                        chunks.append(resampled.to_ndarray().tobytes())
+                for resampled in resampler.resample(None):
+                    chunks.append(resampled.to_ndarray().tobytes())
+            conn.send(("ok", b"".join(chunks)))
+        except Exception as e:
+            conn.send(("error", str(e)[:200]))
+
+class PersistentDecoderPool:
+    """✅ Decodificadores persistentes (libav vía PyAV) en procesos de larga duración
+
+    Cada proceso recibe los bytes por un pipe y devuelve PCM 16 kHz mono, sin fork/exec
+    de ffmpeg por clip. Un proceso que muere o no responde se reemplaza, y cada uno se
+    recicla tras max_jobs trabajos para acotar fugas de memoria de los códecs.
+    Un hilo en segundo plano hace ping a los libres cada health_interval_s.
+    """
+
+    name = "persistent"
+
+    def __init__(self, size=2, max_jobs=500, timeout_s=30.0, sample_rate=16000, health_interval_s=30.0):
+        if av is None:
+            raise RuntimeError("The persistent audio decoder requires 'pip install av'")
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout_s = timeout_s
+        self.sample_rate = sample_rate
+        self.health_interval_s = health_interval_s
+        # forkserver: el worker de gunicorn tiene varios hilos y un fork heredaría sus
+        # locks tomados; los hijos salen de un servidor de un solo hilo con el módulo precargado
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload([__name__])
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+        self.jobs = 0
+        self.errors = 0
+        self.recycled = 0
+        self.restarts = 0
+        self.healthy_idle = None
+        self.last_health_check = None
+        self.latency = LatencyStats()
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_decoder_worker_main,
+            args=(child_conn, self.sample_rate),
+            name="eli-audio-decoder",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return {"process": process, "conn": parent_conn, "jobs": 0}
+
+    def _retire(self, worker):
+        try:
+            worker["conn"].send(("stop",))
+        except OSError:
+            pass
+        worker["conn"].close()
+        worker["process"].join(timeout=0.5)
+        if worker["process"].is_alive():
+            worker["process"].kill()
+
+    def _try_spawn(self):
+        # ✅ Si no se puede crear el proceso se devuelve None: el hueco sigue en _idle
+        # y el siguiente decode lo vuelve a intentar, así el pool no se encoge
+        try:
+            return self._spawn()
+        except OSError as e:
+            logger.warning(f"Could not start persistent decoder: {e}")
+            return None
+
+    def _ensure_started(self):
+        # Los procesos se crean al primer uso, una vez por worker de gunicorn
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._idle = queue.Queue()
+            for _ in range(self.size):
+                self._idle.put(self._try_spawn())
+            if self.health_interval_s > 0:
+                threading.Thread(target=self._health_loop, args=(self._pid,),
+                                 name="audio-decoder-health", daemon=True).start()
+
+    def _health_loop(self, pid):
+        while self._pid == pid:
+            time.sleep(self.health_interval_s)
+            try:
+                self.health_check()
+            except Exception as e:
+                logger.warning(f"Persistent decoder health check failed: {e}")
+
+    def decode(self, audio_bytes, demuxer=None):
+        """PCM s16le del clip, o None si falló (el llamador puede volver a ffmpeg)"""
+        self._ensure_started()
+        try:
+            worker = self._idle.get(timeout=self.timeout_s)
+        except queue.Empty:
+            return None
+        if worker is None:
+            worker = self._try_spawn()
+            if worker is None:
+                self._idle.put(None)
+                return None
+
+        started = time.perf_counter()
+        healthy = False
+        ok = False
+        try:
+            if not worker["process"].is_alive():
+                raise OSError("decoder process died")
+            worker["conn"].send(("decode", demuxer, audio_bytes))
+            if not worker["conn"].poll(self.timeout_s):
+                raise TimeoutError("decoder did not answer in time")
+            status, payload = worker["conn"].recv()
+            healthy = True
+            worker["jobs"] += 1
+            if status != "ok" or not payload:
+                logger.warning(f"Persistent decoder failed: {payload}")
+                return None
+            ok = True
+            return payload
+        except (OSError, EOFError, TimeoutError) as e:
+            logger.warning(f"Persistent decoder unavailable: {e}")
+            return None
+        finally:
+            self.latency.record(time.perf_counter() - started, ok=ok)
+            with self._lock:
+                self.jobs += 1
+                if not ok:
+                    self.errors += 1
+                if not healthy:
+                    self.restarts += 1
+                elif worker["jobs"] >= self.max_jobs:
+                    self.recycled += 1
+            if not healthy or worker["jobs"] >= self.max_jobs:
+                self._retire(worker)
+                worker = self._try_spawn()
+            self._idle.put(worker)
+
+    def health_check(self):
+        """Ping a los decodificadores libres; reemplaza los que no responden"""
+        if self._pid != os.getpid():
+            return 0
+        healthy = 0
+        for _ in range(self._idle.qsize()):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is None:
+                self._idle.put(self._try_spawn())
+                continue
+            try:
+                worker["conn"].send(("ping",))
+                alive = worker["conn"].poll(1.0) and worker["conn"].recv()[0] == "pong"
+            except (OSError, EOFError):
+                alive = False
+            if alive:
+                healthy += 1
+            else:
+                self._retire(worker)
+                worker = self._try_spawn()
+                with self._lock:
+                    self.restarts += 1
+            self._idle.put(worker)
+        with self._lock:
+            self.healthy_idle = healthy
+            self.last_health_check = datetime.now().isoformat()
+        return healthy
+
+    def stats(self):
+        """Contadores y el resultado del último ping (no hace ping: /api/health no bloquea decodificaciones)"""
+        with self._lock:
+            return {
+                "backend": self.name,
+                "workers": self.size,
+                "healthy_idle": self.healthy_idle,
+                "last_health_check": self.last_health_check,
+                "max_jobs_per_worker": self.max_jobs,
+                "jobs": self.jobs,
+                "errors": self.errors,
+                "recycled": self.recycled,
+                "restarts": self.restarts,
+                "latency": self.latency.snapshot()
+            }
+
+def create_audio_decoder(name):
+    """Decodificador configurado; None = un subproceso ffmpeg por clip"""
+    if name == "persistent":
+        try:
+            return PersistentDecoderPool(
+                Config.AUDIO_DECODER_WORKERS,
+                Config.AUDIO_DECODER_MAX_JOBS,
+                Config.AUDIO_DECODE_TIMEOUT,
+                AudioProcessor.SAMPLE_RATE,
+                Config.AUDIO_DECODER_HEALTH_S
+            )
+        except Exception as e:
+            logger.error(f"Could not start persistent audio decoder: {e}. Using ffmpeg subprocesses")
+    elif name != "subprocess":
+        logger.warning(f"Unknown AUDIO_DECODER '{name}', using ffmpeg subprocesses")
+    return None
+
+class AudioProcessor:
+    # Formato que espera el reconocedor: PCM 16 kHz, 16 bits, mono
+    SAMPLE_RATE = 16000
+    SAMPLE_WIDTH = 2
+
+    # Demuxer de ffmpeg según el formato detectado (evita el sondeo del contenedor)
+    FFMPEG_DEMUXERS = {
+        "wav": "wav",
+        "flac": "flac",
+        "ogg": "ogg",
+        "webm": "matroska",
+        "mp4": "mov",
+        "mp3": "mp3",
+        "aiff": "aiff",
+        "amr": "amr"
+    }
+
+    WAVE_FORMAT_PCM = 0x0001
+    WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+    def __init__(self, backend=None, cache=None, pool=None, decoder=None):
+        self.recognizer = sr.Recognizer()
+        self.pool = pool
+        self.decoder = decoder or create_audio_decoder(Config.AUDIO_DECODER)
+        self.backend = backend or create_recognizer_backend(Config.RECOGNIZER_BACKEND)
+        self.vad = VoiceActivityDetector(
+            self.SAMPLE_RATE,
+            padding_ms=Config.AUDIO_VAD_PADDING_MS,
+            max_pause_ms=Config.AUDIO_VAD_MAX_PAUSE_MS
+        ) if Config.AUDIO_VAD_ENABLED else None
+        self.admission = AudioAdmission(
+            min_duration_s=Config.AUDIO_MIN_DURATION_S,
+            max_duration_s=Config.AUDIO_MAX_DURATION_S,
+            min_rms=Config.AUDIO_MIN_RMS,
+            max_clipping_ratio=Config.AUDIO_MAX_CLIPPING_RATIO
+        ) if Config.AUDIO_ADMISSION_ENABLED else None
+        self.fluency = FluencyFeatureExtractor(self.vad or VoiceActivityDetector(self.SAMPLE_RATE))
+        self.cache = cache or TranscriptionCache(
+            max_entries=Config.TRANSCRIPTION_CACHE_SIZE,
+            ttl_seconds=Config.TRANSCRIPTION_CACHE_TTL_S,
+            disk_dir=Config.TRANSCRIPTION_CACHE_DIR,
+            disk_max_bytes=Config.TRANSCRIPTION_CACHE_DISK_MAX_MB * 1024 * 1024
+        )
+        self.format_counters = {}
+        self._counters_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._counters_lock:
+            self.format_counters[key] = self.format_counters.get(key, 0) + 1
+
+    def format_stats(self):
+        """Cuántas veces se tomó cada ruta de decodificación"""
+        with self._counters_lock:
+            return dict(self.format_counters)
+
+    def export_metrics(self):
+        """Contadores nuevos de formatos, prechequeo, VAD y reconocedor (lo envía cada proceso del pool)"""
+        with self._counters_lock:
+            formats = _metrics_delta(self, ("format_counters",))
+        return {
+            "formats": formats,
+            "admission": self.admission.export_metrics() if self.admission else None,
+            "vad": self.vad.export_metrics() if self.vad else None,
+            "recognizer": self.backend.export_metrics()
+        }
+
+    def merge_metrics(self, delta):
+        """Suma al proceso padre lo que hizo un proceso del pool"""
+        with self._counters_lock:
+            _merge_metrics(self, delta["formats"])
+        if self.admission and delta["admission"]:
+            self.admission.merge_metrics(delta["admission"])
+        if self.vad and delta["vad"]:
+            self.vad.merge_metrics(delta["vad"])
+        self.backend.merge_metrics(delta["recognizer"])
+
+    def sniff_audio_format(self, audio_bytes):
+        """✅ Detecta el contenedor por sus bytes mágicos"""
+        head = bytes(audio_bytes[:12])
+
+        if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            return "wav"
+        if head[:4] == b"fLaC":
+            return "flac"
+        if head[:4] == b"OggS":
+            return "ogg"
+        if head[:4] == b"\x1aE\xdf\xa3":
+            return "webm"
+        if head[4:8] == b"ftyp":
+            return "mp4"
+        if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+            return "aiff"
+        if head[:6] == b"#!AMR\n":
+            return "amr"
+        if head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0):
+            return "mp3"
+        return "unknown"
+
+    def _parse_wav_header(self, audio_bytes):
+        """Recorre los chunks RIFF y devuelve el formato y la posición de los datos PCM"""
+        info = {}
+        offset = 12
+        total = len(audio_bytes)
+
+        while offset + 8 <= total:
+            chunk_id = bytes(audio_bytes[offset:offset + 4])
+            chunk_size = int.from_bytes(audio_bytes[offset + 4:offset + 8], "little")
+            body = offset + 8
+
+            if chunk_id == b"fmt " and chunk_size >= 16:
+                fmt = bytes(audio_bytes[body:body + 16])
+                info["format_tag"] = int.from_bytes(fmt[0:2], "little")
+                info["channels"] = int.from_bytes(fmt[2:4], "little")
+                info["sample_rate"] = int.from_bytes(fmt[4:8], "little")
+                info["bits_per_sample"] = int.from_bytes(fmt[14:16], "little")
+                if info["format_tag"] == self.WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26:
+                    # Subformato: los dos primeros bytes del GUID
+                    info["format_tag"] = int.from_bytes(audio_bytes[body + 24:body + 26], "little")
+            elif chunk_id == b"data":
+                # Grabaciones en streaming pueden declarar 0 o 0xFFFFFFFF: usar lo disponible
+                available = total - body
+                if chunk_size == 0 or chunk_size > available:
+                    chunk_size = available
+                info["data_offset"] = body
+                info["data_size"] = chunk_size
+                return info if "format_tag" in info else None
+
+            offset = body + chunk_size + (chunk_size & 1)
+
+        return None
+
+    def _conformant_wav_pcm(self, audio_bytes):
+        """PCM de un WAV que ya es 16 kHz / 16 bits / mono, o None"""
+        info = self._parse_wav_header(audio_bytes)
+        if (info
+                and info["format_tag"] == self.WAVE_FORMAT_PCM
+                and info["channels"] == 1
+                and info["sample_rate"] == self.SAMPLE_RATE
+                and info["bits_per_sample"] == self.SAMPLE_WIDTH * 8):
+            start = info["data_offset"]
+            size = info["data_size"] - (info["data_size"] % self.SAMPLE_WIDTH)
+            return bytes(audio_bytes[start:start + size])
+        return None
+
+    def header_duration(self, audio_bytes):
+        """Duración declarada en la cabecera (WAV, FLAC) sin decodificar, o None"""
+        audio_format = self.sniff_audio_format(audio_bytes)
+
+        if audio_format == "wav":
+            info = self._parse_wav_header(audio_bytes)
+            if info and info["sample_rate"] and info["channels"] and info["bits_per_sample"]:
+                byte_rate = info["sample_rate"] * info["channels"] * info["bits_per_sample"] // 8
+                return info["data_size"] / byte_rate if byte_rate else None
+
+        elif audio_format == "flac" and len(audio_bytes) >= 26:
+            # STREAMINFO: 20 bits de frecuencia, 3 de canales, 5 de bits y 36 de muestras totales
+            fields = int.from_bytes(audio_bytes[18:26], "big")
+            sample_rate = fields >> 44
+            total_samples = fields & ((1 << 36) - 1)
+            if sample_rate and total_samples:
+                return total_samples / sample_rate
+
+        return None
+
+    def decode_audio_to_pcm(self, audio_bytes):
+        """✅ Devuelve PCM s16le 16 kHz mono
+
+        Los WAV que ya cumplen el formato se recortan sin decodificar; el resto pasa por
+        ffmpeg con el demuxer elegido por sus bytes mágicos.
+        """
+        audio_format = self.sniff_audio_format(audio_bytes)
+
+        if audio_format == "wav":
+            pcm_bytes = self._conformant_wav_pcm(audio_bytes)
+            if pcm_bytes is not None:
+                self._count("wav_pcm16k_passthrough")
+                return pcm_bytes
+
+        self._count(audio_format)
+        demuxer = self.FFMPEG_DEMUXERS.get(audio_format)
+        pcm_bytes = self.decoder.decode(audio_bytes, demuxer) if self.decoder else None
+        if pcm_bytes is None:
+            if self.decoder:
+                self._count("persistent_decoder_fallback")
+            pcm_bytes = self._ffmpeg_decode(audio_bytes, demuxer)
+        if pcm_bytes is None:
+            self._count("decode_failed")
+        return pcm_bytes
+
+    def _ffmpeg_decode(self, audio_bytes, demuxer=None):
+        """✅ Decodifica en memoria con ffmpeg (stdin/memfd → stdout) a PCM s16le 16 kHz mono
+
+        No escribe archivos temporales. Con memfd (Linux) la entrada es buscable, así que
+        también se decodifican MP4/M4A con el átomo moov al final; si no, se usa un pipe.
+        """
+        command = [AudioSegment.converter, "-hide_banner", "-loglevel", "error"]
+        if demuxer:
+            command += ["-f", demuxer]
+        memfd = None
+        try:
+            if hasattr(os, "memfd_create"):
+                memfd = os.memfd_create("eli-audio")
+                os.write(memfd, audio_bytes)
+                command += ["-nostdin", "-i", f"/dev/fd/{memfd}"]
+                stdin_data = None
+                pass_fds = (memfd,)
+            else:
+                command += ["-i", "pipe:0"]
+                stdin_data = audio_bytes
+                pass_fds = ()
+
+            command += [
+                "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+                "-ac", "1", "-ar", str(self.SAMPLE_RATE), "pipe:1"
+            ]
+            result = subprocess.run(
+                command,
+                input=stdin_data,
+                stdin=subprocess.DEVNULL if stdin_data is None else None,
+                capture_output=True,
+                pass_fds=pass_fds,
+                timeout=Config.AUDIO_DECODE_TIMEOUT
+            )
+
+            if result.returncode != 0 or not result.stdout:
+                logger.warning(f"Audio decode failed: {result.stderr.decode('utf-8', 'replace')[-200:]}")
+                return None
+
+            return result.stdout
+
+        except Exception as e:
+            logger.error(f"Error in _ffmpeg_decode: {e}")
+            return None
+        finally:
+            if memfd is not None:
+                os.close(memfd)
+
+    def convert_audio_to_wav(self, audio_bytes):
+        """🚨 ERROR 2 CORREGIDO: Convierte audio a formato WAV PCM (en memoria)"""
+        pcm_bytes = self.decode_audio_to_pcm(audio_bytes)
+        if pcm_bytes is None:
+            return None
+
+        wav_io = io.BytesIO()
+        with wave.open(wav_io, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(self.SAMPLE_WIDTH)
+            wav_file.setframerate(self.SAMPLE_RATE)
+            wav_file.writeframes(pcm_bytes)
+        return wav_io.getvalue()
+
+    def _cache_fingerprint(self):
+        """Configuración que cambia el resultado de la transcripción"""
+        vad = self.vad.fingerprint() if self.vad else "novad"
+        return f"{self.backend.name}|{self.backend.language}|{self.SAMPLE_RATE}|{vad}"
+
+    def transcribe_audio(self, audio_bytes):
+        """🚨 ERROR 2 CORREGIDO: Transcribe audio decodificado a PCM en memoria"""
+        cache_key = self.cache.key(audio_bytes, self._cache_fingerprint())
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            # Mismo audio y misma configuración: sin ffmpeg ni reconocedor
+            cached["cached"] = True
+            return cached
+
+        if self.pool:
+            # Decodificación y reconocimiento fuera del hilo de Flask, con admisión acotada
+            result = self.pool.transcribe(audio_bytes, self)
+        else:
+            result = self._transcribe_uncached(audio_bytes)
+
+        # Los fallos del motor (red, cuota) son transitorios y las respuestas de un motor
+        # de respaldo son de menor calidad: no se guardan
+        from_fallback = result.get("recognizer") not in (None, self.backend.name, self.backend.primary)
+        if (result["error"] is None or result["error"] == "No speech detected") and not from_fallback:
+            self.cache.put(cache_key, result)
+        return result
+
+    def _transcribe_uncached(self, audio_bytes):
+        try:
+            # Prechequeo: un clip sin remedio no llega ni a ffmpeg ni al reconocedor
+            rejection = self.admission.check_header(self.header_duration(audio_bytes)) if self.admission else None
+            if rejection:
+                return self._rejected(rejection)
+
+            pcm_bytes = self.decode_audio_to_pcm(audio_bytes)
+
+            if pcm_bytes is not None:
+                return self.transcribe_pcm(pcm_bytes)
+
+            # Si falla la decodificación, intentar con el original (WAV/AIFF/FLAC)
+            with sr.AudioFile(io.BytesIO(audio_bytes)) as source:
+                audio_data = self.recognizer.record(source)
+            return self._recognize(audio_data)
+
+        except Exception as e:
+            logger.error(f"Error in transcription: {str(e)}")
+            return {"text": "", "language": "unknown", "error": str(e)}
+
+    def transcribe_pcm(self, pcm_bytes):
+        """Prechequeo, rasgos de fluidez y reconocimiento de PCM 16 kHz mono ya decodificado"""
+        if self.admission:
+            rejection = self.admission.check_pcm(pcm_bytes, self.SAMPLE_RATE)
+            if rejection:
+                return self._rejected(rejection)
+
+        acoustic_features = self.fluency.extract(pcm_bytes)
+        result = self.recognize_pcm(pcm_bytes)
+        if acoustic_features:
+            result["acoustic_features"] = acoustic_features
+        return result
+
+    def recognize_pcm(self, pcm_bytes):
+        """Recorte de silencios (umbral según el ruido ambiente) y motor sobre PCM 16 kHz mono"""
+        vad_info = None
+        if self.vad:
+            # Suelo de ruido del clip completo, sin consumir muestras; al reconocedor solo va la voz
+            noise_floor = estimate_noise_floor(pcm_bytes, self.SAMPLE_RATE, frame_ms=self.vad.frame_ms)
+            pcm_bytes, vad_info = self.vad.trim(pcm_bytes, noise_floor=noise_floor)
+
+        # PCM directo a AudioData, sin volver a parsear un contenedor WAV
+        result = self._recognize(sr.AudioData(pcm_bytes, self.SAMPLE_RATE, self.SAMPLE_WIDTH))
+        if vad_info:
+            result["trimmed_seconds"] = vad_info["removed_seconds"]
+        return result
+
+    def _rejected(self, rejection):
+        return {
+            "text": "",
+            "language": "unknown",
+            "error": f"Audio rejected: {rejection['reason']}",
+            "recognizer": None,
+            "rejected": rejection
+        }
+
+    def _recognize(self, audio_data):
+        started = time.perf_counter()
+        try:
+            # Intentar reconocimiento (con la cadena de respaldo si está configurada)
+            text, source = self.backend.recognize_with_source(audio_data)
+            self.backend.latency.record(time.perf_counter() - started)
+            return {"text": text, "language": "en", "error": None, "recognizer": source}
+        except sr.UnknownValueError:
+            self.backend.latency.record(time.perf_counter() - started)
+            return {"text": "", "language": "unknown", "error": "No speech detected", "recognizer": self.backend.name}
+        except sr.RequestError as e:
+            self.backend.latency.record(time.perf_counter() - started, ok=False)
+            return {"text": "", "language": "unknown", "error": f"Speech recognition error: {str(e)}", "recognizer": self.backend.name}
+
+    def recognizer_stats(self):
+        """Latencia, plazos, respaldos y circuitos de los motores de reconocimiento"""
+        return self.backend.stats()
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def decoder_stats(self):
+        """Estado de los decodificadores persistentes (último ping del hilo de salud)"""
+        return self.decoder.stats() if self.decoder else {"backend": "subprocess"}
+
+    def pool_stats(self):
+        """Utilización, espera y rechazos del pool de procesos de audio"""
+        return self.pool.stats() if self.pool else {"enabled": False}
+
+    def admission_stats(self):
+        """Rechazos del prechequeo y llamadas al reconocedor ahorradas"""
+        return self.admission.stats() if self.admission else {"enabled": False}
+
+    def vad_stats(self):
+        """Segundos de silencio recortados antes del reconocedor"""
+        return self.vad.stats() if self.vad else {"enabled": False}
+
+class AudioPoolBusyError(Exception):
+    """No hubo hueco en el pool de audio dentro del plazo de admisión"""
+
+    def __init__(self, retry_after):
+        super().__init__("Audio processing pool is busy")
+        self.retry_after = retry_after
+
+# Procesador propio de cada proceso del pool (creado en el inicializador)
+_pool_processor = None
+
+def _init_pool_worker():
+    global _pool_processor
+    _pool_processor = AudioProcessor()
+    # Línea base de las métricas (y activa el registro de resultados de los breakers)
+    _pool_processor.export_metrics()
+
+def _pool_transcribe(audio_bytes, submitted_at, breaker_states):
+    """Se ejecuta en el proceso hijo: decodificación + prechequeo + VAD + reconocedor
+
+    Parte del estado de los circuit breakers del padre y le devuelve, junto al
+    resultado, las métricas de este trabajo para que las sume a las suyas.
+    """
+    queue_wait = time.time() - submitted_at
+    _pool_processor.backend.load_breaker_states(breaker_states)
+    result = _pool_processor._transcribe_uncached(audio_bytes)
+    return queue_wait, result, _pool_processor.export_metrics()
+
+class TranscriptionProcessPool:
+    """✅ Pool de procesos acotado para decodificar y reconocer, con admisión por semáforo
+
+    Como mucho workers trabajos en curso más queue_limit en espera; el resto espera
+    hasta admit_timeout_s y después se rechaza. Así una ráfaga no lanza ffmpeg sin límite.
+    El pool se crea al primer uso para que cada worker de gunicorn tenga el suyo.
+    """
+
+    def __init__(self, workers=2, queue_limit=8, admit_timeout_s=5.0, task_timeout_s=45.0):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.admit_timeout_s = admit_timeout_s
+        self.task_timeout_s = task_timeout_s
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self._started_at = time.time()
+        self.admission_wait = LatencyStats()
+        self.queue_wait = LatencyStats()
+        self.run_latency = LatencyStats()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_init_pool_worker
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self.restarts += 1
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def transcribe(self, audio_bytes, processor):
+        """Transcribe en un proceso del pool; lanza AudioPoolBusyError si no hay hueco
+
+        Las métricas del hijo se suman a las de processor, que también aporta el
+        estado de sus circuit breakers.
+        """
+        arrived = time.perf_counter()
+        if not self._slots.acquire(timeout=self.admit_timeout_s):
+            with self._lock:
+                self.rejected += 1
+            raise AudioPoolBusyError(max(1, math.ceil(self.admit_timeout_s)))
+        self.admission_wait.record(time.perf_counter() - arrived)
+
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.perf_counter()
+        ok = False
+        try:
+            future = self._get_executor().submit(
+                _pool_transcribe, audio_bytes, time.time(), processor.backend.breaker_states()
+            )
+            queue_wait, result, metrics = future.result(timeout=self.task_timeout_s)
+            self.queue_wait.record(queue_wait)
+            processor.merge_metrics(metrics)
+            ok = True
+            return result
+        except concurrent.futures.BrokenExecutor as e:
+            # Un hijo murió (OOM, señal): recrear el pool para las siguientes peticiones
+            logger.error(f"Audio process pool broken, restarting: {e}")
+            self._reset_executor()
+            return {"text": "", "language": "unknown", "error": "Audio worker crashed"}
+        except concurrent.futures.TimeoutError:
+            return {"text": "", "language": "unknown", "error": "Audio processing timed out"}
+        finally:
+            elapsed = time.perf_counter() - started
+            self.run_latency.record(elapsed, ok=ok)
+            with self._lock:
+                self.in_flight -= 1
+                self.busy_seconds += elapsed
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            uptime = time.time() - self._started_at
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "utilisation": round(self.busy_seconds / (uptime * self.workers), 4) if uptime else 0.0,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+                "admission_wait": self.admission_wait.snapshot(),
+                "queue_wait": self.queue_wait.snapshot(),
+                "processing": self.run_latency.snapshot()
+            }
+
+# ✅ Inicializar procesador de audio (con pool de procesos si AUDIO_POOL_WORKERS > 0)
+audio_processor = AudioProcessor(pool=TranscriptionProcessPool(
+    workers=Config.AUDIO_POOL_WORKERS,
+    queue_limit=Config.AUDIO_POOL_QUEUE,
+    admit_timeout_s=Config.AUDIO_POOL_ADMIT_TIMEOUT_S,
+    task_timeout_s=Config.AUDIO_POOL_TASK_TIMEOUT_S
+) if Config.AUDIO_POOL_WORKERS > 0 else None)
+
+def benchmark_decoders(paths, repeat=20):
+    """Latencia por clip: subproceso ffmpeg frente a decodificadores persistentes
+
+    Uso: python eli_backend.py --benchmark-decode clip1.webm clip2.mp3 ...
+    """
+    persistent = PersistentDecoderPool(size=1, sample_rate=AudioProcessor.SAMPLE_RATE)
+    results = {}
+    try:
+        for path in paths:
+            audio_bytes = Path(path).read_bytes()
+            demuxer = AudioProcessor.FFMPEG_DEMUXERS.get(audio_processor.sniff_audio_format(audio_bytes))
+            persistent.decode(audio_bytes, demuxer)  # Arranque del proceso fuera de la medida
+
+            timings = {}
+            for name, decode in (("subprocess", audio_processor._ffmpeg_decode), ("persistent", persistent.decode)):
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    decode(audio_bytes, demuxer)
+                timings[f"{name}_ms"] = round((time.perf_counter() - started) / repeat * 1000, 2)
+
+            results[str(path)] = timings
+            print(f"   • {path}: " + ", ".join(f"{name} {ms} ms" for name, ms in timings.items()))
+    finally:
+        while not persistent._idle.empty():
+            worker = persistent._idle.get_nowait()
+            if worker is not None:
+                persistent._retire(worker)
+    return results
+
+def extract_fluency_batch(paths):
+    """Uso offline: decodifica cada archivo y genera sus rasgos de fluidez
+
+    python eli_backend.py --fluency-batch clip1.wav clip2.webm ... > features.jsonl
+    """
+    for path in paths:
+        try:
+            pcm_bytes = audio_processor.decode_audio_to_pcm(Path(path).read_bytes())
+        except OSError as e:
+            yield {"file": str(path), "error": str(e)}
+            continue
+        if pcm_bytes is None:
+            yield {"file": str(path), "error": "decode failed"}
+            continue
+        yield {"file": str(path), **(audio_processor.fluency.extract(pcm_bytes) or {})}
+
+# ============================================
+# GESTIÓN DE PROGRESO DEL USUARIO
+# ============================================
+class ProfileCache:
+    """✅ LRU acotado de perfiles de usuario por worker, validado por versión"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Devuelve (version, sello, perfil) o None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+            return entry
+
+    def put(self, user_id, version, stamp, profile):
+        with self._lock:
+            self._entries[user_id] = (version, stamp, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def record_hit(self, revalidated=False):
+        with self._lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidated_hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "revalidated_hits": self.revalidated_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+def _empty_statistics():
+    """Estadísticas globales iniciales"""
+    return {
+        "total_users": 0,
+        "total_sessions": 0,
+        "total_questions_asked": 0,
+        "total_audio_processes": 0,
+        "vocabulary_game_plays": 0
+    }
+
+class JSONProgressStorage:
+    """Almacenamiento legado: todo el progreso en un único archivo JSON"""
+
+    name = "json"
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._init_database()
+
+    def _init_database(self):
+        """Inicializa la base de datos si no existe"""
+        if not Path(self.db_file).exists():
+            self._save_data({"users": {}, "statistics": _empty_statistics()})
+
+    def _load_data(self):
         """Carga datos de la base de datos"""
         try:
             with open(self.db_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except:
-            return {"users": {}, "statistics": {"total_sessions": 0, "total_questions_asked": 0, "total_audio_processes": 0, "vocabulary_game_plays": 0}}
-    
+            return {"users": {}, "statistics": _empty_statistics()}
+
     def _save_data(self, data):
         """Guarda datos en la base de datos"""
         try:
@@ -1030,53 +3668,892 @@ class UserProgressManager:
         except Exception as e:
             logger.error(f"Error saving progress data: {e}")
             return False
-    
-    def get_user_progress(self, user_id):
-        """Obtiene progreso del usuario"""
-        data = self._load_data()
-        return data["users"].get(user_id)
-    
-    def update_user_progress(self, user_id, updates):
-        """Actualiza progreso del usuario"""
+
+    def load_user(self, user_id):
+        return self._load_data()["users"].get(user_id)
+
+    def modify_user(self, user_id, mutator, factory):
+        """Aplica mutator(user_data, stats_delta) y guarda el documento completo"""
+        return self.modify_many([(user_id, mutator)], factory)[0]
+
+    def modify_many(self, items, factory):
+        """Aplica varias mutaciones [(user_id, mutator)] con una sola escritura"""
+        with self._lock:
+            data = self._load_data()
+            stats_delta = {}
+            results = []
+
+            # Archivos anteriores al contador total_users
+            data["statistics"].setdefault("total_users", len(data["users"]))
+
+            for user_id, mutator in items:
+                if user_id not in data["users"]:
+                    data["users"][user_id] = factory(user_id)
+                    stats_delta["total_users"] = stats_delta.get("total_users", 0) + 1
+                results.append(mutator(data["users"][user_id], stats_delta))
+
+            for key, value in stats_delta.items():
+                data["statistics"][key] = data["statistics"].get(key, 0) + value
+
+            self._save_data(data)
+            return results
+
+    def load_statistics(self):
         data = self._load_data()
-        
-        if user_id not in data["users"]:
-            data["users"][user_id] = self._create_new_user_profile(user_id)
-        
-        user_data = data["users"][user_id]
-        
-        # Actualizar campos
+        statistics = data.get("statistics", {})
+        return {
+            **_empty_statistics(),
+            **statistics,
+            "total_users": statistics.get("total_users", len(data.get("users", {})))
+        }
+
+def _open_sqlite_connection(db_path):
+    """Conexión SQLite en modo WAL y autocommit (transacciones explícitas)"""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, cached_statements=64)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+class SQLiteProgressStorage:
+    """✅ Una fila por usuario en SQLite (modo WAL), seguro entre workers de gunicorn"""
+
+    name = "sqlite"
+
+    # Sentencias constantes: sqlite3 las prepara una vez por conexión y las reutiliza
+    SQL_SELECT_USER = "SELECT data, version FROM users WHERE user_id = ?"
+    SQL_SELECT_VERSION = "SELECT version FROM users WHERE user_id = ?"
+    SQL_UPSERT_USER = (
+        "INSERT INTO users (user_id, data, updated_at, version) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET "
+        "data = excluded.data, updated_at = excluded.updated_at, version = excluded.version"
+    )
+    SQL_INSERT_USER_IF_MISSING = "INSERT OR IGNORE INTO users (user_id, data, updated_at) VALUES (?, ?, ?)"
+    SQL_INCREMENT_STAT = (
+        "INSERT INTO statistics (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value"
+    )
+    SQL_SELECT_STATS = "SELECT name, value FROM statistics"
+
+    def __init__(self, db_path, legacy_json_path=None, cache_size=0):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._epoch = 0
+        self._epoch_lock = threading.Lock()
+        self.cache = ProfileCache(cache_size) if cache_size > 0 else None
+        self._init_database()
+        if legacy_json_path:
+            self.migrate_from_json(legacy_json_path)
+
+    def _connect(self):
+        """Conexión por hilo (y por proceso, por si el worker hace fork)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = _open_sqlite_connection(self.db_path)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_database(self):
+        """Crea las tablas si no existen"""
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS statistics (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        # Bases creadas antes de la columna version
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        if "version" not in columns:
+            try:
+                conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # Otro worker la añadió primero
+
+        # ✅ total_users es un contador más; se inicializa una sola vez en bases existentes
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT OR IGNORE INTO statistics (name, value) SELECT 'total_users', COUNT(*) FROM users"
+        )
+        conn.execute("COMMIT")
+
+    def change_counter(self):
+        """Contador de cambios del almacén en este proceso
+
+        PRAGMA data_version cambia cuando otra conexión (de este u otro worker) confirma
+        una transacción. Como es por conexión, cada hilo compara con su último valor visto
+        y avanza una época común; las entradas de caché selladas con una época anterior
+        se revalidan contra la versión de su fila.
+        """
+        data_version = self._connect().execute("PRAGMA data_version").fetchone()[0]
+        if data_version != getattr(self._local, "data_version", None):
+            self._local.data_version = data_version
+            with self._epoch_lock:
+                self._epoch += 1
+        return self._epoch
+
+    def _apply_stats_delta(self, conn, stats_delta):
+        for key, value in stats_delta.items():
+            if value:
+                conn.execute(self.SQL_INCREMENT_STAT, (key, value))
+
+    def migrate_from_json(self, json_path):
+        """✅ Migración única desde user_progress.json (idempotente entre workers)"""
+        if not Path(json_path).exists():
+            return 0
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            already = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated_from'").fetchone()
+            if already:
+                conn.execute("COMMIT")
+                return 0
+
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+            except Exception as e:
+                logger.error(f"Could not read legacy progress file {json_path}: {e}")
+                legacy = {}
+
+            now = time.time()
+            users = legacy.get("users", {})
+            inserted = conn.executemany(
+                self.SQL_INSERT_USER_IF_MISSING,
+                ((user_id, json.dumps(profile, ensure_ascii=False), now) for user_id, profile in users.items())
+            ).rowcount
+            self._apply_stats_delta(conn, {**legacy.get("statistics", {}), "total_users": inserted})
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_migrated_from', ?)",
+                (str(Path(json_path).resolve()),)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        logger.info(f"Migrated {len(users)} users from {json_path} to {self.db_path}")
+        return len(users)
+
+    def load_user(self, user_id):
+        """Perfil del usuario; con caché, los usuarios frecuentes no tocan el disco
+
+        El dict devuelto puede estar compartido con la caché: no debe modificarse.
+        """
+        if self.cache is None:
+            row = self._connect().execute(self.SQL_SELECT_USER, (user_id,)).fetchone()
+            return json.loads(row[0]) if row else None
+
+        epoch = self.change_counter()
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            version, stamp, profile = cached
+            if stamp == epoch:
+                self.cache.record_hit()
+                return profile
+
+            # Algo cambió en el almacén: basta comparar la versión de la fila
+            row = self._connect().execute(self.SQL_SELECT_VERSION, (user_id,)).fetchone()
+            if row and row[0] == version:
+                self.cache.put(user_id, version, epoch, profile)
+                self.cache.record_hit(revalidated=True)
+                return profile
+
+        self.cache.record_miss()
+        row = self._connect().execute(self.SQL_SELECT_USER, (user_id,)).fetchone()
+        if not row:
+            self.cache.invalidate(user_id)
+            return None
+
+        profile = json.loads(row[0])
+        self.cache.put(user_id, row[1], epoch, profile)
+        return profile
+
+    def modify_user(self, user_id, mutator, factory):
+        """Lee-modifica-escribe solo la fila del usuario dentro de una transacción"""
+        return self.modify_many([(user_id, mutator)], factory)[0]
+
+    def modify_many(self, items, factory):
+        """Aplica varias mutaciones [(user_id, mutator)] en una sola transacción (group commit)"""
+        epoch = self.change_counter() if self.cache is not None else None
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            stats_delta = {}
+            results = []
+            written = []
+            now = time.time()
+
+            for user_id, mutator in items:
+                row = conn.execute(self.SQL_SELECT_USER, (user_id,)).fetchone()
+                if row:
+                    user_data = json.loads(row[0])
+                else:
+                    user_data = factory(user_id)
+                    stats_delta["total_users"] = stats_delta.get("total_users", 0) + 1
+                version = (row[1] if row else 0) + 1
+                results.append(mutator(user_data, stats_delta))
+                conn.execute(self.SQL_UPSERT_USER, (user_id, json.dumps(user_data, ensure_ascii=False), now, version))
+                written.append((user_id, version, user_data))
+
+            self._apply_stats_delta(conn, stats_delta)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Write-through: la fila recién escrita es la versión vigente
+        if self.cache is not None:
+            for user_id, version, user_data in written:
+                self.cache.put(user_id, version, epoch, user_data)
+        return results
+
+    def load_statistics(self):
+        """Lee solo la tabla de contadores: O(1) respecto al número de usuarios"""
+        stats = _empty_statistics()
+        stats.update({name: value for name, value in self._connect().execute(self.SQL_SELECT_STATS)})
+        return stats
+
+class JournalProgressStorage:
+    """✅ Diario append-only de eventos de progreso + snapshot compactado
+
+    Cada mutación es una línea JSON añadida al final del diario (O(1)). Las lecturas
+    parten del snapshot y reproducen los eventos recientes del usuario. Un compactador
+    en segundo plano pliega el diario en un snapshot nuevo y lo trunca.
+
+    Recuperación ante caídas: el diario empieza con una cabecera que indica la
+    generación del snapshot sobre el que aplica. Si el snapshot es más nuevo que la
+    cabecera (caída a mitad de compactación) el diario ya está plegado y se descarta;
+    una última línea incompleta (caída a mitad de escritura) se ignora.
+    """
+
+    name = "journal"
+    event_sourced = True
+
+    def __init__(self, journal_path, snapshot_path, fsync_interval_ms=1000,
+                 compact_bytes=8 * 1024 * 1024, compact_interval_s=300, legacy_json_path=None):
+        if fcntl is None:
+            raise RuntimeError("The journal progress backend requires fcntl (POSIX)")
+
+        self.journal_path = journal_path
+        self.snapshot_path = snapshot_path
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.compact_bytes = compact_bytes
+        self.compact_interval = compact_interval_s
+
+        self._apply_event = None
+        self._factory = None
+
+        # Lock de hilos + flock entre procesos (flock no excluye hilos del mismo proceso)
+        self._lock = threading.Lock()
+        self._lock_fd = os.open(journal_path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        self._fd = os.open(journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._dirty = False
+
+        self._snapshot = {"generation": 0, "users": {}, "statistics": _empty_statistics()}
+        self._snapshot_key = None
+        self._journal_generation = None
+        self._offset = 0
+        self._events = {}
+        self._stats_delta = {}
+        self._last_compaction = time.time()
+
+        self.appended_events = 0
+        self.compactions = 0
+        self.discarded_stale_bytes = 0
+
+        self._bootstrap(legacy_json_path)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="progress-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def bind(self, apply_event, factory):
+        """Recibe del gestor cómo reproducir eventos y crear perfiles"""
+        self._apply_event = apply_event
+        self._factory = factory
+
+    class _FileLock:
+        def __init__(self, storage, mode):
+            self.storage = storage
+            self.mode = mode
+
+        def __enter__(self):
+            self.storage._lock.acquire()
+            fcntl.flock(self.storage._lock_fd, self.mode)
+
+        def __exit__(self, *exc):
+            fcntl.flock(self.storage._lock_fd, fcntl.LOCK_UN)
+            self.storage._lock.release()
+
+    def _shared(self):
+        return self._FileLock(self, fcntl.LOCK_SH)
+
+    def _exclusive(self):
+        return self._FileLock(self, fcntl.LOCK_EX)
+
+    def _bootstrap(self, legacy_json_path):
+        """Crea snapshot inicial (migrando el JSON legado) y repara un diario obsoleto"""
+        with self._exclusive():
+            if not Path(self.snapshot_path).exists():
+                snapshot = {"generation": 0, "users": {}, "statistics": _empty_statistics()}
+                if legacy_json_path and Path(legacy_json_path).exists():
+                    try:
+                        with open(legacy_json_path, 'r', encoding='utf-8') as f:
+                            legacy = json.load(f)
+                        snapshot["users"] = legacy.get("users", {})
+                        snapshot["statistics"].update(legacy.get("statistics", {}))
+                        snapshot["statistics"]["total_users"] = len(snapshot["users"])
+                        logger.info(f"Migrated {len(snapshot['users'])} users from {legacy_json_path} to journal snapshot")
+                    except Exception as e:
+                        logger.error(f"Could not read legacy progress file {legacy_json_path}: {e}")
+                self._write_snapshot(snapshot)
+
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                generation = json.load(f).get("generation", 0)
+            with open(self.journal_path, 'rb') as f:
+                first_line = f.readline()
+            try:
+                header = json.loads(first_line)
+            except ValueError:
+                header = {}
+
+            if header.get("type") != "journal_header" or header.get("generation") != generation:
+                self._reset_journal(generation)
+
+    def _write_snapshot(self, snapshot):
+        """Escritura atómica: archivo temporal + fsync + rename"""
+        tmp_path = f"{self.snapshot_path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def _reset_journal(self, generation):
+        """Trunca el diario y escribe la cabecera de la generación indicada"""
+        self.discarded_stale_bytes += max(0, os.fstat(self._fd).st_size - self._offset)
+        os.ftruncate(self._fd, 0)
+        header = (json.dumps({"type": "journal_header", "generation": generation}) + "\n").encode('utf-8')
+        os.write(self._fd, header)
+        os.fsync(self._fd)
+        self._journal_generation = generation
+        self._offset = len(header)
+        self._events = {}
+        self._stats_delta = {}
+        self._dirty = False
+
+    def _sync(self):
+        """Recarga el snapshot si cambió y lee los eventos nuevos del diario (con lock tomado)"""
+        try:
+            st = os.stat(self.snapshot_path)
+            snapshot_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            snapshot_key = None
+
+        journal_size = os.fstat(self._fd).st_size
+        if snapshot_key != self._snapshot_key or journal_size < self._offset:
+            if snapshot_key is not None:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    self._snapshot = json.load(f)
+                # Snapshots anteriores al contador total_users
+                self._snapshot.setdefault("statistics", {}).setdefault("total_users", len(self._snapshot["users"]))
+            self._snapshot_key = snapshot_key
+            self._journal_generation = None
+            self._offset = 0
+            self._events = {}
+            self._stats_delta = {}
+
+        if journal_size <= self._offset:
+            return
+
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read(journal_size - self._offset)
+
+        # Solo líneas completas; una cola sin '\n' es una escritura en curso o truncada
+        complete = chunk.rfind(b"\n") + 1
+        for line in chunk[:complete].splitlines():
+            if not line.strip():
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                logger.warning("Skipping corrupt progress journal line")
+                continue
+
+            if event.get("type") == "journal_header":
+                self._journal_generation = event.get("generation")
+                continue
+            if self._journal_generation != self._snapshot.get("generation"):
+                continue
+
+            user_id = event["user_id"]
+            if user_id not in self._events and user_id not in self._snapshot["users"]:
+                self._stats_delta["total_users"] = self._stats_delta.get("total_users", 0) + 1
+            self._events.setdefault(user_id, []).append(event)
+            self._apply_event({}, event, self._stats_delta)
+
+        self._offset += complete
+
+    def append_events(self, events):
+        """Añade eventos al final del diario con una sola escritura"""
+        if not events:
+            return
+        payload = "".join(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + "\n" for event in events)
+
+        with self._exclusive():
+            self._sync()
+            if self._journal_generation != self._snapshot["generation"]:
+                self._reset_journal(self._snapshot["generation"])
+            elif os.fstat(self._fd).st_size > self._offset:
+                # Cola sin '\n' de una escritura interrumpida: se descarta antes de seguir
+                os.ftruncate(self._fd, self._offset)
+            os.write(self._fd, payload.encode('utf-8'))
+            if self.fsync_interval <= 0:
+                os.fsync(self._fd)
+            else:
+                self._dirty = True
+            self.appended_events += len(events)
+
+    def _replay(self, user_id):
+        base = self._snapshot["users"].get(user_id)
+        events = self._events.get(user_id)
+        if base is None and not events:
+            return None
+
+        if base is not None:
+            user_data = copy.deepcopy(base)
+        else:
+            user_data = self._factory(user_id)
+            user_data["created_at"] = events[0]["ts"]
+
+        for event in events or []:
+            self._apply_event(user_data, event, {})
+        return user_data
+
+    def load_user(self, user_id):
+        with self._shared():
+            self._sync()
+            return self._replay(user_id)
+
+    def load_statistics(self):
+        with self._shared():
+            self._sync()
+            stats = {**_empty_statistics(), **self._snapshot.get("statistics", {})}
+            for key, value in self._stats_delta.items():
+                stats[key] = stats.get(key, 0) + value
+            return stats
+
+    def compact(self):
+        """Pliega el diario en un snapshot nuevo y lo trunca"""
+        with self._exclusive():
+            self._sync()
+            self._last_compaction = time.time()
+            if not self._events:
+                return 0
+
+            folded = sum(len(events) for events in self._events.values())
+            users = dict(self._snapshot["users"])
+            for user_id in self._events:
+                users[user_id] = self._replay(user_id)
+
+            statistics = {**_empty_statistics(), **self._snapshot.get("statistics", {})}
+            for key, value in self._stats_delta.items():
+                statistics[key] = statistics.get(key, 0) + value
+
+            snapshot = {
+                "generation": self._snapshot["generation"] + 1,
+                "compacted_at": datetime.now().isoformat(),
+                "users": users,
+                "statistics": statistics
+            }
+            self._write_snapshot(snapshot)
+
+            st = os.stat(self.snapshot_path)
+            self._snapshot = snapshot
+            self._snapshot_key = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self._reset_journal(snapshot["generation"])
+            self.compactions += 1
+
+        logger.info(f"Compacted {folded} progress events into snapshot generation {snapshot['generation']}")
+        return folded
+
+    def _run(self):
+        interval = self.fsync_interval if self.fsync_interval > 0 else 1.0
+        while not self._stop.wait(interval):
+            if self._apply_event is None:
+                continue
+            try:
+                if self._dirty:
+                    self._dirty = False
+                    os.fsync(self._fd)
+                if (os.fstat(self._fd).st_size >= self.compact_bytes
+                        or time.time() - self._last_compaction >= self.compact_interval):
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Progress journal maintenance failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        try:
+            os.fsync(self._fd)
+        except OSError:
+            pass
+
+def _create_progress_storage(backend):
+    """Selecciona el motor de almacenamiento según la configuración"""
+    if backend == "json":
+        return JSONProgressStorage(Config.PROGRESS_JSON_PATH)
+    if backend == "journal":
+        return JournalProgressStorage(
+            Config.PROGRESS_JOURNAL_PATH,
+            Config.PROGRESS_SNAPSHOT_PATH,
+            fsync_interval_ms=Config.PROGRESS_JOURNAL_FSYNC_MS,
+            compact_bytes=Config.PROGRESS_JOURNAL_COMPACT_BYTES,
+            compact_interval_s=Config.PROGRESS_JOURNAL_COMPACT_INTERVAL_S,
+            legacy_json_path=Config.PROGRESS_JSON_PATH
+        )
+    if backend != "sqlite":
+        logger.warning(f"Unknown PROGRESS_BACKEND '{backend}', using sqlite")
+    return SQLiteProgressStorage(
+        Config.PROGRESS_DB_PATH,
+        legacy_json_path=Config.PROGRESS_JSON_PATH,
+        cache_size=Config.PROGRESS_CACHE_SIZE
+    )
+
+class ProgressWriteBehind:
+    """✅ Acumula incrementos de progreso en memoria y los confirma en lote (group commit)"""
+
+    def __init__(self, manager, flush_interval_ms=500, max_pending_updates=200):
+        self.manager = manager
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_pending_updates = max_pending_updates
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._pending_updates = 0
+        self._generation = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        self.flushes = 0
+        self.flushed_updates = 0
+        self.flush_errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="progress-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, user_id, updates=None, vocabulary_score=None):
+        """Fusiona una actualización en memoria; no toca el disco"""
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                pending = self._pending[user_id] = self.manager._new_pending()
+            if updates:
+                self.manager._merge_updates(pending, updates)
+            if vocabulary_score:
+                self.manager._merge_vocabulary_score(pending, *vocabulary_score)
+            self._pending_updates += 1
+            if self._pending_updates >= self.max_pending_updates:
+                self._wake.set()
+
+    def read(self, user_id, load):
+        """Carga el perfil con load(user_id) y devuelve (perfil, copia de lo pendiente en cola)
+
+        Mientras un lote del usuario se confirma no se sabe si el almacén ya lo incluye,
+        así que se espera a que termine; si empezó otro lote durante la carga, se repite.
+        """
+        while True:
+            with self._lock:
+                inflight = user_id in self._inflight
+                generation = self._generation
+            if inflight:
+                with self._flush_lock:
+                    pass
+                continue
+
+            user_data = load(user_id)
+            with self._lock:
+                if self._generation != generation:
+                    continue
+                pending = self._pending.get(user_id)
+                if not pending:
+                    return user_data, None
+                return user_data, self.manager._combine_pending(self.manager._new_pending(), pending)
+
+    def take(self, user_id):
+        """Retira lo pendiente de un usuario para aplicarlo en una escritura síncrona"""
+        with self._lock:
+            return self._pending.pop(user_id, None)
+
+    def requeue(self, batch, count=None):
+        """Devuelve a la cola un lote que no se pudo confirmar, delante de lo llegado después"""
+        with self._lock:
+            for user_id, pending in batch.items():
+                if user_id in self._pending:
+                    self.manager._combine_pending(pending, self._pending[user_id])
+                self._pending[user_id] = pending
+            self._pending_updates += len(batch) if count is None else count
+
+    def flush(self):
+        """Confirma todo lo pendiente en una sola transacción"""
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                count = self._pending_updates
+                self._pending = {}
+                self._pending_updates = 0
+                self._inflight = batch
+                self._generation += 1
+
+            if not batch:
+                return 0
+
+            try:
+                self.manager._commit_batch(batch)
+                self.flushes += 1
+                self.flushed_updates += count
+            except Exception as e:
+                self.flush_errors += 1
+                logger.error(f"Error flushing {count} progress updates: {e}")
+                # Devolver a la cola para el siguiente intento
+                self.requeue(batch, count)
+                count = 0
+            finally:
+                with self._lock:
+                    self._inflight = {}
+
+            return count
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Vacía la cola al apagar el worker de forma ordenada"""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending_users": len(self._pending),
+                "pending_updates": self._pending_updates,
+                "flushes": self.flushes,
+                "flushed_updates": self.flushed_updates,
+                "flush_errors": self.flush_errors,
+                "flush_interval_ms": int(self.flush_interval * 1000),
+                "max_pending_updates": self.max_pending_updates
+            }
+
+class UserProgressManager:
+    """✅ Gestiona TODO el progreso del usuario desde el backend"""
+
+    # Campos que suman 1 por actualización y su estadística global asociada
+    COUNTER_FIELDS = {
+        "questions_answered": "total_questions_asked",
+        "help_requests": None,
+        "audio_submissions": "total_audio_processes",
+        "vocabulary_game_plays": "vocabulary_game_plays"
+    }
+
+    def __init__(self, storage=None, write_behind=None):
+        self.storage = storage or _create_progress_storage(Config.PROGRESS_BACKEND)
+        if getattr(self.storage, "event_sourced", False):
+            self.storage.bind(self._apply_event, self._create_new_user_profile)
+
+        if write_behind is None:
+            write_behind = Config.PROGRESS_WRITE_BEHIND
+        self.write_behind = ProgressWriteBehind(
+            self, Config.PROGRESS_FLUSH_INTERVAL_MS, Config.PROGRESS_FLUSH_MAX_UPDATES
+        ) if write_behind else None
+
+    def get_user_progress(self, user_id):
+        """Obtiene progreso del usuario (incluye lo pendiente de escribir en este worker)"""
+        if self.write_behind:
+            user_data, pending = self.write_behind.read(user_id, self.storage.load_user)
+        else:
+            user_data, pending = self.storage.load_user(user_id), None
+
+        if pending:
+            # Copia: el perfil puede venir compartido desde la caché
+            user_data = copy.deepcopy(user_data) if user_data is not None else self._create_new_user_profile(user_id)
+            self._apply_pending(user_data, pending, {})
+
+        return user_data
+
+    def get_statistics(self):
+        """Obtiene estadísticas globales (incluye total_users)"""
+        return self.storage.load_statistics()
+
+    def cache_stats(self):
+        """Aciertos/fallos de la caché de perfiles (None si no hay caché)"""
+        cache = getattr(self.storage, "cache", None)
+        return cache.stats() if cache is not None else None
+
+    def update_user_progress(self, user_id, updates, defer=False):
+        """Actualiza progreso del usuario
+
+        Con defer=True y write-behind activo, la actualización se fusiona en memoria
+        y se devuelve None sin tocar el disco.
+        """
+        if defer and self.write_behind:
+            self.write_behind.add(user_id, updates=updates)
+            return None
+
+        return self._commit_user(user_id, self._merge_updates(self._new_pending(), updates))
+
+    def _commit_user(self, user_id, pending):
+        """Escritura síncrona; antes aplica lo pendiente del usuario para respetar el orden"""
+        queued = self.write_behind.take(user_id) if self.write_behind else None
+        if queued:
+            pending = self._combine_pending(self._combine_pending(self._new_pending(), queued), pending)
+
+        try:
+            results = self._commit_batch({user_id: pending})
+        except Exception:
+            # Lo retirado de la cola no se confirmó: devolverlo para el próximo flush
+            if queued:
+                self.write_behind.requeue({user_id: queued})
+            raise
+        return results[0] if results else self.storage.load_user(user_id)
+
+    def _commit_batch(self, batch):
+        """Persiste {user_id: pending}: eventos en el diario o read-modify-write por fila"""
+        if getattr(self.storage, "event_sourced", False):
+            now = datetime.now().isoformat()
+            self.storage.append_events(
+                [event for user_id, pending in batch.items() for event in self._pending_events(user_id, pending, now)]
+            )
+            return None
+
+        return self.storage.modify_many(
+            [(user_id, self._pending_mutator(pending)) for user_id, pending in batch.items()],
+            self._create_new_user_profile
+        )
+
+    def _new_pending(self):
+        return {"increments": {}, "sets": {}, "vocabulary_scores": {}, "sessions": []}
+
+    def _merge_updates(self, pending, updates):
+        """Fusiona un dict de actualizaciones en el formato pendiente"""
+        increments = pending["increments"]
         for key, value in updates.items():
             if key in ["xp", "total_xp"]:
-                user_data[key] = user_data.get(key, 0) + value
-            elif key == "level":
-                user_data[key] = value
-            elif key == "questions_answered":
-                user_data[key] = user_data.get(key, 0) + 1
-            elif key == "help_requests":
-                user_data[key] = user_data.get(key, 0) + 1
-            elif key == "show_spanish_translation":
-                user_data[key] = value
-            elif key == "audio_submissions":
-                user_data[key] = user_data.get(key, 0) + 1
-                data["statistics"]["total_audio_processes"] += 1
-            elif key == "vocabulary_game_plays":
-                user_data[key] = user_data.get(key, 0) + 1
-                data["statistics"]["vocabulary_game_plays"] += 1
-        
-        # Actualizar estadísticas globales
-        if "questions_answered" in updates:
-            data["statistics"]["total_questions_asked"] += 1
-        
+                increments[key] = increments.get(key, 0) + value
+            elif key in self.COUNTER_FIELDS:
+                increments[key] = increments.get(key, 0) + 1
+            elif key in ["level", "show_spanish_translation"]:
+                pending["sets"][key] = value
+        return pending
+
+    def _merge_vocabulary_score(self, pending, difficulty, score):
+        entry = pending["vocabulary_scores"].setdefault(difficulty, {"plays": 0, "last_score": 0, "best_score": 0})
+        entry["plays"] += 1
+        entry["last_score"] = score
+        entry["best_score"] = max(entry["best_score"], score)
+        return pending
+
+    def _combine_pending(self, dst, src):
+        """Fusiona src (más reciente) sobre dst"""
+        for key, value in src["increments"].items():
+            dst["increments"][key] = dst["increments"].get(key, 0) + value
+        dst["sets"].update(src["sets"])
+        for difficulty, entry in src["vocabulary_scores"].items():
+            target = dst["vocabulary_scores"].setdefault(difficulty, {"plays": 0, "last_score": 0, "best_score": 0})
+            target["plays"] += entry["plays"]
+            target["last_score"] = entry["last_score"]
+            target["best_score"] = max(target["best_score"], entry["best_score"])
+        dst["sessions"].extend(src["sessions"])
+        return dst
+
+    def _pending_mutator(self, pending):
+        return lambda user_data, stats: self._apply_pending(user_data, pending, stats)
+
+    def _pending_events(self, user_id, pending, timestamp):
+        """Traduce una actualización pendiente a eventos del diario"""
+        events = []
+        if pending["increments"] or pending["sets"]:
+            events.append({
+                "type": "progress_updated",
+                "user_id": user_id,
+                "ts": timestamp,
+                "increments": pending["increments"],
+                "sets": pending["sets"]
+            })
+        for difficulty, entry in pending["vocabulary_scores"].items():
+            events.append({"type": "vocab_score", "user_id": user_id, "ts": timestamp, "difficulty": difficulty, **entry})
+        for session in pending["sessions"]:
+            events.append({"type": "session_added", "user_id": user_id, "ts": timestamp, "session": session})
+        return events
+
+    def _apply_event(self, user_data, event, stats):
+        """Reproduce un evento del diario sobre un perfil"""
+        pending = self._new_pending()
+        if event["type"] == "progress_updated":
+            pending["increments"] = event["increments"]
+            pending["sets"] = event["sets"]
+        elif event["type"] == "vocab_score":
+            pending["vocabulary_scores"][event["difficulty"]] = {
+                "plays": event["plays"],
+                "last_score": event["last_score"],
+                "best_score": event["best_score"]
+            }
+        elif event["type"] == "session_added":
+            pending["sessions"].append(event["session"])
+        return self._apply_pending(user_data, pending, stats, timestamp=event["ts"])
+
+    def _apply_pending(self, user_data, pending, stats, timestamp=None):
+        """Aplica actualizaciones fusionadas al perfil y acumula los cambios en estadísticas globales"""
+        # Actualizar campos
+        user_data.update(pending["sets"])
+
+        for key, amount in pending["increments"].items():
+            user_data[key] = user_data.get(key, 0) + amount
+            stat = self.COUNTER_FIELDS.get(key)
+            if stat:
+                stats[stat] = stats.get(stat, 0) + amount
+
+        for difficulty, entry in pending["vocabulary_scores"].items():
+            scores = self._vocabulary_entry(user_data, difficulty)
+            scores["last_score"] = entry["last_score"]
+            scores["plays"] += entry["plays"]
+            scores["best_score"] = max(scores["best_score"], entry["best_score"])
+
+        if pending["sessions"]:
+            history = user_data.setdefault("session_history", [])
+            history.extend(pending["sessions"])
+
+            # Limitar historial a 50 sesiones
+            if len(history) > 50:
+                user_data["session_history"] = history[-50:]
+
+            # Actualizar estadísticas globales
+            stats["total_sessions"] = stats.get("total_sessions", 0) + len(pending["sessions"])
+
         # Calcular nivel basado en XP
         user_data["level"] = self._calculate_level(user_data.get("total_xp", 0))
-        
+
         # Actualizar última actividad
-        user_data["last_activity"] = datetime.now().isoformat()
-        
-        self._save_data(data)
+        user_data["last_activity"] = timestamp or datetime.now().isoformat()
+
         return user_data
-    
+
     def _create_new_user_profile(self, user_id):
         """Crea nuevo perfil de usuario"""
         return {
@@ -1098,7 +4575,7 @@ class UserProgressManager:
             "session_history": [],
             "last_activity": datetime.now().isoformat()
         }
-    
+
     def _calculate_level(self, xp):
         """Calcula nivel basado en XP"""
         if xp < 100:
@@ -1107,16 +4584,9 @@ class UserProgressManager:
             return "intermediate"
         else:
             return "advanced"
-    
+
     def add_session(self, user_id, session_data):
         """Añade sesión al historial"""
-        data = self._load_data()
-        
-        if user_id not in data["users"]:
-            data["users"][user_id] = self._create_new_user_profile(user_id)
-        
-        user_data = data["users"][user_id]
-        
         session_entry = {
             "session_id": session_data.get("session_id", str(uuid.uuid4())),
             "timestamp": datetime.now().isoformat(),
@@ -1125,31 +4595,26 @@ class UserProgressManager:
             "duration_seconds": session_data.get("duration_seconds", 0),
             "game_type": session_data.get("game_type", "practice")
         }
-        
-        user_data["session_history"].append(session_entry)
-        
-        # Limitar historial a 50 sesiones
-        if len(user_data["session_history"]) > 50:
-            user_data["session_history"] = user_data["session_history"][-50:]
-        
-        # Actualizar estadísticas globales
-        data["statistics"]["total_sessions"] += 1
-        
-        self._save_data(data)
+
+        pending = self._new_pending()
+        pending["sessions"].append(session_entry)
+        self._commit_user(user_id, pending)
+
         return session_entry
-    
-    def update_vocabulary_score(self, user_id, difficulty, score):
+
+    def update_vocabulary_score(self, user_id, difficulty, score, defer=False):
         """Actualiza puntuación en juego de vocabulario"""
-        data = self._load_data()
-        
-        if user_id not in data["users"]:
-            data["users"][user_id] = self._create_new_user_profile(user_id)
-        
-        user_data = data["users"][user_id]
-        
+        if defer and self.write_behind:
+            self.write_behind.add(user_id, vocabulary_score=(difficulty, score))
+            return None
+
+        user_data = self._commit_user(user_id, self._merge_vocabulary_score(self._new_pending(), difficulty, score))
+        return self._vocabulary_entry(user_data, difficulty)
+
+    def _vocabulary_entry(self, user_data, difficulty):
         if "vocabulary_game_scores" not in user_data:
             user_data["vocabulary_game_scores"] = {}
-        
+
         if difficulty not in user_data["vocabulary_game_scores"]:
             user_data["vocabulary_game_scores"][difficulty] = {
                 "best_score": 0,
@@ -1158,18 +4623,37 @@ class UserProgressManager:
                 "total_words": 0,
                 "correct_answers": 0
             }
-        
-        # Actualizar estadísticas
-        user_data["vocabulary_game_scores"][difficulty]["last_score"] = score
-        user_data["vocabulary_game_scores"][difficulty]["plays"] += 1
-        
-        if score > user_data["vocabulary_game_scores"][difficulty]["best_score"]:
-            user_data["vocabulary_game_scores"][difficulty]["best_score"] = score
-        
-        self._save_data(data)
-        
+
         return user_data["vocabulary_game_scores"][difficulty]
 
+    def update_progress_batch(self, updates):
+        """Aplica muchas actualizaciones [(user_id, updates)] en una sola escritura"""
+        batch = {}
+        for user_id, user_updates in updates:
+            batch[user_id] = self._merge_updates(batch.get(user_id) or self._new_pending(), user_updates)
+        if not batch:
+            return None
+
+        # Lo pendiente de write-behind va antes, para respetar el orden
+        taken = {}
+        if self.write_behind:
+            for user_id in batch:
+                queued = self.write_behind.take(user_id)
+                if queued:
+                    taken[user_id] = queued
+                    batch[user_id] = self._combine_pending(self._combine_pending(self._new_pending(), queued), batch[user_id])
+
+        try:
+            return self._commit_batch(batch)
+        except Exception:
+            if taken:
+                self.write_behind.requeue(taken)
+            raise
+
+    def flush(self):
+        """Fuerza la confirmación de lo pendiente (no-op sin write-behind)"""
+        return self.write_behind.flush() if self.write_behind else 0
+
 # ✅ Inicializar gestor de progreso
 progress_manager = UserProgressManager()
 
@@ -1179,8 +4663,11 @@ progress_manager = UserProgressManager()
 class PronunciationEvaluator:
     """Evalúa pronunciación y da retroalimentación"""
     
-    def evaluate(self, transcribed_text, expected_question=None):
-        """🚨 ERROR 1 CORREGIDO: Evalúa la pronunciación - word_count SIEMPRE definido"""
+    def evaluate(self, transcribed_text, expected_question=None, acoustic_features=None):
+        """🚨 ERROR 1 CORREGIDO: Evalúa la pronunciación - word_count SIEMPRE definido
+
+        Con acoustic_features (de FluencyFeatureExtractor) añade la dimensión "fluency".
+        """
         
         if not transcribed_text or len(transcribed_text.strip()) < 3:
             # 🚨 ERROR 1 CORREGIDO: Añadir word_count = 0 cuando no hay texto
@@ -1219,7 +4706,7 @@ class PronunciationEvaluator:
         feedback = self._generate_feedback(final_score, word_count, common_errors)
         
         # 🚨 ERROR 1 CORREGIDO: Añadir word_count en el return normal
-        return {
+        evaluation = {
             "score": final_score,
             "feedback": feedback,
             "needs_scaffolding": needs_scaffolding,
@@ -1228,6 +4715,39 @@ class PronunciationEvaluator:
             "word_count": word_count,  # 🚨 CORREGIDO: word_count incluido
             "error_count": error_count
         }
+        
+        # ✅ Dimensiones acústicas de fluidez (no alteran score)
+        if acoustic_features and acoustic_features.get("speech_seconds"):
+            evaluation["fluency"] = self._evaluate_fluency(acoustic_features, word_count)
+        
+        return evaluation
+    
+    def _evaluate_fluency(self, features, word_count):
+        """Puntúa velocidad, pausas y continuidad de la voz (0-100 cada una)"""
+        words_per_minute = word_count / features["speech_seconds"] * 60
+        
+        # Ritmo cómodo para estudiantes: 90-150 palabras por minuto
+        if words_per_minute < 90:
+            rate_score = max(0, 100 - (90 - words_per_minute) * 1.5)
+        elif words_per_minute > 150:
+            rate_score = max(0, 100 - (words_per_minute - 150))
+        else:
+            rate_score = 100
+        
+        # Pausas: cada pausa larga resta, y más si supera un segundo
+        pause_score = max(0, 100 - features["pause_count"] * 10 - max(0, features["longest_pause_seconds"] - 1) * 20)
+        
+        # Continuidad: proporción de tramas con voz entre el inicio y el final
+        continuity_score = min(100, features["voiced_ratio"] / 0.7 * 100)
+        
+        return {
+            "fluency_score": round(0.4 * rate_score + 0.4 * pause_score + 0.2 * continuity_score),
+            "words_per_minute": round(words_per_minute, 1),
+            "rate_score": round(rate_score),
+            "pause_score": round(pause_score),
+            "continuity_score": round(continuity_score),
+            "features": features
+        }
     
     def _detect_common_errors(self, text):
         """Detecta errores comunes en el inglés hablado"""
@@ -1332,7 +4852,7 @@ def get_vocabulary_word():
         # Registrar juego en estadísticas
         progress_manager.update_user_progress(user_id, {
             "vocabulary_game_plays": 1
-        })
+        }, defer=True)
         
         return jsonify({
             "status": "success",
@@ -1344,6 +4864,7 @@ def get_vocabulary_word():
                 "ejemplo": palabra_data["ejemplo"],
                 "dificultad": palabra_data["dificultad"],
                 "puntos_base": palabra_data["puntos_base"],
+                "content_hash": palabra_data.get("content_hash"),
                 "instrucciones": "🎤 Di la palabra en inglés que corresponde a la palabra en español mostrada."
             }
         })
@@ -1377,10 +4898,10 @@ def validate_vocabulary_answer():
         if resultado["es_correcta"]:
             progress_manager.update_user_progress(user_id, {
                 "xp": resultado["puntos_obtenidos"]
-            })
+            }, defer=True)
             
             # Actualizar puntuación en juego de vocabulario
-            progress_manager.update_vocabulary_score(user_id, dificultad, resultado["puntos_obtenidos"])
+            progress_manager.update_vocabulary_score(user_id, dificultad, resultado["puntos_obtenidos"], defer=True)
         
         return jsonify({
             "status": "success",
@@ -1453,7 +4974,21 @@ def health_check():
         "question_database": "active",
         "vocabulary_game": "active (50 words)",
         "audio_processor": "active (WAV conversion enabled)",
-        "progress_manager": "active",
+        "audio_formats": audio_processor.format_stats(),
+        "recognizers": audio_processor.recognizer_stats(),
+        "transcription_cache": audio_processor.cache_stats(),
+        "vad": audio_processor.vad_stats(),
+        "audio_admission": audio_processor.admission_stats(),
+        "audio_pool": audio_processor.pool_stats(),
+        "audio_decoder": audio_processor.decoder_stats(),
+        "transcription_queue": transcription_queue.stats(),
+        "streaming": streaming_stats(),
+        "progress_manager": f"active ({progress_manager.storage.name})",
+        "progress_write_behind": progress_manager.write_behind.stats() if progress_manager.write_behind else "disabled",
+        "progress_cache": progress_manager.cache_stats() or "disabled",
+        "scaffolding": question_db.scaffolding_stats(),
+        "content": content_packs.stats(),
+        "question_history": question_db.user_history.stats(),
         "grammar_corrections": "applied",
         "critical_fixes": [
             "✅ word_count error fixed in PronunciationEvaluator",
@@ -1501,6 +5036,7 @@ def start_practice():
                 "xp": user_progress.get("total_xp", 0) if user_progress else 0,
                 "question_topic": first_question["topic"],
                 "question_tense": first_question["tense"],
+                "content_hash": first_question["content_hash"],
                 "is_predefined": True,
                 "grammar_status": "verified",
                 "message": f"🎯 Welcome to Eli English Tutor! Let's start practicing {user_level} level questions with PERFECT grammar."
@@ -1528,112 +5064,142 @@ def process_audio():
         user_id = request.form.get('user_id', 'anonymous')
         current_question = request.form.get('current_question', 'What is your name?')
         
-        logger.info(f"Processing audio from user {user_id[:8]}...")
-        
-        # Transcribir audio (con conversión a WAV implementada)
-        audio_bytes = audio_file.read()
-        transcription = audio_processor.transcribe_audio(audio_bytes)
-        user_text = transcription.get('text', '')
-        
-        # Obtener progreso del usuario
-        user_progress = progress_manager.get_user_progress(user_id)
-        user_level = user_progress.get("level", "beginner") if user_progress else "beginner"
-        show_translation = user_progress.get("show_spanish_translation", True) if user_progress else True
-        
-        # ✅ ERROR 1 CORREGIDO: Evaluar pronunciación (word_count siempre definido)
-        pronunciation_evaluation = pronunciation_evaluator.evaluate(user_text, current_question)
-        
-        # Determinar siguiente pregunta basada en desempeño
-        if pronunciation_evaluation["score"] >= 80:
-            # Buen desempeño: avanzar nivel o mantener actual
-            if user_level == "beginner" and random.random() > 0.7:
-                next_level = "intermediate"
-            elif user_level == "intermediate" and random.random() > 0.8:
-                next_level = "advanced"
-            else:
-                next_level = user_level
-        elif pronunciation_evaluation["score"] >= 60:
-            # Desempeño moderado: mantener nivel
-            next_level = user_level
-        else:
-            # Bajo desempeño: posiblemente bajar nivel
-            if user_level == "advanced" and random.random() > 0.6:
-                next_level = "intermediate"
-            elif user_level == "intermediate" and random.random() > 0.7:
-                next_level = "beginner"
-            else:
-                next_level = user_level
-        
-        # ✅ Obtener siguiente pregunta con gramática perfecta
-        next_question_data = question_db.get_question(user_id, next_level)
-        
-        # ✅ Generar scaffolding ESPECÍFICO si es necesario
-        scaffolding = None
-        if pronunciation_evaluation["needs_scaffolding"]:
-            scaffolding = question_db.get_scaffolding_for_question(current_question, user_level)
+        audio_bytes = _uploaded_audio_bytes(audio_file)
         
-        # Calcular XP ganado
-        xp_earned = _calculate_xp_earned(
-            pronunciation_evaluation["score"],
-            pronunciation_evaluation["word_count"],  # ✅ Ahora word_count siempre existe
-            user_level
-        )
-        
-        # ✅ Actualizar progreso del usuario (backend controla TODO)
-        progress_manager.update_user_progress(user_id, {
-            "xp": xp_earned,
-            "level": next_level,
-            "questions_answered": 1,
-            "audio_submissions": 1,
-            "show_spanish_translation": show_translation
-        })
+        # ✅ Modo asíncrono: encolar y devolver job_id de inmediato
+        if _wants_async_processing():
+            return _submit_transcription_job(audio_bytes, session_id, user_id, current_question)
         
-        # Construir respuesta
-        response_message = _build_response_message(
-            user_text,
-            pronunciation_evaluation,
-            next_question_data,
-            xp_earned,
-            show_translation
-        )
+        return jsonify(_process_audio_submission(audio_bytes, session_id, user_id, current_question))
         
-        response = {
-            "status": "success",
-            "data": {
-                "type": "conversation_response",
-                "message": response_message,
-                "user_transcription": user_text,
-                "pronunciation_score": pronunciation_evaluation["score"],
-                "pronunciation_feedback": pronunciation_evaluation["feedback"],
-                "next_question": next_question_data["english"],
-                "next_question_spanish": next_question_data["spanish"],
-                "next_question_topic": next_question_data["topic"],
-                "next_question_tense": next_question_data["tense"],
-                "needs_scaffolding": pronunciation_evaluation["needs_scaffolding"],
-                "scaffolding_data": scaffolding,  # ✅ Scaffolding específico
-                "user_level": user_level,
-                "next_level": next_level,
-                "xp_earned": xp_earned,
-                "total_xp": (user_progress.get("total_xp", 0) if user_progress else 0) + xp_earned,
-                "show_spanish_translation": show_translation,
-                "session_info": {
-                    "session_id": session_id,
-                    "user_id": user_id,
-                    "questions_answered": user_progress.get("questions_answered", 1) if user_progress else 1
-                },
-                "is_predefined": True,
-                "grammar_verified": True,  # ✅ Confirmar que la gramática es perfecta
-                "word_count": pronunciation_evaluation["word_count"],  # ✅ ERROR 1 CORREGIDO: Incluir word_count
-                "error_count": pronunciation_evaluation["error_count"]  # ✅ Incluir error_count
-            }
-        }
+    except RequestEntityTooLarge:
+        raise
         
-        return jsonify(response)
+    except AudioPoolBusyError as e:
+        response = jsonify({"status": "error", "message": "Server busy, please retry", "retry_after": e.retry_after})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
         
     except Exception as e:
         logger.error(f"Error in process-audio: {e}")
         return jsonify({"status": "error", "message": str(e)[:100]}), 500
 
+def _process_audio_submission(audio_bytes, session_id, user_id, current_question):
+    """Transcribe, evalúa, actualiza progreso y construye la respuesta (sin contexto de request)"""
+    logger.info(f"Processing audio from user {user_id[:8]}...")
+    
+    # Transcribir audio (con conversión a WAV implementada)
+    transcription = audio_processor.transcribe_audio(audio_bytes)
+    return _process_transcription(transcription, session_id, user_id, current_question)
+
+def _process_transcription(transcription, session_id, user_id, current_question):
+    """Evalúa una transcripción ya hecha (subida completa o streaming) y construye la respuesta"""
+    user_text = transcription.get('text', '')
+    
+    # Obtener progreso del usuario
+    user_progress = progress_manager.get_user_progress(user_id)
+    user_level = user_progress.get("level", "beginner") if user_progress else "beginner"
+    show_translation = user_progress.get("show_spanish_translation", True) if user_progress else True
+    
+    # ✅ ERROR 1 CORREGIDO: Evaluar pronunciación (word_count siempre definido)
+    pronunciation_evaluation = pronunciation_evaluator.evaluate(
+        user_text, current_question, transcription.get("acoustic_features")
+    )
+    
+    # ✅ Audio rechazado en el prechequeo: explicar el motivo concreto
+    audio_rejection = transcription.get("rejected")
+    if audio_rejection:
+        pronunciation_evaluation["feedback"] = audio_rejection["message"]
+    
+    # Determinar siguiente pregunta basada en desempeño
+    if pronunciation_evaluation["score"] >= 80:
+        # Buen desempeño: avanzar nivel o mantener actual
+        if user_level == "beginner" and random.random() > 0.7:
+            next_level = "intermediate"
+        elif user_level == "intermediate" and random.random() > 0.8:
+            next_level = "advanced"
+        else:
+            next_level = user_level
+    elif pronunciation_evaluation["score"] >= 60:
+        # Desempeño moderado: mantener nivel
+        next_level = user_level
+    else:
+        # Bajo desempeño: posiblemente bajar nivel
+        if user_level == "advanced" and random.random() > 0.6:
+            next_level = "intermediate"
+        elif user_level == "intermediate" and random.random() > 0.7:
+            next_level = "beginner"
+        else:
+            next_level = user_level
+    
+    # ✅ Obtener siguiente pregunta con gramática perfecta
+    next_question_data = question_db.get_question(user_id, next_level)
+    
+    # ✅ Generar scaffolding ESPECÍFICO si es necesario
+    scaffolding = None
+    if pronunciation_evaluation["needs_scaffolding"]:
+        scaffolding = question_db.get_scaffolding_for_question(current_question, user_level)
+    
+    # Calcular XP ganado
+    xp_earned = _calculate_xp_earned(
+        pronunciation_evaluation["score"],
+        pronunciation_evaluation["word_count"],  # ✅ Ahora word_count siempre existe
+        user_level
+    )
+    
+    # ✅ Actualizar progreso del usuario (backend controla TODO)
+    progress_manager.update_user_progress(user_id, {
+        "xp": xp_earned,
+        "level": next_level,
+        "questions_answered": 1,
+        "audio_submissions": 1,
+        "show_spanish_translation": show_translation
+    }, defer=True)
+    
+    # Construir respuesta
+    response_message = _build_response_message(
+        user_text,
+        pronunciation_evaluation,
+        next_question_data,
+        xp_earned,
+        show_translation
+    )
+    
+    response = {
+        "status": "success",
+        "data": {
+            "type": "conversation_response",
+            "message": response_message,
+            "user_transcription": user_text,
+            "pronunciation_score": pronunciation_evaluation["score"],
+            "pronunciation_feedback": pronunciation_evaluation["feedback"],
+            "next_question": next_question_data["english"],
+            "next_question_spanish": next_question_data["spanish"],
+            "next_question_topic": next_question_data["topic"],
+            "next_question_tense": next_question_data["tense"],
+            "needs_scaffolding": pronunciation_evaluation["needs_scaffolding"],
+            "scaffolding_data": scaffolding,  # ✅ Scaffolding específico
+            "user_level": user_level,
+            "next_level": next_level,
+            "xp_earned": xp_earned,
+            "total_xp": (user_progress.get("total_xp", 0) if user_progress else 0) + xp_earned,
+            "show_spanish_translation": show_translation,
+            "session_info": {
+                "session_id": session_id,
+                "user_id": user_id,
+                "questions_answered": user_progress.get("questions_answered", 1) if user_progress else 1
+            },
+            "is_predefined": True,
+            "grammar_verified": True,  # ✅ Confirmar que la gramática es perfecta
+            "word_count": pronunciation_evaluation["word_count"],  # ✅ ERROR 1 CORREGIDO: Incluir word_count
+            "error_count": pronunciation_evaluation["error_count"],  # ✅ Incluir error_count
+            "fluency": pronunciation_evaluation.get("fluency"),
+            "audio_rejected": audio_rejection
+        }
+    }
+    
+    return response
+
 def _calculate_xp_earned(score, word_count, level):
     """Calcula XP ganado basado en desempeño"""
     base_xp = score / 10  # 0-9.5 XP por puntuación
@@ -1686,6 +5252,852 @@ Speak clearly for 2-3 seconds!"""
     
     return "\n".join(parts)
 
+# ============================================
+# ENDPOINT: LOTE DE AUDIOS (NDJSON)
+# ============================================
+def _evaluate_batch_clip(index, clip):
+    """Transcribe y evalúa un clip del lote (sin siguiente pregunta ni escritura de progreso)"""
+    try:
+        transcription = audio_processor.transcribe_audio(clip["audio"])
+    except AudioPoolBusyError:
+        transcription = {"text": "", "language": "unknown", "error": "Server busy, please retry"}
+
+    user_text = transcription.get("text", "")
+    evaluation = pronunciation_evaluator.evaluate(
+        user_text, clip["expected_question"], transcription.get("acoustic_features")
+    )
+    audio_rejection = transcription.get("rejected")
+    if audio_rejection:
+        evaluation["feedback"] = audio_rejection["message"]
+
+    return {
+        "type": "result",
+        "index": index,
+        "filename": clip["filename"],
+        "user_id": clip["user_id"],
+        "expected_question": clip["expected_question"],
+        "user_transcription": user_text,
+        "transcription_error": transcription.get("error"),
+        "pronunciation_score": evaluation["score"],
+        "pronunciation_feedback": evaluation["feedback"],
+        "word_count": evaluation["word_count"],
+        "error_count": evaluation["error_count"],
+        "fluency": evaluation.get("fluency"),
+        "audio_rejected": audio_rejection
+    }
+
+def _stream_batch_results(clips, session_id):
+    """Genera una línea NDJSON por clip al terminar y un resumen con la escritura de progreso"""
+    started = time.perf_counter()
+    levels = {}
+    progress_updates = []
+    scores = []
+    failed = 0
+    committed = False
+
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=Config.BATCH_CONCURRENCY, thread_name_prefix="batch-audio"
+    )
+    try:
+        futures = {executor.submit(_evaluate_batch_clip, index, clip): index for index, clip in enumerate(clips)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                index = futures[future]
+                logger.error(f"Error in batch clip {index}: {e}")
+                failed += 1
+                yield json.dumps({"type": "error", "index": index, "message": str(e)[:100]}) + "\n"
+                continue
+
+            user_id = result["user_id"]
+            if user_id not in levels:
+                user_progress = progress_manager.get_user_progress(user_id)
+                levels[user_id] = user_progress.get("level", "beginner") if user_progress else "beginner"
+
+            result["xp_earned"] = _calculate_xp_earned(result["pronunciation_score"], result["word_count"], levels[user_id])
+            progress_updates.append((user_id, {
+                "xp": result["xp_earned"],
+                "questions_answered": 1,
+                "audio_submissions": 1
+            }))
+            scores.append(result["pronunciation_score"])
+            if result["transcription_error"] and not result["user_transcription"]:
+                failed += 1
+
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        # ✅ Todo el progreso del lote en una sola escritura
+        progress_manager.update_progress_batch(progress_updates)
+        committed = True
+
+        yield json.dumps({
+            "type": "summary",
+            "session_id": session_id,
+            "clips": len(clips),
+            "failed": failed,
+            "average_score": round(sum(scores) / len(scores), 1) if scores else 0,
+            "progress_committed": committed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000)
+        }) + "\n"
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Cliente desconectado a mitad: confirmar lo ya evaluado igualmente
+        if not committed and progress_updates:
+            try:
+                progress_manager.update_progress_batch(progress_updates)
+            except Exception as e:
+                logger.error(f"Error committing batch progress: {e}")
+
+def _parse_batch_list(raw, field, count):
+    """Lista JSON de cadenas con 1 elemento (para todos) o uno por clip; ValueError si no"""
+    try:
+        values = json.loads(raw)
+    except ValueError:
+        raise ValueError(f"'{field}' is not valid JSON")
+    if not isinstance(values, list) or not all(isinstance(value, str) and value for value in values):
+        raise ValueError(f"'{field}' must be a JSON list of strings")
+    if len(values) not in (1, count):
+        raise ValueError(f"'{field}' must have 1 or {count} items")
+    return values
+
+@app.route('/api/process-audio/batch', methods=['POST'])
+def process_audio_batch():
+    """✅ Lote de grabaciones (tareas): transcribe y evalúa en paralelo, responde en NDJSON
+
+    Formulario: varios archivos 'audio', 'expected_questions' (lista JSON con una pregunta
+    por clip o una sola para todos, o el texto de una pregunta), 'user_id' o 'user_ids'
+    (lista JSON con el mismo criterio) y 'session_id'. Listas mal formadas → 400.
+    """
+    try:
+        audio_files = request.files.getlist('audio')
+        if not audio_files:
+            return jsonify({"status": "error", "message": "No audio files provided"}), 400
+        if len(audio_files) > Config.BATCH_MAX_CLIPS:
+            return jsonify({
+                "status": "error",
+                "message": f"Too many clips (max {Config.BATCH_MAX_CLIPS})"
+            }), 400
+
+        session_id = request.form.get('session_id', 'default')
+        default_user = request.form.get('user_id', 'anonymous')
+        questions = request.form.get('expected_questions', 'What is your name?')
+        user_ids = request.form.get('user_ids')
+        try:
+            questions = (_parse_batch_list(questions, 'expected_questions', len(audio_files))
+                         if questions.lstrip().startswith(('[', '{')) else [questions])
+            user_ids = _parse_batch_list(user_ids, 'user_ids', len(audio_files)) if user_ids else [default_user]
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)[:100]}), 400
+
+        clips = [
+            {
+                "audio": _uploaded_audio_bytes(audio_file),
+                "filename": audio_file.filename,
+                "expected_question": questions[index if len(questions) > 1 else 0],
+                "user_id": user_ids[index if len(user_ids) > 1 else 0]
+            }
+            for index, audio_file in enumerate(audio_files)
+        ]
+
+        logger.info(f"Processing batch of {len(clips)} clips (session {session_id[:8]})")
+        return app.response_class(_stream_batch_results(clips, session_id), mimetype='application/x-ndjson')
+
+    except RequestEntityTooLarge:
+        raise
+
+    except Exception as e:
+        logger.error(f"Error in process-audio batch: {e}")
+        return jsonify({"status": "error", "message": str(e)[:100]}), 500
+
+# ============================================
+# COLA ASÍNCRONA DE TRANSCRIPCIÓN
+# ============================================
+class QueueFullError(Exception):
+    """La cola está llena; retry_after sugiere cuántos segundos esperar"""
+
+    def __init__(self, retry_after):
+        super().__init__("Transcription queue is full")
+        self.retry_after = retry_after
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _default_stale_job_seconds():
+    """Peor espera razonable de un trabajo: los que tiene delante más el suyo, con margen x2"""
+    per_job = max(Config.AUDIO_POOL_ADMIT_TIMEOUT_S + Config.AUDIO_POOL_TASK_TIMEOUT_S,
+                  Config.AUDIO_DECODE_TIMEOUT + Config.RECOGNIZER_TIMEOUT_S)
+    jobs_ahead = Config.ASYNC_QUEUE_SIZE / max(1, Config.ASYNC_WORKERS)
+    return 2 * (jobs_ahead + 1) * per_job
+
+class TranscriptionJobStore:
+    """✅ Estado de los trabajos en SQLite: cualquier worker de gunicorn puede responder al sondeo
+
+    Cada trabajo guarda el pid del worker que lo encoló: si ese proceso ya no existe,
+    nadie lo va a terminar y se marca como fallido.
+    """
+
+    def __init__(self, db_path, ttl_seconds=600, stale_seconds=None):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds or _default_stale_job_seconds()
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, user_id TEXT, state TEXT NOT NULL, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "result TEXT, error TEXT, owner_pid INTEGER, retry_after INTEGER)"
+        )
+        # Bases creadas antes de estas columnas
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("owner_pid", "retry_after"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER")
+        # ✅ Trabajos que quedaron a medias en un arranque anterior
+        self.purge_expired()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = _open_sqlite_connection(self.db_path)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def create(self, job_id, user_id):
+        self._connect().execute(
+            "INSERT INTO jobs (job_id, user_id, state, created_at, owner_pid) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, user_id, time.time(), os.getpid())
+        )
+
+    def mark_running(self, job_id):
+        self._connect().execute(
+            "UPDATE jobs SET state = 'running', started_at = ? WHERE job_id = ?", (time.time(), job_id)
+        )
+
+    def finish(self, job_id, result):
+        self._connect().execute(
+            "UPDATE jobs SET state = 'done', finished_at = ?, result = ? WHERE job_id = ?",
+            (time.time(), json.dumps(result, ensure_ascii=False), job_id)
+        )
+
+    def fail(self, job_id, error, retry_after=None):
+        """Marca el trabajo como fallido; con retry_after el cliente puede reintentar (503)"""
+        self._connect().execute(
+            "UPDATE jobs SET state = 'error', finished_at = ?, error = ?, retry_after = ? WHERE job_id = ?",
+            (time.time(), error, retry_after, job_id)
+        )
+
+    def get(self, job_id):
+        row = self._connect().execute(
+            "SELECT job_id, user_id, state, created_at, started_at, finished_at, result, error, retry_after "
+            "FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        job_id, user_id, state, created_at, started_at, finished_at, result, error, retry_after = row
+        return {
+            "job_id": job_id,
+            "user_id": user_id,
+            "state": state,
+            "queue_wait_ms": round((started_at - created_at) * 1000) if started_at else None,
+            "processing_ms": round((finished_at - started_at) * 1000) if finished_at and started_at else None,
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "retry_after": retry_after
+        }
+
+    def purge_expired(self):
+        """Falla los trabajos sin terminar cuyo worker murió y elimina los terminados hace más de ttl_seconds
+
+        La cola vive en memoria: si el worker que tenía el trabajo murió, nadie lo va a
+        terminar, y el cliente que sondea debe recibir un error en vez de 'pending' para siempre.
+        stale_seconds es solo el último recurso (pid reutilizado, base compartida entre máquinas).
+        """
+        now = time.time()
+        conn = self._connect()
+        abandon = "UPDATE jobs SET state = 'error', finished_at = ?, error = 'Job abandoned by its worker' "
+        owners = conn.execute(
+            "SELECT DISTINCT owner_pid FROM jobs WHERE state IN ('queued', 'running') AND owner_pid IS NOT NULL"
+        ).fetchall()
+        dead = [pid for (pid,) in owners if pid != os.getpid() and not _process_alive(pid)]
+        abandoned = 0
+        if dead:
+            abandoned += conn.execute(
+                abandon + f"WHERE state IN ('queued', 'running') AND owner_pid IN ({','.join('?' * len(dead))})",
+                (now, *dead)
+            ).rowcount
+        abandoned += conn.execute(
+            abandon + "WHERE state IN ('queued', 'running') AND created_at < ?",
+            (now, now - self.stale_seconds)
+        ).rowcount
+        if abandoned:
+            logger.warning(f"Marked {abandoned} abandoned transcription jobs as failed")
+        conn.execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (now - self.ttl_seconds,)
+        )
+
+class TranscriptionJobQueue:
+    """✅ Pool acotado de hilos para decodificar, reconocer, evaluar y guardar progreso
+
+    Los hilos se crean en el primer envío para que cada worker de gunicorn tenga los suyos.
+    """
+
+    def __init__(self, store, workers=2, max_queue=16):
+        self.store = store
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._events = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_latency = LatencyStats()
+        self.run_latency = LatencyStats()
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._threads = [
+                threading.Thread(target=self._worker, name=f"transcription-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def retry_after(self):
+        """Segundos estimados hasta que se libere un hueco"""
+        avg = self.run_latency.total_seconds / self.run_latency.calls if self.run_latency.calls else 2.0
+        return max(1, min(60, math.ceil(avg * (self._queue.qsize() + 1) / self.workers)))
+
+    def submit(self, user_id, func, *args):
+        """Encola el trabajo y devuelve su job_id; lanza QueueFullError si no cabe"""
+        self._ensure_workers()
+        job_id = uuid.uuid4().hex
+
+        if self._queue.full():
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError(self.retry_after())
+
+        self.store.create(job_id, user_id)
+        with self._lock:
+            self._events[job_id] = threading.Event()
+        try:
+            self._queue.put_nowait((job_id, time.perf_counter(), func, args))
+        except queue.Full:
+            with self._lock:
+                self._events.pop(job_id, None)
+            self.store.fail(job_id, "Transcription queue is full")
+            with self._lock:
+                self.rejected += 1
+            raise QueueFullError(self.retry_after())
+
+        with self._lock:
+            self.submitted += 1
+            purge = self.submitted % 100 == 0
+        if purge:
+            self.store.purge_expired()
+        return job_id
+
+    def _worker(self):
+        while True:
+            job_id, enqueued_at, func, args = self._queue.get()
+            started = time.perf_counter()
+            self.wait_latency.record(started - enqueued_at)
+            ok = True
+            try:
+                self.store.mark_running(job_id)
+                self.store.finish(job_id, func(*args))
+                with self._lock:
+                    self.completed += 1
+            except AudioPoolBusyError as e:
+                # Transitorio: el cliente lo ve como 503 con Retry-After, igual que en modo síncrono
+                ok = False
+                with self._lock:
+                    self.failed += 1
+                try:
+                    self.store.fail(job_id, "Server busy, please retry", retry_after=e.retry_after)
+                except Exception as store_error:
+                    logger.error(f"Could not record failure of job {job_id}: {store_error}")
+            except Exception as e:
+                ok = False
+                with self._lock:
+                    self.failed += 1
+                logger.error(f"Transcription job {job_id} failed: {e}")
+                try:
+                    self.store.fail(job_id, str(e)[:100])
+                except Exception as store_error:
+                    logger.error(f"Could not record failure of job {job_id}: {store_error}")
+            finally:
+                self.run_latency.record(time.perf_counter() - started, ok=ok)
+                with self._lock:
+                    event = self._events.pop(job_id, None)
+                if event:
+                    event.set()
+                self._queue.task_done()
+
+    def wait(self, job_id, timeout):
+        """Long-poll: espera a que el trabajo termine o venza el plazo"""
+        with self._lock:
+            event = self._events.get(job_id)
+        if event is not None:
+            # Trabajo de este worker: esperar a la señal
+            event.wait(timeout)
+            return self.store.get(job_id)
+
+        # Trabajo de otro worker: sondear el almacén compartido
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job["state"] in ("done", "error") or time.monotonic() >= deadline:
+                return job
+            time.sleep(0.25)
+
+    def stats(self):
+        with self._lock:
+            counters = {
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed
+            }
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            **counters,
+            "queue_wait": self.wait_latency.snapshot(),
+            "processing": self.run_latency.snapshot()
+        }
+
+# ✅ Inicializar cola de transcripción
+transcription_queue = TranscriptionJobQueue(
+    TranscriptionJobStore(Config.JOBS_DB_PATH, Config.ASYNC_JOB_TTL_S, Config.ASYNC_STALE_JOB_S),
+    workers=Config.ASYNC_WORKERS,
+    max_queue=Config.ASYNC_QUEUE_SIZE
+)
+
+def _wants_async_processing():
+    """El cliente pide modo asíncrono con async=true en el formulario o la query"""
+    flag = request.form.get('async') or request.args.get('async') or ''
+    return flag.lower() in ('1', 'true', 'yes')
+
+def _submit_transcription_job(audio_bytes, session_id, user_id, current_question):
+    """Encola el audio y responde 202 con el job_id (o 429 si la cola está llena)"""
+    try:
+        job_id = transcription_queue.submit(
+            user_id, _process_audio_submission, audio_bytes, session_id, user_id, current_question
+        )
+    except QueueFullError as e:
+        response = jsonify({
+            "status": "error",
+            "message": "Server busy, please retry",
+            "retry_after": e.retry_after
+        })
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 429
+
+    logger.info(f"Queued audio job {job_id} for user {user_id[:8]}")
+    return jsonify({
+        "status": "accepted",
+        "data": {
+            "job_id": job_id,
+            "state": "queued",
+            "queue_depth": transcription_queue.stats()["queue_depth"],
+            "poll_url": f"/api/process-audio/jobs/{job_id}"
+        }
+    }), 202
+
+@app.route('/api/process-audio/jobs/<job_id>', methods=['GET'])
+def get_transcription_job(job_id):
+    """Resultado de un trabajo asíncrono; ?wait=N hace long-poll hasta N segundos"""
+    try:
+        wait = min(max(request.args.get('wait', 0, type=float), 0), Config.ASYNC_MAX_WAIT_S)
+        job = transcription_queue.wait(job_id, wait) if wait else transcription_queue.store.get(job_id)
+
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+
+        job_info = {key: job[key] for key in ("job_id", "state", "queue_wait_ms", "processing_ms")}
+
+        if job["state"] == "done":
+            return jsonify({**job["result"], "job": job_info})
+
+        if job["state"] == "error":
+            if job["retry_after"]:
+                response = jsonify({
+                    "status": "error", "message": job["error"], "retry_after": job["retry_after"], "job": job_info
+                })
+                response.headers["Retry-After"] = str(job["retry_after"])
+                return response, 503
+            return jsonify({"status": "error", "message": job["error"], "job": job_info}), 500
+
+        response = jsonify({"status": "pending", "job": job_info})
+        response.headers["Retry-After"] = "1"
+        return response, 202
+
+    except Exception as e:
+        logger.error(f"Error getting transcription job: {e}")
+        return jsonify({"status": "error", "message": str(e)[:100]}), 500
+
+# ============================================
+# STREAMING DE AUDIO POR WEBSOCKET
+# ============================================
+class StreamingPCMDecoder:
+    """✅ ffmpeg de larga duración para un stream: trozos del contenedor por stdin, PCM por stdout"""
+
+    def __init__(self, demuxer=None):
+        command = [AudioSegment.converter, "-hide_banner", "-loglevel", "error"]
+        if demuxer:
+            command += ["-f", demuxer]
+        command += [
+            "-i", "pipe:0", "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", "1", "-ar", str(AudioProcessor.SAMPLE_RATE), "pipe:1"
+        ]
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self._output = queue.Queue()
+        self._reader = threading.Thread(target=self._read, name="stream-decoder", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        # Hilo lector: vacía stdout para que ffmpeg nunca se bloquee escribiendo
+        while True:
+            chunk = self.process.stdout.read1(65536)
+            if not chunk:
+                break
+            self._output.put(chunk)
+
+    def _drain(self):
+        chunks = []
+        while True:
+            try:
+                chunks.append(self._output.get_nowait())
+            except queue.Empty:
+                return b"".join(chunks)
+
+    def feed(self, data):
+        """Envía bytes del contenedor y devuelve el PCM decodificado hasta ahora"""
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+        return self._drain()
+
+    def close(self):
+        """Cierra la entrada y devuelve el PCM pendiente"""
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=Config.AUDIO_DECODE_TIMEOUT)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+        self._reader.join(timeout=5)
+        return self._drain()
+
+class StreamingTranscriber:
+    """✅ Reconoce el audio por segmentos a medida que llega
+
+    Cuando el VAD ve voz seguida de una pausa de pause_ms (o el segmento supera
+    max_segment_s), ese tramo se envía al motor (en el executor, si se pasa uno) y su
+    texto se añade al parcial cuando poll() lo recoge. Al terminar solo queda por
+    reconocer el último segmento.
+    """
+
+    def __init__(self, processor, pause_ms=600, max_segment_s=10.0, executor=None):
+        self.processor = processor
+        self.detector = processor.vad or VoiceActivityDetector(processor.SAMPLE_RATE)
+        self.frame_bytes = self.detector.frame_size * processor.SAMPLE_WIDTH
+        frame_ms = self.detector.frame_size * 1000 // processor.SAMPLE_RATE
+        self.pause_frames = max(1, pause_ms // frame_ms)
+        self.max_segment_frames = int(max_segment_s * 1000 // frame_ms)
+
+        self.pcm = bytearray()
+        self.segment_start = 0
+        self.texts = []
+        self.errors = []
+
+        # ✅ Rasgos por trama del segmento actual: cada trozo solo analiza sus tramas nuevas
+        self._analyzed = 0
+        self._rms = []
+        self._zcr = []
+
+        # Segmentos cerrados en reconocimiento, en orden; el bucle de recepción no espera
+        self.executor = executor
+        self._segments = deque()
+        self.segments_sent = 0
+        self._finished = 0
+        self._reported = 0
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (self.processor.SAMPLE_RATE * self.processor.SAMPLE_WIDTH)
+
+    @property
+    def text(self):
+        return " ".join(self.texts)
+
+    def feed(self, pcm_bytes):
+        """Añade PCM; si se cerró un segmento lo envía a reconocer sin esperar el resultado"""
+        self.pcm.extend(pcm_bytes)
+        admission = self.processor.admission
+        if admission and self.duration > admission.max_duration_s:
+            # finish() lo rechazará por largo: no gastar más reconocedor
+            return
+        self._analyze_new_frames()
+        boundary = self._segment_boundary()
+        if boundary is None:
+            return
+        segment = bytes(self.pcm[self.segment_start:boundary])
+        self.segments_sent += 1
+        if self.executor is not None:
+            self._segments.append(self.executor.submit(self.processor.recognize_pcm, segment))
+        else:
+            self._collect(self.processor.recognize_pcm(segment))
+
+        # Las tramas tras el corte pasan al segmento siguiente
+        kept = (self._analyzed - boundary) // self.frame_bytes
+        self._rms = self._rms[len(self._rms) - kept:] if kept else []
+        self._zcr = self._zcr[len(self._zcr) - kept:] if kept else []
+        self.segment_start = boundary
+
+    def poll(self):
+        """Texto parcial si terminó algún segmento desde la última llamada, si no None"""
+        while self._segments and self._segments[0].done():
+            self._collect_future(self._segments.popleft())
+        if self._finished == self._reported:
+            return None
+        self._reported = self._finished
+        return self.text
+
+    def _analyze_new_frames(self):
+        """Energía y cruces por cero solo de las tramas completas que llegaron en este trozo"""
+        frame_count = (len(self.pcm) - self._analyzed) // self.frame_bytes
+        if frame_count <= 0:
+            return
+        chunk = bytes(self.pcm[self._analyzed:self._analyzed + frame_count * self.frame_bytes])
+        frames = np.frombuffer(chunk, dtype='<i2').reshape(frame_count, self.detector.frame_size).astype(np.float32)
+        self._rms.extend(np.sqrt(np.mean(frames * frames, axis=1)).tolist())
+        self._zcr.extend(self.detector.zero_crossing_rate(frames).tolist())
+        self._analyzed += frame_count * self.frame_bytes
+
+    def _segment_boundary(self):
+        """Offset donde cerrar el segmento actual (mitad de la pausa), o None"""
+        frame_count = len(self._rms)
+        if frame_count < self.pause_frames + 3:
+            return None
+
+        # Solo escalares por trama (a lo sumo max_segment_frames): el PCM no se vuelve a leer
+        speech = self.detector.classify(np.asarray(self._rms), np.asarray(self._zcr))
+        if not speech.any():
+            return None
+
+        if frame_count >= self.max_segment_frames:
+            return self.segment_start + frame_count * self.frame_bytes
+
+        last_speech = np.flatnonzero(speech)[-1]
+        if frame_count - 1 - last_speech >= self.pause_frames:
+            return self.segment_start + (last_speech + 1 + self.pause_frames // 2) * self.frame_bytes
+        return None
+
+    def _discard_segments(self):
+        """Cancela los segmentos aún en cola y espera a los que ya están en el motor"""
+        segments, self._segments = list(self._segments), deque()
+        running = [future for future in segments if not future.cancel()]
+        if running:
+            concurrent.futures.wait(running)
+
+    def _collect_future(self, future):
+        try:
+            self._collect(future.result())
+        except Exception as e:
+            logger.error(f"Streaming segment recognition failed: {e}")
+            self._finished += 1
+            self.errors.append(str(e)[:100])
+
+    def _collect(self, result):
+        self._finished += 1
+        if result["text"]:
+            self.texts.append(result["text"])
+        elif result["error"] and result["error"] != "No speech detected":
+            self.errors.append(result["error"])
+
+    def finish(self):
+        """Reconoce el último segmento y devuelve una transcripción con la forma de transcribe_audio"""
+        full_pcm = bytes(self.pcm[:len(self.pcm) - len(self.pcm) % self.processor.SAMPLE_WIDTH])
+
+        admission = self.processor.admission
+        if admission:
+            # Solo es una llamada ahorrada si ningún segmento llegó al reconocedor
+            saved = not self.segments_sent
+            rejection = (admission.check_header(self.duration, saved=saved)
+                         or admission.check_pcm(full_pcm, self.processor.SAMPLE_RATE, saved=saved))
+            if rejection:
+                self._discard_segments()
+                return self.processor._rejected(rejection)
+
+        # El último segmento va después de los que siguen en vuelo, para mantener el orden
+        while self._segments:
+            self._collect_future(self._segments.popleft())
+        tail = full_pcm[self.segment_start:]
+        if len(tail) >= self.frame_bytes:
+            self._collect(self.processor.recognize_pcm(tail))
+
+        if self.texts:
+            transcription = {"text": self.text, "language": "en", "error": None}
+        else:
+            error = self.errors[-1] if self.errors else "No speech detected"
+            transcription = {"text": "", "language": "unknown", "error": error}
+        transcription["recognizer"] = self.processor.backend.name
+
+        acoustic_features = self.processor.fluency.extract(full_pcm)
+        if acoustic_features:
+            transcription["acoustic_features"] = acoustic_features
+        return transcription
+
+# ✅ Reconocimiento de segmentos fuera del bucle de recepción del WebSocket
+_stream_executor = None
+_stream_executor_pid = None
+_stream_executor_lock = threading.Lock()
+
+def _get_stream_executor():
+    global _stream_executor, _stream_executor_pid
+    with _stream_executor_lock:
+        if _stream_executor is None or _stream_executor_pid != os.getpid():
+            # Los hilos no sobreviven a un fork: un ejecutor por proceso
+            _stream_executor_pid = os.getpid()
+            _stream_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=Config.STREAM_RECOGNITION_WORKERS, thread_name_prefix="stream-segment"
+            )
+        return _stream_executor
+
+# Latencias del streaming: primer parcial desde el primer audio y final desde el "end"
+streaming_latency = {
+    "first_partial": LatencyStats(),
+    "end_to_final": LatencyStats()
+}
+
+def _handle_audio_stream(ws):
+    """Protocolo: {"type":"start",...} → trozos binarios → {"type":"end"}
+
+    El servidor responde {"type":"ready"}, {"type":"partial","text":...} por cada segmento
+    reconocido y {"type":"final",...} con la misma forma que /api/process-audio.
+    """
+    decoder = None
+    try:
+        message = ws.receive(timeout=Config.STREAM_IDLE_TIMEOUT_S)
+        start = json.loads(message) if isinstance(message, str) else {}
+        if start.get("type") != "start":
+            ws.send(json.dumps({"type": "error", "message": "First message must be {\"type\": \"start\"}"}))
+            return
+
+        user_id = start.get("user_id", "anonymous")
+        session_id = start.get("session_id", "default")
+        current_question = start.get("current_question", "What is your name?")
+        audio_format = start.get("format", "pcm16")
+        if audio_format != "pcm16":
+            decoder = StreamingPCMDecoder(AudioProcessor.FFMPEG_DEMUXERS.get(audio_format))
+
+        transcriber = StreamingTranscriber(
+            audio_processor, Config.STREAM_SEGMENT_PAUSE_MS, Config.STREAM_MAX_SEGMENT_S,
+            executor=_get_stream_executor()
+        )
+        ws.send(json.dumps({"type": "ready"}))
+        logger.info(f"Audio stream started for user {user_id[:8]} ({audio_format})")
+
+        received = 0
+        first_audio_at = None
+        first_partial_sent = False
+        while True:
+            message = ws.receive(timeout=Config.STREAM_IDLE_TIMEOUT_S)
+            if message is None:
+                ws.send(json.dumps({"type": "error", "message": "Stream idle timeout"}))
+                return
+            if isinstance(message, str):
+                if json.loads(message).get("type") == "end":
+                    break
+                continue
+
+            received += len(message)
+            if received > Config.AUDIO_FILE_MAX_SIZE:
+                ws.send(json.dumps({"type": "error", "message": "Audio stream too large"}))
+                return
+            if first_audio_at is None:
+                first_audio_at = time.perf_counter()
+
+            pcm_bytes = decoder.feed(message) if decoder else message
+            if pcm_bytes:
+                transcriber.feed(pcm_bytes)
+            partial = transcriber.poll()
+            if partial is not None:
+                ws.send(json.dumps({
+                    "type": "partial",
+                    "text": partial,
+                    "segments": len(transcriber.texts),
+                    "audio_seconds": round(transcriber.duration, 2)
+                }))
+                if not first_partial_sent:
+                    first_partial_sent = True
+                    streaming_latency["first_partial"].record(time.perf_counter() - first_audio_at)
+
+            if transcriber.duration >= Config.STREAM_MAX_SECONDS:
+                break
+
+        ended_at = time.perf_counter()
+        if decoder:
+            tail = decoder.close()
+            if tail:
+                transcriber.pcm.extend(tail)
+
+        transcription = transcriber.finish()
+        response = _process_transcription(transcription, session_id, user_id, current_question)
+        ws.send(json.dumps({"type": "final", **response}, ensure_ascii=False))
+        streaming_latency["end_to_final"].record(time.perf_counter() - ended_at)
+
+    except Exception as e:
+        logger.error(f"Error in audio stream: {e}")
+        try:
+            ws.send(json.dumps({"type": "error", "message": str(e)[:100]}))
+        except Exception:
+            pass
+    finally:
+        if decoder:
+            decoder.close()
+
+def streaming_stats():
+    return {
+        "enabled": sock is not None,
+        **{name: stats.snapshot() for name, stats in streaming_latency.items()}
+    }
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/api/stream-audio')
+    def stream_audio(ws):
+        """✅ WebSocket: audio en trozos mientras el usuario habla, con transcripciones parciales"""
+        _handle_audio_stream(ws)
+else:
+    sock = None
+    logger.warning("flask-sock not installed: /api/stream-audio is disabled")
+
 # ============================================
 # ENDPOINT: SOLICITAR AYUDA (SCAFFOLDING ESPECÍFICO)
 # ============================================
@@ -1703,14 +6115,7 @@ def request_help():
         show_translation = user_progress.get("show_spanish_translation", True) if user_progress else True
         
         # Obtener traducción de la pregunta
-        question_data = None
-        for level in question_db.questions_by_level.values():
-            for q in level:
-                if q["english"] == current_question:
-                    question_data = q
-                    break
-            if question_data:
-                break
+        question_data = question_db.find_question(current_question)
         
         spanish_translation = question_data["spanish"] if question_data else "Traducción no disponible"
         
@@ -1754,7 +6159,7 @@ def request_help():
         progress_manager.update_user_progress(user_id, {
             "help_requests": 1,
             "show_spanish_translation": show_translation
-        })
+        }, defer=True)
         
         return jsonify({
             "status": "success",
@@ -1787,13 +6192,21 @@ def get_question():
         user_id = data.get('user_id', 'anonymous')
         level = data.get('level', 'beginner')
         force_new = data.get('force_new', True)
+        topic = data.get('topic') or request.args.get('topic')
+        tense = data.get('tense') or request.args.get('tense')
         
         # Validar nivel
         if level not in question_db.questions_by_level:
             level = "beginner"
         
-        # ✅ Obtener pregunta con gramática perfecta
-        question_data = question_db.get_question(user_id, level, avoid_recent=force_new)
+        # ✅ Obtener pregunta con gramática perfecta (opcionalmente por tema y/o tiempo verbal)
+        question_data = question_db.get_question(user_id, level, avoid_recent=force_new, topic=topic, tense=tense)
+        if question_data is None:
+            return jsonify({
+                "status": "error",
+                "message": "No questions match the requested topic/tense",
+                "available": question_db.question_filters(level)
+            }), 404
         
         return jsonify({
             "status": "success",
@@ -2005,7 +6418,7 @@ def _suggest_grammar_corrections(question, errors):
 def get_stats():
     """Obtiene estadísticas del sistema"""
     try:
-        data = progress_manager._load_data()
+        statistics = progress_manager.get_statistics()
         
         # Contar preguntas por nivel
         question_counts = {
@@ -2017,11 +6430,11 @@ def get_stats():
         return jsonify({
             "status": "success",
             "data": {
-                "total_users": len(data.get("users", {})),
-                "total_sessions": data.get("statistics", {}).get("total_sessions", 0),
-                "total_questions": data.get("statistics", {}).get("total_questions_asked", 0),
-                "total_audio_submissions": data.get("statistics", {}).get("total_audio_processes", 0),
-                "vocabulary_game_plays": data.get("statistics", {}).get("vocabulary_game_plays", 0),
+                "total_users": statistics.get("total_users", 0),
+                "total_sessions": statistics.get("total_sessions", 0),
+                "total_questions": statistics.get("total_questions_asked", 0),
+                "total_audio_submissions": statistics.get("total_audio_processes", 0),
+                "vocabulary_game_plays": statistics.get("vocabulary_game_plays", 0),
                 "predefined_questions": question_counts,
                 "total_predefined_questions": sum(question_counts.values()),
                 "vocabulary_words": len(vocabulary_game.word_database["fácil"]),
@@ -2083,12 +6496,51 @@ def internal_error(error):
 
 @app.errorhandler(413)
 def too_large(error):
-    return jsonify({"status": "error", "message": "File too large"}), 413
+    # Límite realmente superado: el de un archivo o el del cuerpo completo (lote incluido)
+    if isinstance(error, AudioFileTooLarge):
+        return jsonify({"status": "error", "message": "File too large", "max_bytes": error.max_bytes}), 413
+    return jsonify({
+        "status": "error",
+        "message": "Request too large",
+        "max_bytes": request.max_content_length
+    }), 413
 
 # ============================================
 # EJECUCIÓN PRINCIPAL
 # ============================================
 if __name__ == '__main__':
+    if '--benchmark-noise' in sys.argv:
+        print("⏱️  Estimación de ruido ambiente:")
+        benchmark_noise_floor()
+        sys.exit(0)
+
+    if '--benchmark-decode' in sys.argv:
+        print("⏱️  Decodificación por clip:")
+        benchmark_decoders(sys.argv[sys.argv.index('--benchmark-decode') + 1:])
+        sys.exit(0)
+
+    if '--fake-recognizer' in sys.argv:
+        run_fake_recognizer_server(
+            port=int(os.environ.get('FAKE_RECOGNIZER_PORT', 8765)),
+            latency_ms=float(os.environ.get('FAKE_RECOGNIZER_LATENCY_MS', 0)),
+            jitter_ms=float(os.environ.get('FAKE_RECOGNIZER_JITTER_MS', 0)),
+            failure_rate=float(os.environ.get('FAKE_RECOGNIZER_FAILURE_RATE', 0)),
+            text=os.environ.get('FAKE_RECOGNIZER_TEXT')
+        )
+        sys.exit(0)
+
+    if '--export-content-pack' in sys.argv:
+        pack_path = sys.argv[sys.argv.index('--export-content-pack') + 1]
+        pack_version = os.environ.get('CONTENT_PACK_VERSION', datetime.now().strftime('%Y.%m.%d'))
+        size = write_content_pack(pack_path, pack_version, question_db, vocabulary_game)
+        print(f"📦 Content pack {pack_version} written to {pack_path} ({size} bytes)")
+        sys.exit(0)
+
+    if '--fluency-batch' in sys.argv:
+        for features in extract_fluency_batch(sys.argv[sys.argv.index('--fluency-batch') + 1:]):
+            print(json.dumps(features, ensure_ascii=False))
+        sys.exit(0)
+
     port = int(os.environ.get('PORT', 5000))
     
     print("=" * 60)
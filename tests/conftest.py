@@ -0,0 +1,16 @@
+"""Configuración común: eli_backend se importa con bases de datos temporales y sin red"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Antes de importar eli_backend: Config lee el entorno al cargar el módulo
+_data_dir = tempfile.mkdtemp(prefix="eli-tests-")
+os.environ.setdefault("RECOGNIZER_BACKEND", "stub")
+os.environ.setdefault("AUDIO_POOL_WORKERS", "0")
+os.environ.setdefault("PROGRESS_DB_PATH", os.path.join(_data_dir, "user_progress.db"))
+os.environ.setdefault("PROGRESS_JSON_PATH", os.path.join(_data_dir, "user_progress.json"))
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_data_dir, "transcription_jobs.db"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,38 @@
+import io
+
+import pytest
+
+from eli_backend import _parse_batch_list, app
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('["What is your name?"]', ["What is your name?"]),
+    ('["a", "b", "c"]', ["a", "b", "c"]),
+])
+def test_accepts_one_item_or_one_per_clip(raw, expected):
+    assert _parse_batch_list(raw, "user_ids", 3) == expected
+
+
+@pytest.mark.parametrize("raw, message", [
+    ("[not json", "not valid JSON"),
+    ('{"a": 1}', "list of strings"),
+    ('["a", 2, "c"]', "list of strings"),
+    ('["a", "", "c"]', "list of strings"),
+    ('["a", "b"]', "1 or 3 items"),
+    ("[]", "1 or 3 items"),
+])
+def test_rejects_malformed_lists(raw, message):
+    with pytest.raises(ValueError, match=message):
+        _parse_batch_list(raw, "user_ids", 3)
+
+
+def test_batch_endpoint_answers_400_for_bad_lists():
+    data = {
+        "audio": [(io.BytesIO(b"RIFF"), "a.wav"), (io.BytesIO(b"RIFF"), "b.wav")],
+        "user_ids": '["u1", "u2", "u3"]'
+    }
+    with app.test_client() as client:
+        response = client.post("/api/process-audio/batch", data=data, content_type="multipart/form-data")
+
+    assert response.status_code == 400
+    assert "user_ids" in response.get_json()["message"]
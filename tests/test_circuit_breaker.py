@@ -0,0 +1,85 @@
+import pytest
+
+import eli_backend
+from eli_backend import CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(eli_backend.time, "monotonic", clock)
+    return clock
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=30)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()["short_circuited"] == 1
+    assert breaker.snapshot()["opens"] == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=30)
+    breaker.record_failure()
+
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout_s=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["opens"] == 2
+    assert not breaker.allow()
+
+
+def test_child_outcomes_replay_into_the_parent(clock):
+    parent = CircuitBreaker(failure_threshold=2, reset_timeout_s=30)
+    child = CircuitBreaker(failure_threshold=2, reset_timeout_s=30)
+    child.export_metrics()
+
+    child.load_state(parent.export_state())
+    child.record_failure()
+    child.record_failure()
+    parent.merge_metrics(child.export_metrics())
+
+    assert parent.state == CircuitBreaker.OPEN
+    child.load_state(parent.export_state())
+    assert not child.allow()
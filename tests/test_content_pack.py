@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from eli_backend import (
+    ContentPackManager, QuestionDatabase, VocabularyGame, _validate_content_pack, write_content_pack
+)
+
+
+def question(text="What is your name?"):
+    return {"english": text, "spanish": "¿Cómo te llamas?", "topic": "personal", "tense": "present_simple"}
+
+
+def word():
+    return {"español": "casa", "inglés": "house", "categoría": "hogar", "pista": "h...", "ejemplo": "My house."}
+
+
+def pack():
+    return {
+        "version": "1",
+        "questions": {level: [question()] for level in ("beginner", "intermediate", "advanced")},
+        "vocabulary": {"fácil": [word()]}
+    }
+
+
+def test_valid_pack_passes():
+    _validate_content_pack(pack())
+
+
+def mutate(change):
+    data = pack()
+    change(data)
+    return data
+
+
+@pytest.mark.parametrize("data, message", [
+    ([], "needs a 'version'"),
+    (mutate(lambda d: d.pop("version")), "needs a 'version'"),
+    ({"version": "1"}, "'questions' and/or 'vocabulary'"),
+    (mutate(lambda d: d.update(questions=["x"])), "object keyed by level"),
+    (mutate(lambda d: d["questions"].pop("advanced")), "no questions for level 'advanced'"),
+    (mutate(lambda d: d["questions"].update(extra="x")), "must be a list"),
+    (mutate(lambda d: d["questions"]["beginner"].append("x")), r"beginner\[1\] must be an object"),
+    (mutate(lambda d: d["questions"]["beginner"][0].pop("tense")), "is missing tense"),
+    (mutate(lambda d: d.update(vocabulary=[])), "object keyed by difficulty"),
+    (mutate(lambda d: d["vocabulary"].pop("fácil")), "no vocabulary for difficulty"),
+    (mutate(lambda d: d["vocabulary"]["fácil"].append(3)), r"fácil\[1\] must be an object"),
+    (mutate(lambda d: d["vocabulary"]["fácil"][0].pop("pista")), "is missing pista"),
+])
+def test_invalid_packs_are_rejected(data, message):
+    with pytest.raises(ValueError, match=message):
+        _validate_content_pack(data)
+
+
+def test_invalid_reload_keeps_serving_the_previous_pack(tmp_path):
+    questions, vocabulary = QuestionDatabase(), VocabularyGame()
+    path = str(tmp_path / "pack.json")
+    write_content_pack(path, "v1", questions, vocabulary)
+    manager = ContentPackManager(path, questions, vocabulary, check_interval_s=0)
+    assert manager.reload(force=True)
+    bank = questions._bank
+
+    broken = json.loads((tmp_path / "pack.json").read_text())
+    broken["vocabulary"]["fácil"][0] = "not a word"
+    broken["version"] = "v2"
+    (tmp_path / "pack.json").write_text(json.dumps(broken))
+
+    with pytest.raises(ValueError):
+        manager.reload()
+    # Ni las preguntas (que sí eran válidas) se publican a medias
+    assert questions._bank is bank
+    assert manager.version == "v1"
+    assert manager.failed_reloads == 1
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from eli_backend import JournalProgressStorage, UserProgressManager
+
+
+def open_manager(tmp_path):
+    storage = JournalProgressStorage(
+        str(tmp_path / "journal.jsonl"), str(tmp_path / "snapshot.json"),
+        fsync_interval_ms=0, compact_bytes=1 << 30, compact_interval_s=3600
+    )
+    return UserProgressManager(storage, write_behind=False)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = open_manager(tmp_path)
+    yield manager
+    manager.storage.close()
+
+
+def test_events_replay_in_a_new_process(tmp_path, manager):
+    manager.update_user_progress("u1", {"xp": 10, "total_xp": 10, "questions_answered": True})
+    manager.update_user_progress("u1", {"xp": 5, "total_xp": 5, "questions_answered": True})
+    manager.update_user_progress("u2", {"help_requests": True})
+
+    reopened = open_manager(tmp_path)
+    try:
+        user = reopened.get_user_progress("u1")
+        assert user["total_xp"] == 15
+        assert user["questions_answered"] == 2
+        stats = reopened.get_statistics()
+        assert stats["total_users"] == 2
+        assert stats["total_questions_asked"] == 2
+    finally:
+        reopened.storage.close()
+
+
+def test_torn_last_line_is_ignored_and_overwritten(tmp_path, manager):
+    manager.update_user_progress("u1", {"total_xp": 10})
+    with open(tmp_path / "journal.jsonl", "ab") as f:
+        f.write(b'{"type":"progress_updated","user_id":"u1","incr')
+
+    assert manager.get_user_progress("u1")["total_xp"] == 10
+
+    manager.update_user_progress("u1", {"total_xp": 1})
+    lines = (tmp_path / "journal.jsonl").read_bytes().splitlines()
+    assert all(json.loads(line) for line in lines)
+    reopened = open_manager(tmp_path)
+    try:
+        assert reopened.get_user_progress("u1")["total_xp"] == 11
+    finally:
+        reopened.storage.close()
+
+
+def test_compaction_folds_journal_into_snapshot(tmp_path, manager):
+    manager.update_user_progress("u1", {"total_xp": 10})
+    manager.update_user_progress("u1", {"total_xp": 5})
+
+    assert manager.storage.compact() == 2
+    snapshot = json.loads((tmp_path / "snapshot.json").read_text())
+    assert snapshot["generation"] == 1
+    assert snapshot["users"]["u1"]["total_xp"] == 15
+    assert len((tmp_path / "journal.jsonl").read_bytes().splitlines()) == 1
+    assert manager.get_user_progress("u1")["total_xp"] == 15
+
+
+def test_stale_journal_after_crash_mid_compaction_is_discarded(tmp_path, manager):
+    manager.update_user_progress("u1", {"total_xp": 10})
+    journal = (tmp_path / "journal.jsonl").read_bytes()
+    manager.storage.compact()
+    manager.storage.close()
+
+    # Caída entre escribir el snapshot y truncar el diario: el diario viejo sigue ahí
+    (tmp_path / "journal.jsonl").write_bytes(journal)
+    os.utime(tmp_path / "journal.jsonl")
+
+    reopened = open_manager(tmp_path)
+    try:
+        assert reopened.get_user_progress("u1")["total_xp"] == 10
+        assert reopened.storage.discarded_stale_bytes > 0
+    finally:
+        reopened.storage.close()
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from eli_backend import ProgressWriteBehind, SQLiteProgressStorage, UserProgressManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = UserProgressManager(SQLiteProgressStorage(str(tmp_path / "progress.db")), write_behind=False)
+    # Intervalo largo: en las pruebas solo se confirma con flush() explícito
+    manager.write_behind = ProgressWriteBehind(manager, flush_interval_ms=60_000, max_pending_updates=10_000)
+    yield manager
+    manager.write_behind.close()
+
+
+def test_deferred_updates_merge_until_flush(manager):
+    for _ in range(3):
+        manager.update_user_progress("u1", {"xp": 10, "questions_answered": True}, defer=True)
+    manager.update_user_progress("u1", {"show_spanish_translation": False}, defer=True)
+
+    assert manager.storage.load_user("u1") is None
+    user = manager.get_user_progress("u1")
+    assert user["xp"] == 30
+    assert user["questions_answered"] == 3
+    assert user["show_spanish_translation"] is False
+
+    assert manager.flush() == 4
+    stored = manager.storage.load_user("u1")
+    assert stored["xp"] == 30
+    assert manager.get_user_progress("u1")["xp"] == 30
+
+
+def test_sync_write_applies_queued_updates_first(manager):
+    manager.update_user_progress("u1", {"xp": 5}, defer=True)
+    user = manager.update_user_progress("u1", {"xp": 1})
+
+    assert user["xp"] == 6
+    assert manager.write_behind.stats()["pending_users"] == 0
+
+
+def test_failed_flush_requeues_batch(manager, monkeypatch):
+    manager.update_user_progress("u1", {"xp": 10}, defer=True)
+
+    def broken(batch):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(manager, "_commit_batch", broken)
+    assert manager.flush() == 0
+    manager.update_user_progress("u1", {"xp": 2}, defer=True)
+    monkeypatch.undo()
+
+    assert manager.write_behind.stats()["flush_errors"] == 1
+    assert manager.get_user_progress("u1")["xp"] == 12
+    manager.flush()
+    assert manager.storage.load_user("u1")["xp"] == 12
+
+
+def test_failed_sync_write_requeues_taken_updates(manager, monkeypatch):
+    manager.update_user_progress("u1", {"xp": 7}, defer=True)
+
+    def broken(batch):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(manager, "_commit_batch", broken)
+    with pytest.raises(RuntimeError):
+        manager.update_user_progress("u1", {"xp": 1})
+    monkeypatch.undo()
+
+    # Lo retirado de la cola vuelve; la escritura fallida no se aplica
+    assert manager.get_user_progress("u1")["xp"] == 7
+    manager.flush()
+    assert manager.storage.load_user("u1")["xp"] == 7
+
+
+def test_read_does_not_double_count_inflight_batch(manager, monkeypatch):
+    for _ in range(5):
+        manager.update_user_progress("u1", {"xp": 10}, defer=True)
+
+    committed = threading.Event()
+    release = threading.Event()
+    commit = manager._commit_batch
+
+    def slow_commit(batch):
+        result = commit(batch)
+        # El almacén ya incluye el lote pero _inflight aún no se ha vaciado
+        committed.set()
+        release.wait(5)
+        return result
+
+    monkeypatch.setattr(manager, "_commit_batch", slow_commit)
+    flusher = threading.Thread(target=manager.write_behind.flush)
+    flusher.start()
+    assert committed.wait(5)
+
+    reads = []
+    reader = threading.Thread(target=lambda: reads.append(manager.get_user_progress("u1")["xp"]))
+    reader.start()
+    release.set()
+    flusher.join(5)
+    reader.join(5)
+
+    assert reads == [50]
+
@@ -0,0 +1,80 @@
+import pytest
+
+import eli_backend
+from eli_backend import QuestionHistoryStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(eli_backend.time, "monotonic", clock)
+    return clock
+
+
+def test_ring_keeps_only_the_last_positions(clock):
+    store = QuestionHistoryStore(length=3)
+    for position in range(5):
+        store.record("u1", "beginner", "h1", position)
+    assert store.recent("u1", "beginner", "h1") == {2, 3, 4}
+
+
+def test_level_or_content_change_resets_the_ring(clock):
+    store = QuestionHistoryStore(length=3)
+    store.record("u1", "beginner", "h1", 7)
+    assert store.recent("u1", "intermediate", "h1") == frozenset()
+    assert store.recent("u1", "beginner", "h2") == frozenset()
+
+    # Al grabar en otra versión del contenido el anillo empieza de cero
+    store.record("u1", "beginner", "h2", 1)
+    assert store.recent("u1", "beginner", "h2") == {1}
+    assert store.recent("u1", "beginner", "h1") == frozenset()
+
+
+def test_evicts_least_recently_recorded_user(clock):
+    store = QuestionHistoryStore(max_users=2)
+    store.record("u1", "beginner", "h1", 1)
+    clock.now += 1
+    store.record("u2", "beginner", "h1", 2)
+    clock.now += 1
+    # u1 vuelve a practicar: pasa a ser el más reciente
+    store.record("u1", "beginner", "h1", 3)
+    clock.now += 1
+    store.record("u3", "beginner", "h1", 4)
+
+    assert len(store) == 2
+    assert store.recent("u2", "beginner", "h1") == frozenset()
+    assert store.recent("u1", "beginner", "h1") == {1, 3}
+    assert store.stats()["evicted"] == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    store = QuestionHistoryStore(ttl_s=60)
+    store.record("u1", "beginner", "h1", 1)
+    clock.now += 30
+    store.record("u2", "beginner", "h1", 2)
+
+    clock.now += 30
+    assert store.recent("u1", "beginner", "h1") == frozenset()
+    assert store.recent("u2", "beginner", "h1") == {2}
+
+    # La purga ocurre al grabar o al pedir estadísticas
+    stats = store.stats()
+    assert stats["users"] == 1
+    assert stats["expired"] == 1
+
+
+def test_record_refreshes_ttl(clock):
+    store = QuestionHistoryStore(ttl_s=60)
+    store.record("u1", "beginner", "h1", 1)
+    clock.now += 50
+    store.record("u1", "beginner", "h1", 2)
+    clock.now += 50
+    assert store.recent("u1", "beginner", "h1") == {1, 2}
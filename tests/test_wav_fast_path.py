@@ -0,0 +1,60 @@
+import struct
+
+import pytest
+
+from eli_backend import AudioProcessor
+
+
+def riff(*chunks):
+    body = b"WAVE" + b"".join(chunks)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def chunk(chunk_id, payload, declared_size=None):
+    size = len(payload) if declared_size is None else declared_size
+    return chunk_id + struct.pack("<I", size) + payload + (b"\0" if len(payload) % 2 else b"")
+
+
+def fmt(rate=16000, channels=1, bits=16, tag=1):
+    block = channels * bits // 8
+    return chunk(b"fmt ", struct.pack("<HHIIHH", tag, channels, rate, rate * block, block, bits))
+
+
+@pytest.fixture(scope="module")
+def processor():
+    return AudioProcessor()
+
+
+def test_conformant_wav_is_sliced_without_decoder(processor, monkeypatch):
+    pcm = bytes(range(200)) * 10
+    audio = riff(fmt(), chunk(b"LIST", b"odd"), chunk(b"data", pcm))
+    monkeypatch.setattr(processor, "_ffmpeg_decode", lambda *args: pytest.fail("ffmpeg should not run"))
+
+    assert processor.decode_audio_to_pcm(audio) == pcm
+    assert processor.header_duration(audio) == pytest.approx(len(pcm) / 32000)
+
+
+def test_streaming_data_size_uses_available_bytes(processor):
+    pcm = b"\x01\x00" * 800 + b"\x07"
+    audio = riff(fmt(), b"data" + struct.pack("<I", 0xFFFFFFFF) + pcm)
+
+    # El byte suelto final no forma una muestra completa
+    assert processor._conformant_wav_pcm(audio) == pcm[:-1]
+
+
+@pytest.mark.parametrize("header", [fmt(rate=44100), fmt(channels=2), fmt(bits=8), fmt(tag=3)])
+def test_non_conformant_wav_goes_to_ffmpeg_with_demuxer(processor, monkeypatch, header):
+    audio = riff(header, chunk(b"data", b"\0" * 64))
+    calls = []
+    monkeypatch.setattr(processor, "_ffmpeg_decode", lambda audio_bytes, demuxer=None: calls.append(demuxer) or b"pcm")
+
+    assert processor._conformant_wav_pcm(audio) is None
+    assert processor.decode_audio_to_pcm(audio) == b"pcm"
+    assert calls == [AudioProcessor.FFMPEG_DEMUXERS["wav"]]
+
+
+def test_sniff_audio_format(processor):
+    assert processor.sniff_audio_format(riff(fmt())) == "wav"
+    assert processor.sniff_audio_format(b"fLaC" + b"\0" * 12) == "flac"
+    assert processor.sniff_audio_format(b"OggS" + b"\0" * 12) == "ogg"
+    assert processor.sniff_audio_format(b"\x1aE\xdf\xa3" + b"\0" * 12) == "webm"